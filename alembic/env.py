@@ -7,7 +7,10 @@ from alembic import context
 
 import os
 from dotenv import load_dotenv
-from core import Base
+from db import Base
+import models.v2  # noqa: F401 - registers the tables on Base.metadata
+from services.content_search import SEARCH_TABLE_NAME
+from services.partitions import PARTITION_NAME
 
 load_dotenv()
 
@@ -29,6 +32,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_name(name, type_, parent_names):
+    # Monthly usage_analytics_YYYY_MM tables are created at runtime (services/partitions.py),
+    # and the SQLite FTS5 search table is raw DDL (services/content_search.py)
+    return not (type_ == "table" and (PARTITION_NAME.match(name) or SEARCH_TABLE_NAME.match(name)))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -51,6 +60,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -74,7 +84,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
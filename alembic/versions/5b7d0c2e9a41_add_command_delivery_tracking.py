@@ -0,0 +1,52 @@
+"""Add delivery tracking columns to device_commands
+
+Revision ID: 5b7d0c2e9a41
+Revises: ffe9aa53274d
+Create Date: 2026-10-17 11:02:17.204861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7d0c2e9a41'
+down_revision: Union[str, Sequence[str], None] = 'ffe9aa53274d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = [
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('acked_at', sa.DateTime(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+    ]
+    # Tables made by create_schema already have them
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('device_commands')}
+    missing = [column for column in columns if column.name not in existing]
+    if missing:
+        with op.batch_alter_table('device_commands') as batch_op:
+            for column in missing:
+                batch_op.add_column(column)
+
+    # Dispatcher: due deliveries, ack timeouts and expiry
+    op.create_index('ix_device_commands_status_next_attempt', 'device_commands', ['status', 'next_attempt_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_device_commands_status_next_attempt', table_name='device_commands', if_exists=True)
+    with op.batch_alter_table('device_commands') as batch_op:
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('next_attempt_at')
+        batch_op.drop_column('acked_at')
+        batch_op.drop_column('sent_at')
+        batch_op.drop_column('attempts')
@@ -0,0 +1,56 @@
+"""Add hourly/daily usage rollup tables
+
+Revision ID: 8c3e1f4a7d20
+Revises: 5b7d0c2e9a41
+Create Date: 2026-10-17 13:40:52.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3e1f4a7d20'
+down_revision: Union[str, Sequence[str], None] = '5b7d0c2e9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'usage_rollups',
+        sa.Column('period', sa.String(), nullable=False),
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('events', sa.Integer(), nullable=False),
+        sa.Column('plays', sa.Integer(), nullable=False),
+        sa.Column('completes', sa.Integer(), nullable=False),
+        sa.Column('total_duration', sa.Integer(), nullable=False),
+        sa.Column('unique_sessions', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('period', 'scope', 'key', 'bucket_start'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'usage_rollup_sessions',
+        sa.Column('period', sa.String(), nullable=False),
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('period', 'scope', 'key', 'bucket_start', 'session_id'),
+        if_not_exists=True,
+    )
+    # Pruning buckets too old to receive late events
+    op.create_index('ix_usage_rollup_sessions_bucket', 'usage_rollup_sessions', ['bucket_start'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_usage_rollup_sessions_bucket', table_name='usage_rollup_sessions', if_exists=True)
+    op.drop_table('usage_rollup_sessions', if_exists=True)
+    op.drop_table('usage_rollups', if_exists=True)
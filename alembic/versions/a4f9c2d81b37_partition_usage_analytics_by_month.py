@@ -0,0 +1,100 @@
+"""Move usage_analytics into monthly usage_analytics_YYYY_MM tables
+
+Revision ID: a4f9c2d81b37
+Revises: 8c3e1f4a7d20
+Create Date: 2026-10-17 15:02:11.503214
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f9c2d81b37'
+down_revision: Union[str, Sequence[str], None] = '8c3e1f4a7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ['id', 'device_id', 'content_id', 'action', 'duration', 'session_id', 'timestamp']
+legacy = sa.table(
+    'usage_analytics',
+    *[sa.column(name, sa.DateTime() if name == 'timestamp' else sa.Integer() if name == 'duration' else sa.String()) for name in COLUMNS],
+)
+
+
+def month_table(name: str) -> sa.Table:
+    # Layout as of this revision; services/partitions.py builds the same tables at runtime
+    return sa.Table(
+        name, sa.MetaData(),
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('content_id', sa.String(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('duration', sa.Integer()),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Index(f'ix_{name}_device_timestamp', 'device_id', 'timestamp'),
+    )
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_tables(bind) -> list:
+    return sorted(
+        name for name in sa.inspect(bind).get_table_names()
+        if name.startswith('usage_analytics_') and name[len('usage_analytics_'):].replace('_', '').isdigit()
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if 'usage_analytics' not in sa.inspect(bind).get_table_names():
+        return
+    # Events logged through v1 could have a NULL timestamp; they go in the migration month
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    bind.execute(sa.update(legacy).where(legacy.c.timestamp.is_(None)).values(timestamp=now))
+
+    bounds = bind.execute(sa.select(sa.func.min(legacy.c.timestamp), sa.func.max(legacy.c.timestamp))).one()
+    if bounds[0] is not None:
+        first, last = bounds
+        month, end = date(first.year, first.month, 1), date(last.year, last.month, 1)
+        while month <= end:
+            start, stop = datetime(month.year, month.month, 1), datetime(*next_month(month).timetuple()[:3])
+            table = month_table(f'usage_analytics_{month.year:04d}_{month.month:02d}')
+            table.create(bind, checkfirst=True)
+            bind.execute(table.insert().from_select(
+                COLUMNS,
+                sa.select(*[legacy.c[name] for name in COLUMNS]).where(legacy.c.timestamp >= start, legacy.c.timestamp < stop),
+            ))
+            month = next_month(month)
+
+    op.drop_index('ix_usage_analytics_device_timestamp', table_name='usage_analytics', if_exists=True)
+    op.drop_table('usage_analytics')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    op.create_table(
+        'usage_analytics',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('content_id', sa.String(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_usage_analytics_device_timestamp', 'usage_analytics', ['device_id', 'timestamp'], if_not_exists=True)
+    for name in month_tables(bind):
+        table = month_table(name)
+        bind.execute(legacy.insert().from_select(COLUMNS, sa.select(*[table.c[column] for column in COLUMNS])))
+        table.drop(bind)
@@ -0,0 +1,35 @@
+"""Add response cache versions
+
+Revision ID: b6e1d4f07a92
+Revises: f9b4e7a2c813
+Create Date: 2026-10-17 18:42:09.316254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d4f07a92'
+down_revision: Union[str, Sequence[str], None] = 'f9b4e7a2c813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'response_cache_versions',
+        sa.Column('cache', sa.String(), nullable=False),
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('cache', 'scope'),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('response_cache_versions', if_exists=True)
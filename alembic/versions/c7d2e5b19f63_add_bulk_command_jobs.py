@@ -0,0 +1,47 @@
+"""Add bulk command jobs
+
+Revision ID: c7d2e5b19f63
+Revises: a4f9c2d81b37
+Create Date: 2026-10-17 16:05:27.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e5b19f63'
+down_revision: Union[str, Sequence[str], None] = 'a4f9c2d81b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'command_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('command', sa.String(), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('target', sa.Text(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    # Tables made by create_schema already have it
+    if 'job_id' not in {column['name'] for column in sa.inspect(op.get_bind()).get_columns('device_commands')}:
+        with op.batch_alter_table('device_commands') as batch_op:
+            batch_op.add_column(sa.Column('job_id', sa.String(), nullable=True))
+    op.create_index('ix_device_commands_job_status', 'device_commands', ['job_id', 'status'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_device_commands_job_status', table_name='device_commands', if_exists=True)
+    with op.batch_alter_table('device_commands') as batch_op:
+        batch_op.drop_column('job_id')
+    op.drop_table('command_jobs', if_exists=True)
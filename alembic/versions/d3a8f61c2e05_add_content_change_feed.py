@@ -0,0 +1,52 @@
+"""Add content change feed
+
+Revision ID: d3a8f61c2e05
+Revises: c7d2e5b19f63
+Create Date: 2026-10-17 18:22:10.417256
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8f61c2e05'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e5b19f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # An app started before this migration ran has already made (and filled) the table
+    bind = op.get_bind()
+    if 'content_changes' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'content_changes',
+            sa.Column('seq', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('content_id', sa.String(), nullable=False),
+            sa.Column('deleted', sa.Boolean(), nullable=False),
+            sa.Column('changed_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('seq'),
+            sqlite_autoincrement=True,
+        )
+    if 'ix_content_changes_content_id' not in {index['name'] for index in sa.inspect(bind).get_indexes('content_changes')}:
+        op.create_index('ix_content_changes_content_id', 'content_changes', ['content_id'], unique=True)
+    # Existing content goes into the feed in creation order, so a device starting from 0 gets all of it
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    op.execute(
+        sa.text(
+            "INSERT INTO content_changes (content_id, deleted, changed_at) "
+            "SELECT content_id, :deleted, :now FROM content "
+            "WHERE content_id NOT IN (SELECT content_id FROM content_changes) ORDER BY created_at, content_id"
+        ).bindparams(deleted=False, now=now)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_content_changes_content_id', table_name='content_changes', if_exists=True)
+    op.drop_table('content_changes', if_exists=True)
@@ -20,13 +20,74 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # The tables as they were before migrations existed. Databases made by
+    # create_all at the time already have them, hence if_not_exists.
+    op.create_table(
+        'devices',
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('device_name', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('is_online', sa.Boolean(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=True),
+        sa.Column('battery_level', sa.Integer(), nullable=True),
+        sa.Column('settings', sa.Text(), nullable=True),
+        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('firmware_version', sa.String(), nullable=True),
+        sa.Column('wifi_provisioned', sa.Boolean(), nullable=True),
+        sa.Column('wifi_ssid', sa.String(), nullable=True),
+        sa.Column('provisioned_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('device_id'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'content',
+        sa.Column('content_id', sa.String(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('age_range_min', sa.Integer(), nullable=True),
+        sa.Column('age_range_max', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=False),
+        sa.Column('file_url', sa.String(), nullable=False),
+        sa.Column('thumbnail_url', sa.String(), nullable=True),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('checksum', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('tags', sa.Text(), nullable=True),
+        sa.Column('is_premium', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('content_id'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'device_commands',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('command', sa.String(), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('executed_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'usage_analytics',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('content_id', sa.String(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_table('usage_analytics', if_exists=True)
+    op.drop_table('device_commands', if_exists=True)
+    op.drop_table('content', if_exists=True)
+    op.drop_table('devices', if_exists=True)
@@ -0,0 +1,63 @@
+"""Add content full-text search index
+
+Revision ID: f9b4e7a2c813
+Revises: d3a8f61c2e05
+Create Date: 2026-10-17 20:41:37.602914
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f9b4e7a2c813'
+down_revision: Union[str, Sequence[str], None] = 'd3a8f61c2e05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Layout as of this revision; services/content_search.py and models/v2.py use the same definitions
+SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(tags, '')), 'B')) || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+
+def search_rowid(content_id: str) -> int:
+    # FTS rowid for an item: a 64-bit hash of its content_id
+    return int.from_bytes(hashlib.blake2b(content_id.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS content_search USING fts5("
+            "content_id UNINDEXED, title, tags, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        bind.connection.create_function('search_rowid', 1, search_rowid, deterministic=True)
+        op.execute(
+            "INSERT INTO content_search (rowid, content_id, title, tags, description) "
+            "SELECT search_rowid(content_id), content_id, title, tags, description FROM content "
+            "WHERE content_id NOT IN (SELECT content_id FROM content_search) ORDER BY 1"
+        )
+    elif dialect == 'postgresql':
+        op.create_index(
+            'ix_content_search', 'content', [sa.text(f'({SEARCH_VECTOR})')],
+            postgresql_using='gin', if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS content_search")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_content_search', table_name='content', if_exists=True)
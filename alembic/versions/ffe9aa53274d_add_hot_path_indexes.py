@@ -0,0 +1,59 @@
+"""Add indexes for hot query paths
+
+Revision ID: ffe9aa53274d
+Revises: e1ff91f8aac8
+Create Date: 2026-10-17 09:12:41.530218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ffe9aa53274d'
+down_revision: Union[str, Sequence[str], None] = 'e1ff91f8aac8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Pending commands for a device (heartbeat) and command status lookups
+    op.create_index('ix_device_commands_device_status', 'device_commands', ['device_id', 'status'], if_not_exists=True)
+    op.create_index(
+        'ix_device_commands_pending', 'device_commands', ['device_id'],
+        sqlite_where=sa.text("status = 'pending'"),
+        postgresql_where=sa.text("status = 'pending'"),
+        if_not_exists=True,
+    )
+
+    # Per-device analytics over a time window. Schemas made by create_schema have
+    # monthly usage_analytics_* tables instead (a4f9c2d81b37)
+    if 'usage_analytics' in sa.inspect(op.get_bind()).get_table_names():
+        op.create_index('ix_usage_analytics_device_timestamp', 'usage_analytics', ['device_id', 'timestamp'], if_not_exists=True)
+
+    # Device listing by owner, offline sweep and online counts
+    op.create_index('ix_devices_user_id', 'devices', ['user_id'], if_not_exists=True)
+    op.create_index(
+        'ix_devices_online_last_seen', 'devices', ['last_seen'],
+        sqlite_where=sa.text('is_online = 1'),
+        postgresql_where=sa.text('is_online'),
+        if_not_exists=True,
+    )
+
+    # Content library type/age filters
+    op.create_index('ix_content_type_age', 'content', ['type', 'age_range_min', 'age_range_max'], if_not_exists=True)
+    op.create_index('ix_content_age', 'content', ['age_range_max', 'age_range_min'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_content_age', table_name='content', if_exists=True)
+    op.drop_index('ix_content_type_age', table_name='content', if_exists=True)
+    op.drop_index('ix_devices_online_last_seen', table_name='devices', if_exists=True)
+    op.drop_index('ix_devices_user_id', table_name='devices', if_exists=True)
+    op.drop_index('ix_usage_analytics_device_timestamp', table_name='usage_analytics', if_exists=True)
+    op.drop_index('ix_device_commands_pending', table_name='device_commands', if_exists=True)
+    op.drop_index('ix_device_commands_device_status', table_name='device_commands', if_exists=True)
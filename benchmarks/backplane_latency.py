@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cross-worker command delivery latency through the backplane
+
+Starts a second process standing in for the uvicorn worker that holds the
+device sockets. It subscribes to `device:<id>` channels the way
+device_websocket_v2 does. This process publishes commands the way
+send_device_command_v2 does when the socket lives on another worker. The
+script reports publish-to-handler latency for the Unix-socket broker and,
+as a floor, for the in-process backplane.
+
+Without the backplane, such a command waits for the device's next heartbeat
+(up to 30s with the Pi client's interval).
+
+    uv run python benchmarks/backplane_latency.py --devices 1000 --messages 5000
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import ROOT, summarize
+
+sys.path.insert(0, str(ROOT))
+
+from services.backplane import InProcessBackplane, UnixSocketBackplane, device_channel
+
+READY = "bench:ready"
+REPLY = "bench:reply"
+
+
+async def run_device_worker(socket_path: str, devices: int):
+    """The other worker: holds the devices and reports when each command arrives."""
+    backplane = UnixSocketBackplane(socket_path, host_broker=False)
+    await backplane.start()
+
+    async def on_command(channel: str, message: dict):
+        await backplane.publish(REPLY, {"id": message["id"], "sent_at": message["sent_at"], "received_at": time.monotonic()})
+
+    for i in range(devices):
+        await backplane.subscribe(device_channel(f"ZR-{i:06d}"), on_command)
+    await backplane.publish(READY, {})
+    await asyncio.Event().wait()
+
+
+async def measure(backplane, devices: int, messages: int, concurrency: int):
+    one_way, round_trip = [], []
+    waiting = {}
+
+    async def on_reply(channel: str, message: dict):
+        now = time.monotonic()
+        one_way.append((message["received_at"] - message["sent_at"]) * 1000)
+        round_trip.append((now - message["sent_at"]) * 1000)
+        waiting.pop(message["id"]).set()
+
+    await backplane.subscribe(REPLY, on_reply)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i: int):
+        async with semaphore:
+            done = asyncio.Event()
+            waiting[i] = done
+            await backplane.publish(device_channel(f"ZR-{i % devices:06d}"), {"id": i, "command": "play", "sent_at": time.monotonic()})
+            await asyncio.wait_for(done.wait(), timeout=10)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+    return one_way, round_trip, elapsed
+
+
+async def bench_in_process(devices: int, messages: int, concurrency: int):
+    backplane = InProcessBackplane()
+
+    async def on_command(channel: str, message: dict):
+        await backplane.publish(REPLY, {"id": message["id"], "sent_at": message["sent_at"], "received_at": time.monotonic()})
+
+    for i in range(devices):
+        await backplane.subscribe(device_channel(f"ZR-{i:06d}"), on_command)
+    return await measure(backplane, devices, messages, concurrency)
+
+
+async def bench_unix(devices: int, messages: int, concurrency: int):
+    socket_path = str(Path(tempfile.mkdtemp(prefix="zuri-")) / "backplane.sock")
+    backplane = UnixSocketBackplane(socket_path)
+    ready = asyncio.Event()
+
+    async def on_ready(channel: str, message: dict):
+        ready.set()
+
+    await backplane.start()  # takes the lock and hosts the broker
+    await backplane.subscribe(READY, on_ready)
+    worker = subprocess.Popen([sys.executable, __file__, "--device-worker", socket_path, "--devices", str(devices)])
+    try:
+        await asyncio.wait_for(ready.wait(), timeout=30)
+        return await measure(backplane, devices, messages, concurrency)
+    finally:
+        worker.terminate()
+        worker.wait()
+        await backplane.stop()
+
+
+def report(label: str, result):
+    one_way, round_trip, elapsed = result
+    print(summarize(f"{label} publish -> handler", one_way))
+    print(summarize(f"{label} round trip", round_trip))
+    print(f"{'':<44} throughput={len(one_way) / elapsed:,.0f} msg/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--device-worker", metavar="SOCKET", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.device_worker:
+        await run_device_worker(args.device_worker, args.devices)
+        return
+
+    print(f"{args.messages} commands to {args.devices} devices, {args.concurrency} in flight\n")
+    report("in-process", await bench_in_process(args.devices, args.messages, args.concurrency))
+    report("unix broker", await bench_unix(args.devices, args.messages, args.concurrency))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
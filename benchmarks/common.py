@@ -0,0 +1,39 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def use_temp_database(name: str = "bench") -> str:
+    """Point DATABASE_URL at a throwaway SQLite file (or BENCH_DATABASE_URL). Call before importing app modules."""
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        path = Path(tempfile.mkdtemp(prefix="zuri-")) / f"{name}.db"
+        url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    # App modules resolve templates/images relative to the repo root
+    os.chdir(ROOT)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    return url
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(label: str, samples_ms) -> str:
+    return (
+        f"{label:<44} n={len(samples_ms):<6} "
+        f"p50={percentile(samples_ms, 50):8.2f}ms "
+        f"p95={percentile(samples_ms, 95):8.2f}ms "
+        f"p99={percentile(samples_ms, 99):8.2f}ms "
+        f"max={max(samples_ms, default=0):8.2f}ms"
+    )
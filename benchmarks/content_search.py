@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content search: full catalog download vs LIKE vs the full-text index
+
+Seeds a catalog of synthetic stories (titles, descriptions and tags drawn from
+a made-up vocabulary) and times a set of searches three ways:
+
+- before: `GET /api/v2/content/library` for the whole catalog, then filtering
+  on the client, as the app's search box did
+- LIKE: `ILIKE '%word%'` over title, tags and description in SQL, unranked,
+  so it can stop at the first `limit` matches
+- after: `GET /api/v2/content/search?q=...`, backed by the FTS5 table
+  (tsvector GIN index on Postgres)
+
+It also times building the index over the seeded catalog and the added cost
+of keeping it in step on content writes (POST + DELETE round trips).
+
+Set BENCH_DATABASE_URL to run against Postgres instead of a temp SQLite file.
+
+    uv run --group bench python benchmarks/content_search.py --content 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from common import summarize, use_temp_database
+
+use_temp_database("content_search")
+
+import httpx
+from sqlalchemy import and_, or_, select
+
+from db import AsyncSessionLocal, Base, SessionLocal, engine
+from main import app
+from models.v2 import Content
+from services.content_search import create_sync as create_search_index
+from services.content_search import terms
+
+TAGS = ["bedtime", "calm", "phonics", "morning", "routine", "animals", "space", "ocean", "music", "numbers"]
+
+
+def vocabulary(rng: random.Random, size: int):
+    syllables = ["ka", "lo", "mi", "zu", "ri", "ta", "no", "be", "sa", "do", "fi", "ge", "pu", "ve", "wo"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(count: int, words):
+    rng = random.Random(1)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for start in range(0, count, 10000):
+        db.bulk_insert_mappings(Content, [
+            {
+                "content_id": f"c_{i:06d}", "type": "story", "age_range_min": 3, "age_range_max": 7, "duration": 60, "file_url": "x",
+                "title": " ".join(rng.choice(words) for _ in range(rng.randint(2, 4))).title(),
+                "description": " ".join(rng.choice(words) for _ in range(rng.randint(10, 20))),
+                "tags": json.dumps(rng.sample(TAGS, rng.randint(1, 3))),
+            }
+            for i in range(start, min(start + 10000, count))
+        ])
+    db.commit()
+    started = time.perf_counter()
+    create_search_index(db)
+    db.commit()
+    db.close()
+    return time.perf_counter() - started
+
+
+def client_filter(items, q: str):
+    """Roughly what the phone did: every word has to appear somewhere in the item."""
+    words = terms(q)
+    return [
+        item for item in items
+        if all(word in f"{item['title']} {item['description']} {' '.join(item['tags'])}".lower() for word in words)
+    ]
+
+
+async def like_search(q: str, limit: int):
+    conditions = [
+        or_(Content.title.ilike(f"%{word}%"), Content.tags.ilike(f"%{word}%"), Content.description.ilike(f"%{word}%"))
+        for word in terms(q)
+    ]
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(select(Content).where(and_(*conditions)).limit(limit))).all()
+
+
+async def timed(call, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--content", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=5000, help="distinct words in titles and descriptions")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--catalog-repeat", type=int, default=3, help="full catalog downloads (slow)")
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    words = vocabulary(rng, args.vocabulary)
+    index_seconds = seed(args.content, words)
+    queries = [
+        rng.choice(words),  # one word
+        rng.choice(words)[:3],  # a prefix, as typed
+        f"{rng.choice(words)} {rng.choice(words)[:3]}",  # two words, the second still being typed
+        "bedtime",  # a common tag
+    ]
+    print(f"{args.content} content items, {args.vocabulary} word vocabulary, queries {queries}")
+    print(f"search index built in {index_seconds:.2f}s\n")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async with app.router.lifespan_context(app):
+            sizes = []
+
+            async def catalog():
+                response = await client.get("/api/v2/content/library", headers={"Cache-Control": "no-cache"})
+                response.raise_for_status()
+                sizes.append(len(response.content))
+                items = response.json()
+                for q in queries:
+                    client_filter(items, q)
+            before = await timed(catalog, args.catalog_repeat)
+
+            like = {q: await timed(lambda: like_search(q, args.limit), args.repeat) for q in queries}
+
+            hits = {}
+
+            async def search(q: str):
+                response = await client.get("/api/v2/content/search", params={"q": q, "limit": args.limit})
+                response.raise_for_status()
+                hits[q] = len(response.json())
+            after = {q: await timed(lambda: search(q), args.repeat) for q in queries}
+
+            async def write():
+                content_id = f"bench_{rng.randrange(1 << 30)}"
+                (await client.post("/api/v2/content/library", json={
+                    "content_id": content_id, "title": "Bench Story", "type": "story", "duration": 60, "file_url": "x", "tags": ["bench"],
+                })).raise_for_status()
+                (await client.delete(f"/api/v2/content/library/{content_id}")).raise_for_status()
+            writes = await timed(write, args.writes)
+
+    print(summarize("before: full catalog + filter on client", before))
+    print(f"{'':<44} {sizes[0] / 1e6:.1f} MB per download, filtering all {len(queries)} queries")
+    for q in queries:
+        print(summarize(f"LIKE: '{q}'", like[q]))
+    for q in queries:
+        print(summarize(f"after: /content/search '{q}' ({hits[q]} hits)", after[q]))
+    print(summarize("write: add + delete content (incl. index)", writes))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
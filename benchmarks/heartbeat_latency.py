@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Heartbeat latency under concurrent load
+
+Fires concurrent heartbeats at the sync-session v1 API ("before") and the
+async-session v2 API ("after") while a few clients keep listing devices,
+and reports the heartbeat latency distribution for each. A probe hits
+/health alongside to show how long the event loop is stalled. Each reader
+pauses --read-interval between full listings, so the read load is the same
+for both versions and doesn't grow with how fast the server answers.
+Admission control is switched off, so no heartbeat is answered with 429.
+
+Set BENCH_DATABASE_URL to run against Postgres instead of a temp SQLite file.
+
+    uv run python benchmarks/heartbeat_latency.py --devices 5000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from common import summarize, use_temp_database
+
+use_temp_database("heartbeat_latency")
+os.environ["ADMISSION_DEVICE_RATE"] = "0"
+os.environ["ADMISSION_GLOBAL_RATE"] = "0"
+
+import httpx
+
+from db import Base, SessionLocal, engine
+from main import app
+from models.v2 import Device
+
+
+def seed(devices: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(Device, [
+        {"device_id": f"ZR-{i:06d}", "device_name": f"Bench {i}", "settings": "{}"}
+        for i in range(devices)
+    ])
+    db.commit()
+    db.close()
+
+
+async def run(version: str, devices: int, requests: int, concurrency: int, readers: int, read_interval: float):
+    transport = httpx.ASGITransport(app=app)
+    samples = []
+    probes = []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def heartbeat_worker(worker: int):
+            for i in range(worker, requests, concurrency):
+                device_id = f"ZR-{i % devices:06d}"
+                started = time.perf_counter()
+                response = await client.post(
+                    f"/api/{version}/devices/{device_id}/heartbeat",
+                    json={"battery_level": 80, "status": "online"},
+                )
+                samples.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+
+        async def slow_reader():
+            while not done.is_set():
+                await client.get(f"/api/{version}/devices")
+                await asyncio.sleep(read_interval)
+
+        async def health_probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get(f"/api/{version}/health")
+                probes.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        async with app.router.lifespan_context(app):
+            background = [asyncio.create_task(slow_reader()) for _ in range(readers)]
+            background.append(asyncio.create_task(health_probe()))
+            await asyncio.gather(*(heartbeat_worker(w) for w in range(concurrency)))
+            done.set()
+            await asyncio.gather(*background)
+
+    return samples, probes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=2, help="Concurrent GET /devices clients")
+    parser.add_argument("--read-interval", type=float, default=0.2, help="Seconds each reader waits between listings")
+    args = parser.parse_args()
+
+    seed(args.devices)
+    print(f"devices={args.devices} requests={args.requests} concurrency={args.concurrency} readers={args.readers} read_interval={args.read_interval}s")
+    for version, label in (("v1", "before (v1, sync Session)"), ("v2", "after (v2, AsyncSession)")):
+        samples, probes = await run(version, args.devices, args.requests, args.concurrency, args.readers, args.read_interval)
+        print(summarize(f"{label} heartbeat", samples))
+        print(summarize(f"{label} /health", probes))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
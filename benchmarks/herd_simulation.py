@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Thundering herd: a fleet reconnecting at once, with and without admission control
+
+Discrete-event simulation on a virtual clock; no server is started. N devices
+come back within a few seconds of each other (power cut, API deploy) and
+register, then heartbeat. The server handles CAPACITY requests per second;
+requests beyond that in a given second time out and count as failed. Three
+setups are compared:
+
+- legacy: the old client (retry registration every 30s, heartbeat every 30s
+  on the dot) and no admission control
+- backoff: the new client (full-jitter backoff, randomized heartbeats) and
+  no admission control
+- admission: the new client behind services/admission.py, which answers the
+  excess with 429 + Retry-After hints that spread the herd at the global rate
+
+The client policies mirror lightweight_pi_client.py. For each setup the
+output has peak and p99 arrivals per second, failed requests, 429s, how long
+until every device registered, and a timeline of arrivals in 5s buckets.
+
+    uv run python benchmarks/herd_simulation.py --devices 10000 --capacity 500
+"""
+
+import argparse
+import heapq
+import random
+import sys
+from collections import Counter
+
+from common import ROOT, percentile
+
+sys.path.insert(0, str(ROOT))
+
+from services.admission import AdmissionController  # noqa: E402
+
+HEARTBEAT_INTERVAL = 30
+REGISTER_RETRY_BASE = 2
+REGISTER_RETRY_MAX = 300
+BUCKET = 5  # seconds per timeline bar
+
+
+class Fleet:
+    def __init__(self, args, modern: bool, admission: bool, seed: int):
+        self.args = args
+        self.modern = modern
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.controller = AdmissionController(
+            args.device_rate, args.device_burst, args.capacity, args.capacity,
+            args.max_retry_after, args.jitter, clock=lambda: self.now, rng=random.Random(seed + 1),
+        ) if admission else None
+        self.events = []
+        self.seq = 0
+        self.attempts = Counter()
+        self.arrivals = Counter()  # requests reaching the server, per second
+        self.served = Counter()  # requests that got real work, per second
+        self.failed = Counter()  # requests that timed out, per second
+        self.throttled = Counter()  # 429s, per second
+        self.registered = {}
+
+    def schedule(self, at: float, device: int, kind: str):
+        self.seq += 1
+        heapq.heappush(self.events, (at, self.seq, device, kind))
+
+    def register_retry(self, device: int, hint):
+        if not self.modern:
+            return 30.0
+        if hint is not None:
+            return hint
+        attempt = self.attempts[device]
+        self.attempts[device] += 1
+        return self.rng.uniform(1, max(1, min(REGISTER_RETRY_MAX, REGISTER_RETRY_BASE * 2 ** attempt)))
+
+    def heartbeat_gap(self, hint):
+        if not self.modern:
+            return float(HEARTBEAT_INTERVAL)
+        if hint is not None:
+            return hint
+        return HEARTBEAT_INTERVAL * self.rng.uniform(0.9, 1.1)
+
+    def handle(self, device: int, kind: str):
+        second = int(self.now)
+        self.arrivals[second] += 1
+        hint = None
+        if self.controller is not None:
+            rejected = self.controller.check(f"device-{device}")
+            if rejected is not None:
+                self.throttled[second] += 1
+                retry_after, jitter = rejected
+                hint = retry_after + self.rng.uniform(0, jitter)
+        ok = False
+        if hint is None:
+            if self.served[second] < self.args.capacity:
+                self.served[second] += 1
+                ok = True
+            else:
+                self.failed[second] += 1
+
+        if kind == "register":
+            if ok:
+                self.registered[device] = self.now
+                first = self.rng.uniform(0, HEARTBEAT_INTERVAL) if self.modern else HEARTBEAT_INTERVAL
+                self.schedule(self.now + first, device, "heartbeat")
+            else:
+                self.schedule(self.now + self.register_retry(device, hint), device, "register")
+        else:
+            self.schedule(self.now + self.heartbeat_gap(hint), device, "heartbeat")
+
+    def run(self):
+        for device in range(self.args.devices):
+            self.schedule(self.rng.uniform(0, self.args.arrival_window), device, "register")
+        while self.events and self.events[0][0] < self.args.duration:
+            self.now, _, device, kind = heapq.heappop(self.events)
+            self.handle(device, kind)
+        return self
+
+
+def report(name: str, fleet: Fleet, args):
+    seconds = range(int(args.duration))
+    per_second = [fleet.arrivals[s] for s in seconds]
+    done = max(fleet.registered.values()) if len(fleet.registered) == args.devices else None
+    print(f"{name}")
+    print(f"  arrivals/s  peak={max(per_second)} p99={percentile(per_second, 99)} "
+          f"(steady state {args.devices / HEARTBEAT_INTERVAL:.0f}/s)")
+    print(f"  failed={sum(fleet.failed.values())} throttled(429)={sum(fleet.throttled.values())} "
+          f"registered={len(fleet.registered)}/{args.devices}"
+          + (f" all by t={done:.0f}s" if done is not None else ""))
+    print(f"  {'t':>6} {'arrivals/s':>11} {'served/s':>9} {'failed/s':>9} {'429/s':>7}")
+    scale = max(per_second) or 1
+    for start in range(0, min(args.timeline, len(per_second)), BUCKET):
+        window = range(start, start + BUCKET)
+        arrivals = sum(fleet.arrivals[s] for s in window) / BUCKET
+        served = sum(fleet.served[s] for s in window) / BUCKET
+        failed = sum(fleet.failed[s] for s in window) / BUCKET
+        throttled = sum(fleet.throttled[s] for s in window) / BUCKET
+        bar = "#" * round(30 * arrivals / scale)
+        print(f"  {start:>5}s {arrivals:>11.0f} {served:>9.0f} {failed:>9.0f} {throttled:>7.0f} {bar}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--capacity", type=float, default=500, help="requests/s the server can do real work for (also the global admission rate)")
+    parser.add_argument("--arrival-window", type=float, default=3, help="seconds over which the fleet comes back")
+    parser.add_argument("--duration", type=float, default=600, help="simulated seconds")
+    parser.add_argument("--timeline", type=int, default=180, help="seconds of timeline to print")
+    parser.add_argument("--device-rate", type=float, default=0.2)
+    parser.add_argument("--device-burst", type=float, default=5)
+    parser.add_argument("--max-retry-after", type=float, default=120)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.devices} devices back within {args.arrival_window:.0f}s, server capacity {args.capacity:.0f} req/s\n")
+    for name, modern, admission in (("legacy", False, False), ("backoff", True, False), ("admission", True, True)):
+        report(name, Fleet(args, modern, admission, args.seed).run(), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Mobile event fan-out under load
+
+Connects thousands of simulated phones to the broadcaster and publishes
+battery/status events for their devices at a steady rate. Most phones keep
+up. Some take 50ms per frame, and a few stop reading entirely. A few
+unfiltered dashboard connections watch every device, which is where the
+queue bound has to kick in. The script reports:
+
+- how long publishing takes, which must not depend on the slow phones
+- delivery latency on the phones that keep up
+- how much the slow phones coalesced or dropped
+- how many stalled phones were cut off
+
+    uv run python benchmarks/mobile_fanout.py --phones 5000 --users 1000 --seconds 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from common import ROOT, summarize
+
+sys.path.insert(0, str(ROOT))
+
+from services.broadcaster import Broadcaster, battery_event, device_status_event
+
+
+class FakePhone:
+    """Just enough of a WebSocket for Broadcaster.serve."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.dashboard = False
+        self.latencies = []
+        self.frames = 0
+        self.overflows = 0
+        self.closed = asyncio.Event()
+
+    async def send_text(self, text: str):
+        if self.kind == "stalled":
+            await asyncio.Event().wait()
+        if self.kind == "slow":
+            await asyncio.sleep(0.05)
+        frame = json.loads(text)
+        self.frames += 1
+        if frame["type"] == "overflow":
+            self.overflows += 1
+        elif "t" in frame:
+            self.latencies.append((time.monotonic() - frame["t"]) * 1000)
+
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def close(self, code: int = 1000):
+        self.closed.set()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--phones", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--devices-per-user", type=int, default=2)
+    parser.add_argument("--rate", type=int, default=2000, help="events per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--slow", type=float, default=0.05, help="share of phones taking 50ms per frame")
+    parser.add_argument("--stalled", type=float, default=0.01, help="share of phones that never read")
+    parser.add_argument("--dashboards", type=int, default=5, help="slow connections subscribed to every user")
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--send-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    broadcaster = Broadcaster(args.queue_size, args.send_timeout)
+    rng = random.Random(1)
+    phones, tasks = [], []
+    for i in range(args.phones):
+        roll = rng.random()
+        kind = "stalled" if roll < args.stalled else "slow" if roll < args.stalled + args.slow else "fast"
+        phone = FakePhone(kind)
+        phones.append(phone)
+        tasks.append(asyncio.create_task(broadcaster.serve(phone, f"user_{i % args.users}")))
+    for _ in range(args.dashboards):
+        phone = FakePhone("slow")
+        phone.dashboard = True
+        phones.append(phone)
+        tasks.append(asyncio.create_task(broadcaster.serve(phone, None)))
+    await asyncio.sleep(0.1)
+
+    print(
+        f"{args.phones} phones ({sum(p.kind == 'slow' and not p.dashboard for p in phones)} slow, "
+        f"{sum(p.kind == 'stalled' for p in phones)} stalled) + {args.dashboards} slow dashboards, "
+        f"{args.users} users, {args.rate} events/s for {args.seconds:.0f}s, queue size {args.queue_size}\n"
+    )
+
+    publish_ms = []
+    tick = 0.05
+    per_tick = max(1, int(args.rate * tick))
+    started = time.monotonic()
+    while time.monotonic() - started < args.seconds:
+        events = []
+        for _ in range(per_tick):
+            user = rng.randrange(args.users)
+            device_id = f"ZR-{user:05d}-{rng.randrange(args.devices_per_user)}"
+            if rng.random() < 0.9:
+                event = battery_event(device_id, f"user_{user}", rng.randrange(100))
+            else:
+                event = device_status_event(device_id, f"user_{user}", rng.random() < 0.5)
+            event["t"] = time.monotonic()
+            events.append(event)
+        t = time.perf_counter()
+        # deliver() is what the backplane handler runs on every worker
+        broadcaster.deliver(events)
+        publish_ms.append((time.perf_counter() - t) * 1000)
+        await asyncio.sleep(tick)
+
+    await asyncio.sleep(1.0)
+    metrics = broadcaster.metrics()
+
+    fast = [ms for p in phones if p.kind == "fast" for ms in p.latencies]
+    slow = [ms for p in phones if p.kind == "slow" and not p.dashboard for ms in p.latencies]
+    dashboards = [ms for p in phones if p.dashboard for ms in p.latencies]
+    print(summarize(f"deliver() per {per_tick}-event batch", publish_ms))
+    print(summarize("latency, phones keeping up", fast))
+    print(summarize("latency, slow phones", slow))
+    print(summarize("latency, slow dashboards (all users)", dashboards))
+    print(
+        f"\noffered={metrics['offered']:,} coalesced={metrics['coalesced']:,} dropped={metrics['dropped']:,} "
+        f"overflow notices={sum(p.overflows for p in phones):,}"
+    )
+    print(
+        f"stalled phones disconnected: {metrics['send_timeouts']}/{sum(p.kind == 'stalled' for p in phones)}, "
+        f"max queue depth now: {metrics['max_queue_depth']} (limit {args.queue_size})"
+    )
+
+    for phone in phones:
+        await phone.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Per-row serialization cost of the list endpoints
+
+Builds device, content and analytics rows in memory (no database round
+trips) and times turning a page of them into response bytes:
+
+- before: json.loads on every settings/tags column, then jsonable_encoder
+  and JSONResponse, as the handlers used to
+- after: the parse cache and the precompiled serializers in
+  utils/serialization.py
+
+Both paths produce identical bytes; the script checks that first.
+
+    uv run python benchmarks/serialization.py --rows 5000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import use_temp_database
+
+use_temp_database("serialization")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.v2 import Content, Device
+from routers.v2 import content_payload, device_payload
+from utils.serialization import content_json, devices_json, usage_json
+
+
+def old_device_payload(device: Device) -> dict:
+    payload = device_payload(device)
+    payload["settings"] = json.loads(device.settings) if device.settings else {}
+    return payload
+
+
+def old_content_payload(item: Content) -> dict:
+    payload = content_payload(item)
+    payload["tags"] = json.loads(item.tags) if item.tags else []
+    return payload
+
+
+def old_body(payloads) -> bytes:
+    return JSONResponse(content=jsonable_encoder(payloads)).body
+
+
+def build_rows(count: int):
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Most devices keep default settings; a few dozen variants cover the rest
+    settings = [
+        json.dumps({"voice_tone": tone, "voice_speed": speed, "volume": 0.8, "led_color": "#5E9CF3", "led_brightness": 0.7, "led_pattern": "steady"})
+        for tone in ("calm", "playful") for speed in (0.8, 0.9, 1.0, 1.1, 1.2)
+    ]
+    tags = [json.dumps(t) for t in (["bedtime", "calm"], ["phonics"], ["morning", "routine"], [])]
+    devices = [
+        Device(
+            device_id=f"ZR-{i:06d}", device_name=f"Zuri {i}", user_id=f"user_{i % 500}", is_online=i % 3 == 0,
+            last_seen=now - timedelta(seconds=i), battery_level=rng.randrange(100), ip_address="192.168.1.10",
+            firmware_version="1.0.0", wifi_provisioned=True, wifi_ssid="Home", settings=rng.choice(settings), created_at=now,
+        )
+        for i in range(count)
+    ]
+    content = [
+        Content(
+            content_id=f"story_{i:05d}", title=f"Story {i}", type="story", age_range_min=3, age_range_max=7, duration=300,
+            file_url=f"https://cdn.example.com/{i}.mp3", thumbnail_url=None, file_size=1_000_000, checksum="abc",
+            description="A story", tags=rng.choice(tags), is_premium=False, created_at=now,
+        )
+        for i in range(count)
+    ]
+    # Analytics rows come back from the month tables as plain dicts
+    usage = [
+        {
+            "id": f"evt-{i}", "content_id": f"story_{i % 50:05d}", "action": "play",
+            "duration": rng.randrange(600), "session_id": f"s{i // 10}", "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    return devices, content, usage
+
+
+def time_per_row(serialize, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize(rows)
+        best = min(best, time.perf_counter() - started)
+    return best / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    devices, content, usage = build_rows(args.rows)
+    cases = [
+        ("devices", devices, old_device_payload, device_payload, devices_json),
+        ("content", content, old_content_payload, content_payload, content_json),
+        ("analytics", usage, dict, dict, usage_json),
+    ]
+
+    print(f"{args.rows} rows per page, best of {args.repeat}\n")
+    print(f"{'payload':<12}{'before us/row':>16}{'after us/row':>16}{'speedup':>10}")
+    for name, rows, old_payload, new_payload, serializer in cases:
+        before = lambda rows: old_body([old_payload(row) for row in rows])
+        after = lambda rows: serializer.dump_list([new_payload(row) for row in rows])
+        assert before(rows) == after(rows), f"{name}: output differs"
+        before_us = time_per_row(before, rows, args.repeat)
+        after_us = time_per_row(after, rows, args.repeat)
+        print(f"{name:<12}{before_us:>16.2f}{after_us:>16.2f}{before_us / after_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
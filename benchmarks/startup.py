@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cold start: import time, lifespan startup and first-request latency
+
+Starts a fresh interpreter per run, as an autoscaled worker or a test
+process would, and times four stages for each startup profile:
+
+- import: `import main` (modules, routers, models, schemas)
+- startup: the lifespan (schema check, background tasks, page prerender)
+- first request: GET /api/v2/health, the first request through the app
+- first docs: GET /api/v2/docs, rendered on demand under the fast profile
+
+The schema is created once up front with scripts/create_schema.py, so
+profiles that skip create_all still find their tables.
+
+Set BENCH_DATABASE_URL to run against Postgres instead of a temp SQLite file.
+
+    uv run python benchmarks/startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import ROOT, summarize, use_temp_database
+
+STAGES = ["import", "startup", "first request", "first docs", "process"]
+PROFILES = ["full", "fast"]
+
+
+def child():
+    """One cold start; prints the stage timings in ms as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    import main
+    timings["import"] = (time.perf_counter() - started) * 1000
+
+    import asyncio
+    import httpx
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stage = time.perf_counter()
+            async with main.app.router.lifespan_context(main.app):
+                timings["startup"] = (time.perf_counter() - stage) * 1000
+                for name, path in (("first request", "/api/v2/health"), ("first docs", "/api/v2/docs")):
+                    stage = time.perf_counter()
+                    (await client.get(path)).raise_for_status()
+                    timings[name] = (time.perf_counter() - stage) * 1000
+
+    asyncio.run(run())
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="cold starts per profile")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        # The parent already pointed DATABASE_URL at the bench database
+        sys.path.insert(0, str(ROOT))
+        os.chdir(ROOT)
+        child()
+        return
+
+    use_temp_database("startup")
+    subprocess.run([sys.executable, str(ROOT / "scripts" / "create_schema.py")], check=True, stdout=subprocess.DEVNULL)
+    print(f"{args.runs} cold starts per profile\n")
+
+    for profile in PROFILES:
+        samples = {stage: [] for stage in STAGES}
+        env = {**os.environ, "STARTUP_PROFILE": profile}
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, __file__, "--child"], env=env, check=True, capture_output=True, text=True,
+            )
+            samples["process"].append((time.perf_counter() - started) * 1000)
+            for stage, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+                samples[stage].append(value)
+        print(f"profile={profile}")
+        for stage in STAGES:
+            print(summarize(f"  {stage}", samples[stage]))
+        print()
+
+
+if __name__ == "__main__":
+    main()
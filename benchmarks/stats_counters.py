@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+/stats cost: four COUNT(*) scans vs in-memory counters
+
+Seeds a large devices table and times three things:
+
+- the four count queries the old `/stats` handler ran on every call
+- one reconcile, the single-pass recount the counters use periodically
+- `GET /api/v2/stats` served from the counters, end to end through the app
+
+A few concurrent pollers stand in for dashboards.
+
+Set BENCH_DATABASE_URL to run against Postgres instead of a temp SQLite file.
+
+    uv run python benchmarks/stats_counters.py --devices 100000 --requests 500
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import summarize, use_temp_database
+
+use_temp_database("stats_counters")
+
+import httpx
+from sqlalchemy import func, select
+
+from db import AsyncSessionLocal, Base, SessionLocal, engine
+from main import app
+from models.v2 import Content, Device
+from services.stats import system_stats
+
+
+def seed(devices: int, content: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for start in range(0, devices, 10000):
+        db.bulk_insert_mappings(Device, [
+            {
+                "device_id": f"ZR-{i:06d}", "device_name": f"Bench {i}", "settings": "{}",
+                "is_online": i % 3 == 0, "wifi_provisioned": i % 2 == 0,
+            }
+            for i in range(start, min(start + 10000, devices))
+        ])
+    db.bulk_insert_mappings(Content, [
+        {"content_id": f"c_{i:05d}", "title": f"Story {i}", "type": "story", "age_range_min": 3, "age_range_max": 7, "duration": 60, "file_url": "x"}
+        for i in range(content)
+    ])
+    db.commit()
+    db.close()
+
+
+async def old_stats():
+    """What get_system_stats_v2 did before the counters."""
+    async with AsyncSessionLocal() as db:
+        total_devices = await db.scalar(select(func.count()).select_from(Device))
+        online_devices = await db.scalar(select(func.count()).select_from(Device).filter(Device.is_online == True))
+        provisioned_devices = await db.scalar(select(func.count()).select_from(Device).filter(Device.wifi_provisioned == True))
+        total_content = await db.scalar(select(func.count()).select_from(Content))
+    return total_devices, online_devices, provisioned_devices, total_content
+
+
+async def timed_concurrently(call, requests: int, concurrency: int):
+    samples = []
+
+    async def worker(offset: int):
+        for _ in range(offset, requests, concurrency):
+            started = time.perf_counter()
+            await call()
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100000)
+    parser.add_argument("--content", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10, help="dashboards polling at once")
+    args = parser.parse_args()
+
+    seed(args.devices, args.content)
+    print(f"{args.devices} devices, {args.content} content items, {args.requests} requests, {args.concurrency} pollers\n")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async with app.router.lifespan_context(app):
+            before, before_elapsed = await timed_concurrently(old_stats, args.requests, args.concurrency)
+
+            reconciles = []
+            for _ in range(10):
+                started = time.perf_counter()
+                await system_stats.reconcile()
+                reconciles.append((time.perf_counter() - started) * 1000)
+
+            async def get_stats():
+                response = await client.get("/api/v2/stats")
+                response.raise_for_status()
+            after, after_elapsed = await timed_concurrently(get_stats, args.requests, args.concurrency)
+
+            expected = await old_stats()
+            snapshot = system_stats.snapshot()
+            got = (snapshot["devices"]["total"], snapshot["devices"]["online"], snapshot["devices"]["provisioned"], snapshot["content"]["total"])
+
+    print(summarize("before: 4x COUNT(*) per call", before))
+    print(f"{'':<44} throughput={len(before) / before_elapsed:,.0f} req/s")
+    print(summarize("reconcile (one pass, runs periodically)", reconciles))
+    print(summarize("after: GET /api/v2/stats from counters", after))
+    print(f"{'':<44} throughput={len(after) / after_elapsed:,.0f} req/s")
+    print(f"\ncounters match the database: {got == expected} {got}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+# Runtime tunables, all overridable through the environment
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Startup profile (main.py): "full" keeps everything on; "fast" turns the defaults below off (no v1, no create_all, pages rendered on demand)
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "full").lower()
+_FULL = "false" if STARTUP_PROFILE == "fast" else "true"
+ENABLE_V1 = os.getenv("ENABLE_V1", _FULL).lower() == "true"  # mount the deprecated /api/v1 routes
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", _FULL).lower() == "true"  # create missing tables at startup; otherwise run scripts/create_schema.py or alembic
+PRERENDER_PAGES = os.getenv("PRERENDER_PAGES", _FULL).lower() == "true"  # render home/docs pages at startup rather than on first request
+
+# Heartbeat write coalescing (services/heartbeats.py)
+HEARTBEAT_FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", "2.0"))  # seconds
+HEARTBEAT_FLUSH_SIZE = int(os.getenv("HEARTBEAT_FLUSH_SIZE", "1000"))  # buffered devices
+HEARTBEAT_LAST_SEEN_RESOLUTION = float(os.getenv("HEARTBEAT_LAST_SEEN_RESOLUTION", "60"))  # seconds; last_seen alone only refreshes cached /devices listings this often
+
+# Batched analytics ingestion (services/analytics.py)
+ANALYTICS_BATCH_CHUNK_SIZE = int(os.getenv("ANALYTICS_BATCH_CHUNK_SIZE", "500"))  # rows per INSERT
+ANALYTICS_BATCH_MAX_ITEMS = int(os.getenv("ANALYTICS_BATCH_MAX_ITEMS", "10000"))  # events per request
+ANALYTICS_COPY_MIN_ROWS = int(os.getenv("ANALYTICS_COPY_MIN_ROWS", "50"))  # Postgres: use COPY from this many rows
+
+# Monthly analytics partitions and retention (services/partitions.py)
+ANALYTICS_RETENTION_MONTHS = int(os.getenv("ANALYTICS_RETENTION_MONTHS", "12"))  # months kept in the hot database; 0 keeps everything
+ANALYTICS_ARCHIVE_DIR = os.getenv("ANALYTICS_ARCHIVE_DIR", "./archive/usage")  # where cold months go as gzip NDJSON
+ANALYTICS_MAINTENANCE_INTERVAL = float(os.getenv("ANALYTICS_MAINTENANCE_INTERVAL", "3600"))  # seconds between create-ahead/archive passes
+ANALYTICS_PARTITION_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_PARTITION_REFRESH_INTERVAL", "30"))  # min seconds between catalog reloads
+ANALYTICS_MAX_CLOCK_SKEW = float(os.getenv("ANALYTICS_MAX_CLOCK_SKEW", "300"))  # seconds an event timestamp may be ahead of the server
+
+# Keyset pagination for list endpoints (utils/pagination.py)
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))  # rows when only a cursor is sent
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "1000"))  # largest page a client may ask for
+
+# Streamed list responses (utils/streaming.py)
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))  # rows per keyset query
+
+# Cross-worker WebSocket routing (services/backplane.py)
+BACKPLANE = os.getenv("BACKPLANE", "memory")  # "memory" for one worker, "unix" for uvicorn --workers N
+BACKPLANE_SOCKET = os.getenv("BACKPLANE_SOCKET", "/tmp/zuri-backplane.sock")
+BACKPLANE_MAX_BUFFER = int(os.getenv("BACKPLANE_MAX_BUFFER", str(1 << 20)))  # bytes the broker queues for one worker before disconnecting it
+
+# Mobile event fan-out (services/broadcaster.py)
+MOBILE_QUEUE_SIZE = int(os.getenv("MOBILE_QUEUE_SIZE", "100"))  # queued events per connection before dropping
+MOBILE_SEND_TIMEOUT = float(os.getenv("MOBILE_SEND_TIMEOUT", "10"))  # seconds a phone may take per frame
+
+# Server-Sent Events stream (services/sse.py)
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", "10000"))  # recent events kept for Last-Event-ID replay
+SSE_PING_INTERVAL = float(os.getenv("SSE_PING_INTERVAL", "15"))  # seconds of quiet before a stats event keeps the stream alive
+
+# Command delivery (services/dispatcher.py)
+COMMAND_TTL = int(os.getenv("COMMAND_TTL", "3600"))  # seconds before an unacknowledged command expires
+COMMAND_ACK_TIMEOUT = float(os.getenv("COMMAND_ACK_TIMEOUT", "60"))  # seconds to wait for an ack before redelivering
+COMMAND_MAX_ATTEMPTS = int(os.getenv("COMMAND_MAX_ATTEMPTS", "5"))  # deliveries before a command is marked failed
+COMMAND_RETRY_BASE = float(os.getenv("COMMAND_RETRY_BASE", "5"))  # first redelivery backoff in seconds, doubled each attempt
+COMMAND_RETRY_MAX = float(os.getenv("COMMAND_RETRY_MAX", "300"))  # backoff cap in seconds
+COMMAND_DISPATCH_INTERVAL = float(os.getenv("COMMAND_DISPATCH_INTERVAL", "1.0"))  # seconds between dispatcher passes
+COMMAND_DISPATCH_BATCH = int(os.getenv("COMMAND_DISPATCH_BATCH", "500"))  # commands per pass
+COMMAND_BULK_MAX_DEVICES = int(os.getenv("COMMAND_BULK_MAX_DEVICES", "50000"))  # devices one POST /commands/bulk may target
+
+# System statistics counters (services/stats.py)
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "60"))  # seconds between recounts from the database
+
+# Device presence (services/presence.py)
+PRESENCE_TIMEOUT = float(os.getenv("PRESENCE_TIMEOUT", "90"))  # seconds of silence before a device is marked offline
+PRESENCE_CHECK_INTERVAL = float(os.getenv("PRESENCE_CHECK_INTERVAL", "1.0"))  # seconds between deadline checks
+
+# Response serialization (utils/serialization.py)
+JSON_PARSE_CACHE_SIZE = int(os.getenv("JSON_PARSE_CACHE_SIZE", "4096"))  # distinct settings/tags JSON texts kept parsed
+
+# Usage rollups (services/rollups.py)
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "5"))  # seconds between rollup upserts
+ROLLUP_SESSION_RETENTION_DAYS = int(os.getenv("ROLLUP_SESSION_RETENTION_DAYS", "7"))  # days of per-bucket session ids kept for unique counts
+
+# Prerendered home/docs pages (services/pages.py)
+PAGE_CACHE_MAX_AGE = int(os.getenv("PAGE_CACHE_MAX_AGE", "86400"))  # seconds browsers may reuse a page without asking
+PAGE_TEMPLATE_RELOAD = os.getenv("PAGE_TEMPLATE_RELOAD", "false").lower() == "true"  # re-render when a template changes (development)
+
+# Long-poll command delivery (services/longpoll.py)
+LONG_POLL_MAX_WAIT = float(os.getenv("LONG_POLL_MAX_WAIT", "60"))  # longest ?wait= a device may ask for, in seconds
+LONG_POLL_MAX_WAITERS = int(os.getenv("LONG_POLL_MAX_WAITERS", "10000"))  # parked requests per worker before new ones get 429
+
+# Admission control for register/heartbeat (services/admission.py)
+ADMISSION_DEVICE_RATE = float(os.getenv("ADMISSION_DEVICE_RATE", "0.2"))  # requests per second per device; 0 disables
+ADMISSION_DEVICE_BURST = float(os.getenv("ADMISSION_DEVICE_BURST", "5"))  # requests a device may send back to back
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", "500"))  # requests per second per worker; 0 disables
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "1000"))  # requests admitted at once before the rate applies
+ADMISSION_MAX_RETRY_AFTER = float(os.getenv("ADMISSION_MAX_RETRY_AFTER", "120"))  # longest Retry-After handed out, in seconds
+ADMISSION_JITTER = float(os.getenv("ADMISSION_JITTER", "0.1"))  # random spread added to Retry-After, as a fraction of it
+
+# Server-driven heartbeat interval (services/cadence.py)
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "30"))  # seconds between heartbeats for an idle device
+HEARTBEAT_MIN_INTERVAL = float(os.getenv("HEARTBEAT_MIN_INTERVAL", "5"))  # right after commands were delivered; raised to fit ADMISSION_DEVICE_RATE
+HEARTBEAT_SOCKET_INTERVAL = float(os.getenv("HEARTBEAT_SOCKET_INTERVAL", "60"))  # device has a WebSocket open
+HEARTBEAT_MAX_INTERVAL = float(os.getenv("HEARTBEAT_MAX_INTERVAL", "60"))  # upper bound, also kept under 2/3 of PRESENCE_TIMEOUT
+HEARTBEAT_TARGET_RATE = float(os.getenv("HEARTBEAT_TARGET_RATE", "200"))  # heartbeats/s per worker before intervals stretch; 0 disables
+
+# Single-item content lookups (services/content_cache.py)
+CONTENT_CACHE_SIZE = int(os.getenv("CONTENT_CACHE_SIZE", "10000"))  # content items kept serialized-ready per worker
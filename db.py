@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
@@ -7,12 +9,55 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./zuri_hosted.db")
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+# expire_on_commit=False: v1 handlers are async and read attributes after commit;
+# a reload there would hold a pooled connection across the next await
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
 
+# Async drivers for the same database, used by the v2 API
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap a sync database URL onto its async driver (aiosqlite/asyncpg)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername != backend or backend not in ASYNC_DRIVERS:
+        # Already names an explicit driver (e.g. postgresql+asyncpg)
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+if make_url(ASYNC_DATABASE_URL).get_backend_name() == "sqlite":
+    # SQLite allows one writer; interleaved async sessions that each hold a read
+    # lock and then try to write would deadlock. Funnel them through a single
+    # connection so they queue on the event loop instead of in SQLite's busy handler.
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=1, max_overflow=0)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+def create_schema():
+    """Create any missing tables from the v2 models. For development and tests; deployments run alembic."""
+    import models.v2  # noqa: F401 - registers the tables on Base.metadata
+    from services.content_feed import backfill_sync
+    from services.content_search import create_sync as create_search_index
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        backfill_sync(db)
+        create_search_index(db)
+        db.commit()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -11,6 +11,7 @@ import subprocess
 import time
 import uuid
 import hashlib
+import random
 import aiofiles
 from pathlib import Path
 from datetime import datetime
@@ -20,11 +21,17 @@ from zeroconf import IPVersion, ServiceInfo, Zeroconf
 import os
 from dotenv import load_dotenv
 import sqlite3
+from collections import OrderedDict
 
 load_dotenv()
 
 BASE_DIR = "/home/olawill/Documents/Zuri/pi"
 
+HEARTBEAT_INTERVAL = 30  # seconds, +/- 10% so devices that booted together drift apart; used until the server sends next_heartbeat_in
+REGISTER_RETRY_BASE = 2  # first registration retry window in seconds, doubled each attempt
+REGISTER_RETRY_MAX = 300  # retry window cap
+COMMAND_POLL_WAIT = 50  # seconds each long poll for commands is held open by the server
+
 class ZuriPiClient:
     def __init__(self):
         self.device_id = self._get_device_id()
@@ -34,6 +41,18 @@ class ZuriPiClient:
         self.content_dir.mkdir(exist_ok=True)
         
         self.battery_level = 100
+        # Last content library response, revalidated with its ETag
+        self._library_etag = None
+        self._library_cache = None
+        # Command results waiting for the next heartbeat, and recently run command ids.
+        # A command that times out on the server is redelivered with the same id, so
+        # we answer it again instead of running it twice.
+        self._command_results = {}
+        self._executed_commands = OrderedDict()
+        # Seconds the server asked us to wait (429 Retry-After), used by the next sleep
+        self._retry_after = None
+        # Heartbeat interval from the last heartbeat response
+        self._next_heartbeat_in = None
         self.is_playing = False
         self.current_content = None
         self.settings = {
@@ -92,6 +111,14 @@ class ZuriPiClient:
             )
         ''')
         
+        # Sync cursors kept next to local_content, e.g. the last applied /content/changes seq
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
         conn.commit()
         conn.close()
 
@@ -123,6 +150,10 @@ class ZuriPiClient:
             if response.status_code == 200:
                 print(f"Device {self.device_id} registered successfully")
                 return True
+            elif response.status_code == 429:
+                self._retry_after = self._parse_retry_after(response)
+                print(f"Registration throttled, server asked for {self._retry_after:.0f}s")
+                return False
             else:
                 print(f"Registration failed: {response.status_code}")
                 return False
@@ -133,37 +164,77 @@ class ZuriPiClient:
 
     async def send_heartbeat(self):
         """Send periodic heartbeat to API"""
+        results = dict(self._command_results)
         try:
             response = requests.post(
                 f"{self.api_url}/devices/{self.device_id}/heartbeat",
                 json={
                     "battery_level": self.battery_level,
                     "status": "online",
-                    "wifi_ssid": "TestNetwork"
+                    "wifi_ssid": "TestNetwork",
+                    "command_results": list(results.values())
                 },
                 timeout=5
             )
             
             if response.status_code == 200:
                 data = response.json()
+                self._next_heartbeat_in = data.get("next_heartbeat_in")
+                # Delivered; anything recorded meanwhile goes with the next heartbeat
+                for command_id in results:
+                    self._command_results.pop(command_id, None)
                 print(f"💓 Heartbeat sent - Battery: {self.battery_level}%")
                 
                 # Process any pending commands
                 if data.get("commands"):
                     for command in data["commands"]:
                         await self._execute_command(command)
+            elif response.status_code == 429:
+                self._retry_after = self._parse_retry_after(response)
+                print(f"Heartbeat throttled, next one in {self._retry_after:.0f}s")
+                return False
             return True
                         
         except Exception as e:
             print(f"Heartbeat error: {e}")
             return False
 
+    def _parse_retry_after(self, response) -> float:
+        """Seconds to wait after a 429: the server's hint plus its suggested jitter, else Retry-After"""
+        try:
+            detail = response.json()["detail"]
+            return float(detail["retry_after"]) + random.uniform(0, float(detail.get("jitter", 0)))
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(response.headers.get("Retry-After", HEARTBEAT_INTERVAL))
+        except ValueError:
+            return float(HEARTBEAT_INTERVAL)
+
+    def _take_retry_after(self):
+        delay, self._retry_after = self._retry_after, None
+        return delay
+
+    def _register_retry_delay(self, attempt: int) -> float:
+        """Server hint if there is one, else exponential backoff with full jitter"""
+        delay = self._take_retry_after()
+        if delay is not None:
+            return delay
+        window = min(REGISTER_RETRY_MAX, REGISTER_RETRY_BASE * 2 ** attempt)
+        return random.uniform(1, max(1, window))
+
     async def _execute_command(self, command):
         """Execute command from API"""
         command_id = command["id"]
         cmd_type = command["command"]
         params = command.get("params", {})
         
+        if command_id in self._executed_commands:
+            # Our result never reached the server; report it again
+            print(f"Command {command_id} already executed, re-sending result")
+            self._command_results[command_id] = self._executed_commands[command_id]
+            return
+        
         print(f"🎯 Executing command: {cmd_type} with params: {params}")
         
         success = False
@@ -185,9 +256,13 @@ class ZuriPiClient:
         except Exception as e:
             print(f"Command execution error: {e}")
         
-        # Report command result back to API (if WebSocket is available)
-        # For now, just log it
+        # Reported with the next heartbeat
         print(f"Command {command_id} executed: {'success' if success else 'failed'}")
+        result = {"command_id": command_id, "success": success}
+        self._command_results[command_id] = result
+        self._executed_commands[command_id] = result
+        while len(self._executed_commands) > 200:
+            self._executed_commands.popitem(last=False)
 
     async def _play_content(self, content_id: str, volume: float = None) -> bool:
         """Play content locally"""
@@ -294,16 +369,39 @@ class ZuriPiClient:
             print(f"LED control error: {e}")
             return False
 
-    async def _download_content(self, content_id: str):
+    def _fetch_content_library(self):
+        """Get the content library, reusing the cached copy on 304 Not Modified"""
+        headers = {}
+        if self._library_etag and self._library_cache is not None:
+            headers["If-None-Match"] = self._library_etag
+        
+        response = requests.get(f"{self.api_url}/content/library", headers=headers, timeout=30)
+        if response.status_code == 304:
+            return self._library_cache
+        if response.status_code != 200:
+            return None
+        
+        self._library_cache = response.json()
+        self._library_etag = response.headers.get("ETag")
+        return self._library_cache
+
+    def _fetch_content_item(self, content_id: str):
+        """Look up one content item; None if the server doesn't have it"""
+        response = requests.get(f"{self.api_url}/content/library/{content_id}", timeout=30)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 405:
+            # Older server without single-item lookup
+            content_library = self._fetch_content_library() or []
+            return next((item for item in content_library if item["content_id"] == content_id), None)
+        return None
+
+    async def _download_content(self, content_id: str, content_info: dict = None):
         """Download content from API"""
         try:
-            # Get content info from API
-            response = requests.get(f"{self.api_url}/content/library")
-            if response.status_code != 200:
-                return False
-            
-            content_library = response.json()
-            content_info = next((item for item in content_library if item["content_id"] == content_id), None)
+            if content_info is None:
+                # Get content info from API
+                content_info = self._fetch_content_item(content_id)
             
             if not content_info:
                 print(f"Content {content_id} not found in library")
@@ -327,9 +425,12 @@ class ZuriPiClient:
                 else:
                     content_path.unlink()  # Delete corrupted file
                     print(f"Checksum verification failed for {content_id}")
+                    return False
+            return True
             
         except Exception as e:
             print(f"Download error for {content_id}: {e}")
+            return False
 
     def _verify_checksum(self, file_path: Path, expected_checksum: str) -> bool:
         """Verify file checksum"""
@@ -356,22 +457,85 @@ class ZuriPiClient:
         conn.commit()
         conn.close()
 
+    def _get_sync_state(self, key: str, default=None):
+        conn = sqlite3.connect(f"{BASE_DIR}/zuri_local.db")
+        row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        conn.close()
+        return row[0] if row else default
+
+    def _set_sync_state(self, key: str, value):
+        conn = sqlite3.connect(f"{BASE_DIR}/zuri_local.db")
+        conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+        conn.commit()
+        conn.close()
+
+    def _local_checksum(self, content_id: str):
+        conn = sqlite3.connect(f"{BASE_DIR}/zuri_local.db")
+        row = conn.execute("SELECT checksum FROM local_content WHERE content_id = ?", (content_id,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def _remove_local_content(self, content_id: str):
+        """Drop a deleted item's file and its local_content row"""
+        (self.content_dir / f"{content_id}.mp3").unlink(missing_ok=True)
+        conn = sqlite3.connect(f"{BASE_DIR}/zuri_local.db")
+        conn.execute("DELETE FROM local_content WHERE content_id = ?", (content_id,))
+        conn.commit()
+        conn.close()
+        print(f"Removed deleted content: {content_id}")
+
     async def _sync_content(self) -> bool:
+        """Apply content changes since the last sync; falls back to a full sync on servers without the feed"""
+        try:
+            since = int(self._get_sync_state("content_changes_seq", 0))
+            while True:
+                response = requests.get(f"{self.api_url}/content/changes", params={"since": since, "limit": 500}, timeout=30)
+                if response.status_code == 404:
+                    return await self._sync_full_library()
+                if response.status_code != 200:
+                    return False
+                page = response.json()
+                
+                for change in page["changes"]:
+                    if change["op"] == "delete":
+                        self._remove_local_content(change["content_id"])
+                        continue
+                    content_info = change["content"]
+                    content_id = content_info["content_id"]
+                    content_path = self.content_dir / f"{content_id}.mp3"
+                    # New, changed or missing locally
+                    if not content_path.exists() or (content_info.get("checksum") and content_info["checksum"] != self._local_checksum(content_id)):
+                        if not await self._download_content(content_id, content_info):
+                            # Keep the cursor so the next sync retries this page
+                            return False
+                
+                # Saved per page, so an interrupted sync resumes where it stopped
+                since = page["next_since"]
+                self._set_sync_state("content_changes_seq", since)
+                if not page["has_more"]:
+                    break
+            
+            print(f"Content sync completed (change seq {since})")
+            return True
+            
+        except Exception as e:
+            print(f"Content sync error: {e}")
+            return False
+
+    async def _sync_full_library(self) -> bool:
         """Sync all available content"""
         try:
-            response = requests.get(f"{self.api_url}/content/library")
-            if response.status_code != 200:
+            content_library = self._fetch_content_library()
+            if content_library is None:
                 return False
             
-            content_library = response.json()
-            
             for content_item in content_library:
                 content_id = content_item["content_id"]
                 content_path = self.content_dir / f"{content_id}.mp3"
                 
                 # Download if not exists
                 if not content_path.exists():
-                    await self._download_content(content_id)
+                    await self._download_content(content_id, content_item)
             
             print("Content sync completed")
             return True
@@ -389,15 +553,20 @@ class ZuriPiClient:
         """Main client loop"""
         print(f"🚀 Starting Zuri Pi Client (Ubuntu) - Device ID: {self.device_id}")
         
-        # Register with API
-        if not await self.register_with_api():
-            print("❌ Failed to register with API, retrying in 30 seconds...")
-            await asyncio.sleep(30)
-            return await self.run()
+        # Register with API; after an outage every device is doing this, so back off randomly
+        attempt = 0
+        while not await self.register_with_api():
+            delay = self._register_retry_delay(attempt)
+            attempt += 1
+            print(f"❌ Failed to register with API, retrying in {delay:.0f} seconds...")
+            await asyncio.sleep(delay)
         
         # Start heartbeat task
         heartbeat_task = asyncio.create_task(self._heartbeat_loop())
         
+        # Commands arrive through the long poll as soon as they're queued; heartbeats still pick up anything missed
+        poll_task = asyncio.create_task(self._command_poll_loop())
+        
         # Start battery monitor
         battery_task = asyncio.create_task(self._battery_monitor())
         
@@ -405,15 +574,46 @@ class ZuriPiClient:
         
         # Wait for tasks
         try:
-            await asyncio.gather(heartbeat_task, battery_task)
+            await asyncio.gather(heartbeat_task, poll_task, battery_task)
         except KeyboardInterrupt:
             print("\n👋 Pi Client stopping...")
 
     async def _heartbeat_loop(self):
         """Heartbeat loop"""
+        # Start at a random point in the interval so a fleet that registered together doesn't beat together
+        await asyncio.sleep(random.uniform(0, HEARTBEAT_INTERVAL))
         while True:
             await self.send_heartbeat()
-            await asyncio.sleep(30)  # Heartbeat every 30 seconds
+            # A 429 hint first, then the interval the server picked (already jittered)
+            delay = self._take_retry_after()
+            if delay is None:
+                delay = self._next_heartbeat_in or HEARTBEAT_INTERVAL * random.uniform(0.9, 1.1)
+            await asyncio.sleep(delay)
+
+    async def _command_poll_loop(self):
+        """Long-poll the API for commands"""
+        while True:
+            try:
+                # requests blocks, so the held-open request runs in a thread
+                response = await asyncio.to_thread(
+                    requests.get,
+                    f"{self.api_url}/devices/{self.device_id}/commands",
+                    params={"wait": COMMAND_POLL_WAIT},
+                    timeout=COMMAND_POLL_WAIT + 10
+                )
+                if response.status_code == 200:
+                    for command in response.json().get("commands", []):
+                        await self._execute_command(command)
+                    continue
+                if response.status_code == 429:
+                    delay = self._parse_retry_after(response)
+                else:
+                    print(f"Command poll failed: {response.status_code}")
+                    delay = HEARTBEAT_INTERVAL
+            except Exception as e:
+                print(f"Command poll error: {e}")
+                delay = random.uniform(5, 15)
+            await asyncio.sleep(delay)
 
     async def _battery_monitor(self):
         """Battery monitoring loop"""
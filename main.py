@@ -1,7 +1,5 @@
-import asyncio
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone, timedelta
 
 from fastapi import FastAPI
 from fastapi.requests import Request
@@ -9,42 +7,54 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from db import Base, SessionLocal, engine
-from models.v2 import Device
-from routers import v1, v2, internal
+import config
+from db import async_engine, create_schema
+from routers import v2, internal
+from services.backplane import backplane
+from services.broadcaster import broadcaster
+from services.content_cache import content_cache
+from services.dispatcher import dispatcher
+from services.heartbeats import heartbeat_buffer
+from services.longpoll import command_waiters
+from services.pages import page_cache
+from services.partitions import usage_partitions
+from services.presence import presence
+from services.rollups import usage_rollups
+from services.stats import system_stats
 
 load_dotenv()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(cleanup_offline_devices())
+    if config.AUTO_CREATE_SCHEMA:
+        create_schema()
+    await usage_partitions.start()
+    heartbeat_buffer.start()
+    await backplane.start()
+    await broadcaster.start()
+    await command_waiters.start()
+    await content_cache.start()
+    dispatcher.start()
+    await system_stats.start()
+    await presence.start()
+    usage_rollups.start()
+    if config.PRERENDER_PAGES:
+        page_cache.warm(app)
     print("Zuri Combined API started successfully!")
     print("Swagger UI available at: http://localhost:8000/docs")
     print("ReDoc available at: http://localhost:8000/redoc")
     yield
-
-# Background task to mark offline devices
-async def cleanup_offline_devices():
-    while True:
-        db = SessionLocal()
-        cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=5)
-        
-        offline_devices = db.query(Device).filter(
-            Device.last_seen < cutoff_time,
-            Device.is_online == True
-        ).all()
-        
-        for device in offline_devices:
-            device.is_online = False
-        
-        db.commit()
-        db.close()
-        
-        await asyncio.sleep(300)  # Check every 5 minutes
-
+    await usage_rollups.stop()
+    await presence.stop()
+    await system_stats.stop()
+    await dispatcher.stop()
+    await content_cache.stop()
+    await command_waiters.stop()
+    await broadcaster.stop()
+    await backplane.stop()
+    await heartbeat_buffer.stop()
+    await usage_partitions.stop()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Zuri Hosted API",
@@ -84,8 +94,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include versioned routers
-app.include_router(v1.router, prefix="/api/v1")
+# Include versioned routers; v1 (and its models/schemas) is only imported when enabled
+if config.ENABLE_V1:
+    from routers import v1
+    app.include_router(v1.router, prefix="/api/v1")
 app.include_router(v2.router, prefix="/api/v2")
 
 app.include_router(internal.router)  # No prefix needed as it's in the router
@@ -103,14 +115,3 @@ async def add_deprecation_header(request: Request, call_next):
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/api/v2")  # Redirect to latest version
-
-# Version-specific docs
-@app.get("/api/v1/docs", include_in_schema=False)
-async def v1_docs():
-    # Your existing custom_swagger_ui_html logic but for v1
-    pass
-
-@app.get("/api/v2/docs", include_in_schema=False) 
-async def v2_docs():
-    # Your existing custom_swagger_ui_html logic but for v2
-    pass
\ No newline at end of file
@@ -3,7 +3,11 @@ import uuid
 from datetime import datetime, timezone
 from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text
 
-from main import Base
+from db import Base
+
+def utcnow() -> datetime:
+    # Columns are naive DateTime holding UTC; a callable so each row gets its own time
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class Device(Base):
     __tablename__ = "devices"
@@ -13,7 +17,7 @@ class Device(Base):
     device_name = Column(String, nullable=False)
     user_id = Column(String, nullable=True)
     is_online = Column(Boolean, default=False)
-    last_seen = Column(DateTime, default=datetime.now(timezone.utc))
+    last_seen = Column(DateTime, default=utcnow)
     battery_level = Column(Integer, default=100)
     settings = Column(Text)  # JSON
     ip_address = Column(String, nullable=True)
@@ -21,7 +25,7 @@ class Device(Base):
     wifi_provisioned = Column(Boolean, default=False)
     wifi_ssid = Column(String, nullable=True)
     provisioned_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
 
 class Content(Base):
     __tablename__ = "content"
@@ -40,7 +44,7 @@ class Content(Base):
     description = Column(Text, nullable=True)
     tags = Column(Text)  # JSON array
     is_premium = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
 
 
 class DeviceCommand(Base):
@@ -51,18 +55,12 @@ class DeviceCommand(Base):
     device_id = Column(String, nullable=False)
     command = Column(String, nullable=False)
     params = Column(Text)  # JSON
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
     executed_at = Column(DateTime, nullable=True)
     status = Column(String, default="pending")  # pending, sent, completed, failed
+    # Delivery bookkeeping shared with the v2 dispatcher (services/dispatcher.py)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
 
-class UsageAnalytics(Base):
-    __tablename__ = "usage_analytics"
-    __table_args__ = {"extend_existing": True}
-    
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    device_id = Column(String, nullable=False)
-    content_id = Column(String, nullable=False)
-    action = Column(String, nullable=False)  # play, pause, stop, complete
-    duration = Column(Integer, default=0)
-    session_id = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+# Usage analytics events live in one table per month, usage_analytics_YYYY_MM (services/partitions.py)
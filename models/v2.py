@@ -1,19 +1,32 @@
 # Models
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, Text, Index, column, func, literal_column, text
 
-from main import Base
+from db import Base
+
+def utcnow() -> datetime:
+    # Columns are naive DateTime holding UTC; a callable so each row gets its own time
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class Device(Base):
     __tablename__ = "devices"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_devices_user_id", "user_id"),
+        # Offline sweep and online counts only ever look at online devices
+        Index(
+            "ix_devices_online_last_seen", "last_seen",
+            sqlite_where=text("is_online = 1"),
+            postgresql_where=text("is_online"),
+        ),
+        {"extend_existing": True},
+    )
     
     device_id = Column(String, primary_key=True)
     device_name = Column(String, nullable=False)
     user_id = Column(String, nullable=True)
     is_online = Column(Boolean, default=False)
-    last_seen = Column(DateTime, default=datetime.now(timezone.utc))
+    last_seen = Column(DateTime, default=utcnow)
     battery_level = Column(Integer, default=100)
     settings = Column(Text)  # JSON
     ip_address = Column(String, nullable=True)
@@ -21,11 +34,28 @@ class Device(Base):
     wifi_provisioned = Column(Boolean, default=False)
     wifi_ssid = Column(String, nullable=True)
     provisioned_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+
+def _weighted_tsvector(value, weight: str):
+    return func.setweight(func.to_tsvector(literal_column("'simple'"), func.coalesce(value, literal_column("''"))), literal_column(f"'{weight}'"))
+
+def content_search_vector(title, tags, description):
+    """Postgres full-text document for a content row; the search query must use the same expression as the index."""
+    return _weighted_tsvector(title, "A").op("||")(_weighted_tsvector(tags, "B")).op("||")(_weighted_tsvector(description, "C"))
 
 class Content(Base):
     __tablename__ = "content"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_content_type_age", "type", "age_range_min", "age_range_max"),
+        Index("ix_content_age", "age_range_max", "age_range_min"),
+        # Full-text search on Postgres; SQLite uses the content_search FTS5 table (services/content_search.py)
+        Index(
+            "ix_content_search",
+            content_search_vector(column("title"), column("tags"), column("description")),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        {"extend_existing": True},
+    )
     
     content_id = Column(String, primary_key=True)
     title = Column(String, nullable=False)
@@ -40,29 +70,106 @@ class Content(Base):
     description = Column(Text, nullable=True)
     tags = Column(Text)  # JSON array
     is_premium = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+
+class ContentChange(Base):
+    """Latest change per content item; a deleted item stays as a tombstone (services/content_feed.py)."""
+    __tablename__ = "content_changes"
+    __table_args__ = (
+        Index("ix_content_changes_content_id", "content_id", unique=True),
+        # AUTOINCREMENT so a seq is never handed out twice, even after the newest row is replaced
+        {"extend_existing": True, "sqlite_autoincrement": True},
+    )
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    content_id = Column(String, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+    changed_at = Column(DateTime, nullable=False)
 
 
 class DeviceCommand(Base):
     __tablename__ = "device_commands"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_device_commands_device_status", "device_id", "status"),
+        # Heartbeat path: pending commands for one device
+        Index(
+            "ix_device_commands_pending", "device_id",
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+        # Dispatcher: due deliveries, ack timeouts and expiry
+        Index("ix_device_commands_status_next_attempt", "status", "next_attempt_at"),
+        # Bulk job progress
+        Index("ix_device_commands_job_status", "job_id", "status"),
+        {"extend_existing": True},
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     device_id = Column(String, nullable=False)
     command = Column(String, nullable=False)
     params = Column(Text)  # JSON
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
     executed_at = Column(DateTime, nullable=True)
-    status = Column(String, default="pending")  # pending, sent, completed, failed
+    status = Column(String, default="pending")  # pending, sent, acked, completed, failed, expired
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # deliveries so far
+    sent_at = Column(DateTime, nullable=True)  # last delivery
+    acked_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # pending: push due; sent: ack deadline
+    expires_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    job_id = Column(String, nullable=True)  # set for commands queued by POST /commands/bulk
 
-class UsageAnalytics(Base):
-    __tablename__ = "usage_analytics"
+class CommandJob(Base):
+    """One bulk command; its per-device commands carry job_id (services/dispatcher.py)."""
+    __tablename__ = "command_jobs"
     __table_args__ = {"extend_existing": True}
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    device_id = Column(String, nullable=False)
-    content_id = Column(String, nullable=False)
-    action = Column(String, nullable=False)  # play, pause, stop, complete
-    duration = Column(Integer, default=0)
-    session_id = Column(String, nullable=True)
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+    command = Column(String, nullable=False)
+    params = Column(Text)  # JSON
+    target = Column(Text)  # JSON: the device_ids or filter the job was created with
+    total = Column(Integer, nullable=False, default=0)  # commands queued
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=True)
+
+# Usage analytics events live in one table per month, usage_analytics_YYYY_MM (services/partitions.py)
+
+class UsageRollup(Base):
+    """Usage totals per hour/day bucket, for one device or one content item (services/rollups.py)."""
+    __tablename__ = "usage_rollups"
+    __table_args__ = {"extend_existing": True}
+    
+    period = Column(String, primary_key=True)  # hour, day
+    scope = Column(String, primary_key=True)  # device, content
+    key = Column(String, primary_key=True)  # device_id or content_id
+    bucket_start = Column(DateTime, primary_key=True)  # UTC
+    events = Column(Integer, nullable=False, default=0)
+    plays = Column(Integer, nullable=False, default=0)
+    completes = Column(Integer, nullable=False, default=0)
+    total_duration = Column(Integer, nullable=False, default=0)  # seconds
+    unique_sessions = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+class UsageRollupSession(Base):
+    """Sessions already counted in a rollup bucket, so unique_sessions can be kept incrementally."""
+    __tablename__ = "usage_rollup_sessions"
+    __table_args__ = (
+        # Pruning buckets too old to receive late events
+        Index("ix_usage_rollup_sessions_bucket", "bucket_start"),
+        {"extend_existing": True},
+    )
+    
+    period = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    session_id = Column(String, primary_key=True)
+
+class ResponseCacheVersion(Base):
+    """Version counter per cached listing scope; list ETags derive from it (services/response_cache.py)."""
+    __tablename__ = "response_cache_versions"
+    __table_args__ = {"extend_existing": True}
+    
+    cache = Column(String, primary_key=True)  # content_library, devices
+    scope = Column(String, primary_key=True)  # user_id, or * for unfiltered listings
+    version = Column(Integer, nullable=False, default=0)
@@ -1,18 +1,29 @@
 from fastapi import APIRouter
 from fastapi import HTTPException, WebSocket, WebSocketDisconnect, Depends, Query
-from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from fastapi.responses import HTMLResponse
 from fastapi.requests import Request
-from fastapi.templating import Jinja2Templates
+from sqlalchemy import insert, select
 from sqlalchemy.orm import  Session
 from datetime import datetime, timedelta, timezone
 import json
 from typing import Dict, List, Optional
 
 from db import SessionLocal, get_db
-from models.v1 import Content, Device, DeviceCommand, UsageAnalytics
+from models.v1 import Content, Device, DeviceCommand
 from schemas.v1 import ContentCreate, DeviceCommandRequest, DeviceHeartbeat, DeviceRegister, DeviceSettings, PlaybackCommand, UsageAnalyticsCreate, WiFiProvisionUpdate
-from utils.helper import add_custom_color, load_navbar_and_footer_html
+from services.admission import admission
+from services.content_cache import content_cache
+from services.content_feed import record_change_sync
+from services.content_search import index_content_sync, unindex_content_sync
+from services.dispatcher import new_command_fields, utcnow
+from services.heartbeats import heartbeat_buffer
+from services.pages import page_cache
+from services.partitions import month_start, partition_table, usage_partitions
+from services.presence import presence
+from services.response_cache import content_library_cache, device_list_cache
+from services.rollups import usage_rollups
+from services.stats import system_stats
+from utils.ids import uuid7
 
 
 router = APIRouter(
@@ -24,13 +35,14 @@ router = APIRouter(
 device_connections: Dict[str, WebSocket] = {}
 mobile_connections: List[WebSocket] = []
 
-templates = Jinja2Templates(directory="templates")
-
 # Device Management Endpoints
 @router.post("/devices/register", tags=["Device Management"], summary="Register a new device", deprecated=True)
 async def register_device_v1(device_data: DeviceRegister, db: Session = Depends(get_db)):
     """Register a device with the hosted API"""
+    admission.admit(device_data.device_id)
     device = db.query(Device).filter(Device.device_id == device_data.device_id).first()
+    is_new = device is None
+    was_online = bool(device and device.is_online)
     
     if device:
         # Update existing device
@@ -38,7 +50,7 @@ async def register_device_v1(device_data: DeviceRegister, db: Session = Depends(
         device.ip_address = device_data.ip_address
         device.firmware_version = device_data.firmware_version
         device.is_online = True
-        device.last_seen = datetime.now(timezone.utc)
+        device.last_seen = utcnow()
     else:
         # Create new device
         device = Device(
@@ -47,32 +59,40 @@ async def register_device_v1(device_data: DeviceRegister, db: Session = Depends(
             ip_address=device_data.ip_address,
             firmware_version=device_data.firmware_version,
             is_online=True,
-            last_seen=datetime.now(timezone.utc)
+            last_seen=utcnow()
         )
         db.add(device)
     
+    device_list_cache.bump_sync(db, device.user_id)
     db.commit()
+    system_stats.adjust(devices=int(is_new), online=int(not was_online))
+    presence.touch(device.device_id)
     return {"status": "registered", "device_id": device.device_id}
 
 @router.post("/devices/{device_id}/heartbeat", tags=["Device Management"], summary="Device heartbeat", deprecated=True)
 async def device_heartbeat_v1(device_id: str, heartbeat: DeviceHeartbeat, db: Session = Depends(get_db)):
     """Receive heartbeat from device"""
+    admission.admit(device_id)
     device = db.query(Device).filter(Device.device_id == device_id).first()
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
+    came_online = not device.is_online
+    newly_provisioned = bool(heartbeat.wifi_ssid and not device.wifi_provisioned)
     device.battery_level = heartbeat.battery_level
-    device.last_seen = datetime.now(timezone.utc)
+    device.last_seen = utcnow()
     device.is_online = True
     
     if heartbeat.wifi_ssid:
         device.wifi_ssid = heartbeat.wifi_ssid
         if not device.wifi_provisioned:
             device.wifi_provisioned = True
-            device.provisioned_at = datetime.now(timezone.utc)
+            device.provisioned_at = utcnow()
     
     db.commit()
+    system_stats.adjust(online=int(came_online), provisioned=int(newly_provisioned))
+    presence.touch(device_id)
     
     # Send pending commands to device
     pending_commands = db.query(DeviceCommand).filter(
@@ -88,7 +108,9 @@ async def device_heartbeat_v1(device_id: str, heartbeat: DeviceHeartbeat, db: Se
             "params": json.loads(cmd.params) if cmd.params else {}
         })
         cmd.status = "sent"
+        cmd.next_attempt_at = None
     
+    device_list_cache.bump_sync(db, device.user_id)
     db.commit()
     
     return {"status": "ok", "commands": commands_to_send}
@@ -128,7 +150,9 @@ async def pair_device_v1(device_id: str, user_data: dict, db: Session = Depends(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
+    previous_user_id = device.user_id
     device.user_id = user_data.get("user_id")
+    device_list_cache.bump_sync(db, previous_user_id, device.user_id)
     db.commit()
     
     return {"status": "paired", "device_id": device_id}
@@ -145,11 +169,18 @@ async def update_wifi_provisioning_v1(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
+    newly_provisioned = not device.wifi_provisioned
     device.wifi_provisioned = True
     device.wifi_ssid = wifi_data.wifi_ssid
-    device.provisioned_at = wifi_data.provisioned_at or datetime.utcnow()
+    provisioned_at = wifi_data.provisioned_at
+    if provisioned_at is not None and provisioned_at.tzinfo is not None:
+        # Column is a naive DateTime holding UTC
+        provisioned_at = provisioned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    device.provisioned_at = provisioned_at or utcnow()
     
+    device_list_cache.bump_sync(db, device.user_id)
     db.commit()
+    system_stats.adjust(provisioned=int(newly_provisioned))
     
     return {"status": "updated", "device_id": device_id}
 
@@ -223,7 +254,12 @@ async def add_content_v1(content_data: ContentCreate, db: Session = Depends(get_
     )
     
     db.add(content)
+    record_change_sync(db, content.content_id)
+    index_content_sync(db, content.content_id)
+    content_library_cache.bump_sync(db)
     db.commit()
+    await content_cache.invalidate([content.content_id])
+    system_stats.adjust(content=1)
     
     return {"status": "added", "content_id": content.content_id}
 
@@ -236,7 +272,12 @@ async def delete_content_v1(content_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Content not found")
     
     db.delete(content)
+    record_change_sync(db, content_id, deleted=True)
+    unindex_content_sync(db, content_id)
+    content_library_cache.bump_sync(db)
     db.commit()
+    await content_cache.invalidate([content_id])
+    system_stats.adjust(content=-1)
     
     return {"status": "deleted", "content_id": content_id}
 
@@ -257,7 +298,8 @@ async def send_device_command_v1(
     command = DeviceCommand(
         device_id=device_id,
         command=command_data.command,
-        params=json.dumps(command_data.params)
+        params=json.dumps(command_data.params),
+        **new_command_fields()
     )
     
     db.add(command)
@@ -272,6 +314,8 @@ async def send_device_command_v1(
                 "params": command_data.params
             }))
             command.status = "sent"
+            # v1 devices never ack, so no redelivery deadline; expires_at still ends it
+            command.next_attempt_at = None
             db.commit()
         except:
             pass  # Will be sent on next heartbeat
@@ -318,6 +362,7 @@ async def update_device_settings_v1(
         raise HTTPException(status_code=404, detail="Device not found")
     
     device.settings = settings.json()
+    device_list_cache.bump_sync(db, device.user_id)
     db.commit()
     
     # Send settings update command
@@ -337,18 +382,24 @@ async def log_usage_analytics_v1(
     db: Session = Depends(get_db)
 ):
     """Log device usage analytics."""
-    analytics = UsageAnalytics(
-        device_id=analytics_data.device_id,
-        content_id=analytics_data.content_id,
-        action=analytics_data.action,
-        duration=analytics_data.duration,
-        session_id=analytics_data.session_id
-    )
+    row = {
+        "id": uuid7(),
+        "device_id": analytics_data.device_id,
+        "content_id": analytics_data.content_id,
+        "action": analytics_data.action,
+        "duration": analytics_data.duration,
+        "session_id": analytics_data.session_id,
+        "timestamp": utcnow()
+    }
     
-    db.add(analytics)
+    # Events live in monthly tables (services/partitions.py)
+    month = month_start(row["timestamp"])
+    usage_partitions.ensure_sync(db, [month])
+    db.execute(insert(partition_table(month)).values(row))
     db.commit()
+    usage_rollups.record([row])
     
-    return {"status": "logged", "timestamp": analytics.timestamp}
+    return {"status": "logged", "timestamp": row["timestamp"]}
 
 @router.get("/analytics/usage/{device_id}", tags=["Analytics"], summary="Get device usage analytics", deprecated=True)
 async def get_usage_analytics(
@@ -357,12 +408,14 @@ async def get_usage_analytics(
     db: Session = Depends(get_db)
 ):
     """Get usage analytics for a specific device."""
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    start_date = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
     
-    analytics = db.query(UsageAnalytics).filter(
-        UsageAnalytics.device_id == device_id,
-        UsageAnalytics.timestamp >= start_date
-    ).all()
+    analytics = []
+    for table in usage_partitions.tables_for_sync(db, start_date):
+        analytics += db.execute(select(table).filter(
+            table.c.device_id == device_id,
+            table.c.timestamp >= start_date
+        )).all()
     
     return [
         {
@@ -382,11 +435,16 @@ async def device_websocket_v1(websocket: WebSocket, device_id: str):
     """WebSocket connection for devices."""
     await websocket.accept()
     device_connections[device_id] = websocket
+    presence.touch(device_id)
+    heartbeat_buffer.seen(device_id, utcnow())
     
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
+            # Socket traffic counts as activity; last_seen follows so the presence sweep agrees
+            presence.touch(device_id)
+            heartbeat_buffer.seen(device_id, utcnow())
             
             # Handle device responses
             if message.get("type") == "command_result":
@@ -397,7 +455,7 @@ async def device_websocket_v1(websocket: WebSocket, device_id: str):
                 ).first()
                 if command:
                     command.status = "completed" if message.get("success") else "failed"
-                    command.executed_at = datetime.utcnow()
+                    command.executed_at = utcnow()
                     db.commit()
                 db.close()
                 
@@ -458,48 +516,13 @@ async def get_system_stats_v1(db: Session = Depends(get_db)):
 @router.get("/", response_class=HTMLResponse, tags=["System"], summary="API Documentation Home", include_in_schema=False, deprecated=True)
 async def home_page_v1(request: Request):
     """Home page with API documentation and navigation."""
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    return templates.TemplateResponse("home.html", {
-        "request": request,
-        "navbar_html": navbar_html,
-        "footer_html": footer_html
-    })
+    return page_cache.response(request, "home")
 
-# Custom docs endpoints
+# Custom docs endpoints, prerendered with the navbar and footer (services/pages.py)
 @router.get("/docs", response_class=HTMLResponse, include_in_schema=False, deprecated=True)
 async def custom_swagger_ui_html_v1(request: Request):
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    custom_css = add_custom_color("#f4edf8")
-    
-    return HTMLResponse(
-        get_swagger_ui_html(
-        openapi_url=request.app.openapi_url,
-        title=request.app.title + " - Swagger UI",
-        swagger_js_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui-bundle.js",
-        swagger_css_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui.css",
-    ).body.decode().replace(
-        "<body>", 
-        f"<body>{navbar_html}{custom_css}"
-    ).replace(
-            "</body>",
-            f"{footer_html}</body>"
-        )
-    )
+    return page_cache.response(request, "swagger")
     
 @router.get("/redoc", response_class=HTMLResponse, include_in_schema=False, deprecated=True)
 async def custom_redoc_html_v1(request: Request):
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    custom_css = add_custom_color("#f4edf8")
-    
-    return HTMLResponse(
-        get_redoc_html(
-        openapi_url=request.app.openapi_url,
-        title=request.app.title + " - ReDoc",
-        redoc_js_url="https://cdn.jsdelivr.net/npm/redoc@2.1.2/bundles/redoc.standalone.js",
-    ).body.decode().replace(
-        "<body>", 
-        f"<body>{navbar_html}{custom_css}"
-    ).replace(
-            "</body>",
-            f"{footer_html}</body>"
-        ))
+    return page_cache.response(request, "redoc")
@@ -1,36 +1,59 @@
 from fastapi import APIRouter
 from fastapi import HTTPException, WebSocket, WebSocketDisconnect, Depends, Query
-from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.requests import Request
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import  Session
+from sqlalchemy import String, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
+import asyncio
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
-from db import SessionLocal, get_db
-from models.v2 import Content, Device, DeviceCommand, UsageAnalytics
-from schemas.v2 import ContentCreate, DeviceCommandRequest, DeviceHeartbeat, DeviceRegister, DeviceSettings, PlaybackCommand, UsageAnalyticsCreate, WiFiProvisionUpdate
-from utils.helper import add_custom_color, load_navbar_and_footer_html
+import config
+from db import AsyncSessionLocal, get_async_db
+from models.v2 import CommandJob, Content, Device, DeviceCommand
+from schemas.v2 import BulkCommandRequest, ContentCreate, DeviceCommandRequest, DeviceHeartbeat, DeviceRegister, DeviceSettings, PlaybackCommand, UsageAnalyticsCreate, UsageAnalyticsEvent, WiFiProvisionUpdate
+from services.admission import admission
+from services.analytics import ingest_usage_batch, insert_usage_rows, iter_usage_batches, usage_page, usage_row, usage_rows
+from services.backplane import backplane, device_channel
+from services.broadcaster import battery_event, broadcaster, command_status_event, device_status_event
+from services.cadence import heartbeat_cadence
+from services.content_cache import content_cache
+from services.content_feed import latest_seq, read_changes, record_change
+from services.content_search import index_content, search, unindex_content
+from services.dispatcher import TERMINAL_STATUSES, bulk_targets, claim_command, claim_commands, claim_for_heartbeat, dispatcher, has_pending, job_progress, new_command_fields, queue_bulk, record_ack, record_results, unclaim_command, unclaim_commands, utcnow
+from services.heartbeats import heartbeat_buffer
+from services.longpoll import command_waiters
+from services.pages import page_cache
+from services.partitions import usage_partitions
+from services.presence import presence
+from services.rollups import read_rollups, usage_rollups
+from services.sse import event_stream
+from services.response_cache import ALL, cached_json_response, content_library_cache, device_list_cache, etag_matches, not_modified_response
+from services.stats import system_stats
+from utils.ndjson import is_ndjson, iter_json_array, iter_ndjson
+from utils.pagination import keyset_page, page_limit, page_response
+from utils.serialization import FastJSONResponse, content_json, devices_json, parse_cache_info, parse_json_text, usage_json
+from utils.streaming import iter_row_batches, streaming_json_response, wants_stream
 
 
 router = APIRouter(
     tags=["API v2 - Current"],
     responses={404: {"description": "Not found"}},
+    default_response_class=FastJSONResponse,
 )
 
 # Global state for WebSocket connections
 device_connections: Dict[str, WebSocket] = {}
-mobile_connections: List[WebSocket] = []
-
-templates = Jinja2Templates(directory="templates")
 
 # Device Management Endpoints
 @router.post("/devices/register", tags=["Device Management"], summary="Register a new device")
-async def register_device_v2(device_data: DeviceRegister, db: Session = Depends(get_db)):
+async def register_device_v2(device_data: DeviceRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a device with the hosted API"""
-    device = db.query(Device).filter(Device.device_id == device_data.device_id).first()
+    admission.admit(device_data.device_id)
+    device = await db.get(Device, device_data.device_id)
+    is_new = device is None
+    was_online = bool(device and device.is_online)
     
     if device:
         # Update existing device
@@ -38,7 +61,7 @@ async def register_device_v2(device_data: DeviceRegister, db: Session = Depends(
         device.ip_address = device_data.ip_address
         device.firmware_version = device_data.firmware_version
         device.is_online = True
-        device.last_seen = datetime.now(timezone.utc)
+        device.last_seen = utcnow()
     else:
         # Create new device
         device = Device(
@@ -47,89 +70,143 @@ async def register_device_v2(device_data: DeviceRegister, db: Session = Depends(
             ip_address=device_data.ip_address,
             firmware_version=device_data.firmware_version,
             is_online=True,
-            last_seen=datetime.now(timezone.utc)
+            last_seen=utcnow()
         )
         db.add(device)
     
-    db.commit()
+    await device_list_cache.bump(db, device.user_id)
+    await db.commit()
+    system_stats.adjust(devices=int(is_new), online=int(not was_online))
+    presence.touch(device.device_id)
     return {"status": "registered", "device_id": device.device_id}
 
 @router.post("/devices/{device_id}/heartbeat", tags=["Device Management"], summary="Device heartbeat")
-async def device_heartbeat_v2(device_id: str, heartbeat: DeviceHeartbeat, db: Session = Depends(get_db)):
+async def device_heartbeat_v2(device_id: str, heartbeat: DeviceHeartbeat, db: AsyncSession = Depends(get_async_db)):
     """Receive heartbeat from device"""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    admission.admit(device_id)
+    device = await db.get(Device, device_id)
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    device.battery_level = heartbeat.battery_level
-    device.last_seen = datetime.now(timezone.utc)
-    device.is_online = True
+    seen_at = utcnow()
     
-    if heartbeat.wifi_ssid:
+    # First SSID report provisions the device; that one is written straight away
+    newly_provisioned = bool(heartbeat.wifi_ssid and not device.wifi_provisioned)
+    if newly_provisioned:
         device.wifi_ssid = heartbeat.wifi_ssid
-        if not device.wifi_provisioned:
-            device.wifi_provisioned = True
-            device.provisioned_at = datetime.now(timezone.utc)
-    
-    db.commit()
-    
-    # Send pending commands to device
-    pending_commands = db.query(DeviceCommand).filter(
-        DeviceCommand.device_id == device_id,
-        DeviceCommand.status == "pending"
-    ).all()
-    
-    commands_to_send = []
-    for cmd in pending_commands:
-        commands_to_send.append({
-            "id": cmd.id,
-            "command": cmd.command,
-            "params": json.loads(cmd.params) if cmd.params else {}
-        })
-        cmd.status = "sent"
-    
-    db.commit()
-    
-    return {"status": "ok", "commands": commands_to_send}
+        device.wifi_provisioned = True
+        device.provisioned_at = seen_at
+    
+    # Status lands in the coalescing buffer and is flushed in bulk
+    heartbeat_buffer.record(device_id, heartbeat.battery_level, seen_at, heartbeat.wifi_ssid)
+    presence.touch(device_id)
+    
+    # Results for commands from earlier heartbeats, then anything still pending
+    results = await record_results(db, device_id, [r.model_dump() for r in heartbeat.command_results])
+    commands_to_send = await claim_for_heartbeat(db, device_id)
+    
+    # Tell the owner's phones what changed
+    events = [command_status_event(device_id, device.user_id, r["command_id"], r["status"]) for r in results]
+    events += [command_status_event(device_id, device.user_id, cmd["id"], "sent") for cmd in commands_to_send]
+    if not device.is_online:
+        events.append(device_status_event(device_id, device.user_id, True))
+    if device.battery_level != heartbeat.battery_level:
+        events.append(battery_event(device_id, device.user_id, heartbeat.battery_level))
+    
+    device_changed = bool(db.dirty)
+    if device_changed:
+        await device_list_cache.bump(db, device.user_id)
+    if device_changed or results or commands_to_send:
+        await db.commit()
+    if newly_provisioned:
+        system_stats.adjust(provisioned=1)
+    
+    await broadcaster.publish(events)
+    
+    next_heartbeat_in = heartbeat_cadence.next_interval(bool(commands_to_send), device_id in device_connections)
+    return {"status": "ok", "commands": commands_to_send, "next_heartbeat_in": next_heartbeat_in}
+
+def device_payload(device: Device) -> dict:
+    return {
+        "device_id": device.device_id,
+        "device_name": device.device_name,
+        "user_id": device.user_id,
+        "is_online": device.is_online,
+        "last_seen": device.last_seen,
+        "battery_level": device.battery_level,
+        "ip_address": device.ip_address,
+        "firmware_version": device.firmware_version,
+        "wifi_provisioned": device.wifi_provisioned,
+        "wifi_ssid": device.wifi_ssid,
+        "settings": parse_json_text(device.settings, {}),
+        "created_at": device.created_at
+    }
+
+# Columns for streamed device listings, in device_payload order
+DEVICE_STREAM_COLUMNS = [
+    Device.device_id, Device.device_name, Device.user_id, Device.is_online, Device.last_seen,
+    Device.battery_level, Device.ip_address, Device.firmware_version, Device.wifi_provisioned,
+    Device.wifi_ssid, Device.settings, Device.created_at,
+]
 
 @router.get("/devices", tags=["Device Management"], summary="List all devices")
-async def get_devices_v2(user_id: Optional[str] = None, db: Session = Depends(get_db)):
-    """Get all devices (optionally filtered by user)"""
-    query = db.query(Device)
-    if user_id:
-        query = query.filter(Device.user_id == user_id)
-    
-    devices = query.all()
-    
-    return [
-        {
-            "device_id": device.device_id,
-            "device_name": device.device_name,
-            "user_id": device.user_id,
-            "is_online": device.is_online,
-            "last_seen": device.last_seen,
-            "battery_level": device.battery_level,
-            "ip_address": device.ip_address,
-            "firmware_version": device.firmware_version,
-            "wifi_provisioned": device.wifi_provisioned,
-            "wifi_ssid": device.wifi_ssid,
-            "settings": json.loads(device.settings) if device.settings else {},
-            "created_at": device.created_at
-        }
-        for device in devices
-    ]
+async def get_devices_v2(
+    request: Request,
+    user_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, description="Page size; returns {items, next_cursor} when set"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: bool = Query(False, description="Stream every device as a chunked JSON array (or NDJSON with Accept: application/x-ndjson)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all devices (optionally filtered by user).
+
+    Responses carry an ETag per user_id filter; send it back in If-None-Match
+    to get a 304 while nothing in that listing has changed. Pass `limit`
+    (and then `cursor`) to page through by device_id.
+    """
+    if wants_stream(request, stream):
+        query = select(*DEVICE_STREAM_COLUMNS)
+        if user_id:
+            query = query.filter(Device.user_id == user_id)
+        return streaming_json_response(request, iter_row_batches(query, [Device.device_id]), raw_json={"settings": "{}"})
+    
+    scope = user_id or ALL
+    page_size = page_limit(limit, cursor)
+    variant = (scope, page_size, cursor)
+    etag = await device_list_cache.etag(db, scope, variant)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    body = device_list_cache.get(scope, variant, etag)
+    if body is None:
+        query = select(Device)
+        if user_id:
+            query = query.filter(Device.user_id == user_id)
+        
+        if page_size is None:
+            devices = (await db.scalars(query)).all()
+            body = devices_json.dump_list([device_payload(device) for device in devices])
+        else:
+            query = keyset_page(query, [Device.device_id], cursor, page_size)
+            devices = (await db.scalars(query)).all()
+            body = devices_json.dump_page(page_response(devices, page_size, lambda d: [d.device_id], device_payload))
+        device_list_cache.put(scope, variant, etag, body)
+    
+    return cached_json_response(body, etag)
 
 @router.post("/devices/{device_id}/pair", tags=["Device Management"], summary="Pair device with user")
-async def pair_device_v2(device_id: str, user_data: dict, db: Session = Depends(get_db)):
+async def pair_device_v2(device_id: str, user_data: dict, db: AsyncSession = Depends(get_async_db)):
     """Pair device with user"""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await db.get(Device, device_id)
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
+    previous_user_id = device.user_id
     device.user_id = user_data.get("user_id")
-    db.commit()
+    await device_list_cache.bump(db, previous_user_id, device.user_id)
+    await db.commit()
     
     return {"status": "paired", "device_id": device_id}
 
@@ -137,34 +214,57 @@ async def pair_device_v2(device_id: str, user_data: dict, db: Session = Depends(
 async def update_wifi_provisioning_v2(
     device_id: str,
     wifi_data: WiFiProvisionUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update device WiFi provisioning status."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await db.get(Device, device_id)
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
+    newly_provisioned = not device.wifi_provisioned
     device.wifi_provisioned = True
     device.wifi_ssid = wifi_data.wifi_ssid
-    device.provisioned_at = wifi_data.provisioned_at or datetime.utcnow()
+    provisioned_at = wifi_data.provisioned_at
+    if provisioned_at is not None and provisioned_at.tzinfo is not None:
+        # Column is a naive DateTime holding UTC
+        provisioned_at = provisioned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    device.provisioned_at = provisioned_at or utcnow()
     
-    db.commit()
+    await device_list_cache.bump(db, device.user_id)
+    await db.commit()
+    system_stats.adjust(provisioned=int(newly_provisioned))
     
     return {"status": "updated", "device_id": device_id}
 
 # Content Management
-@router.get("/content/library", tags=["Content Management"], summary="Get content library")
-async def get_content_library_v2(
-    content_type: Optional[str] = Query(None, description="Filter by content type"),
-    age_min: Optional[int] = Query(None, description="Minimum age filter"),
-    age_max: Optional[int] = Query(None, description="Maximum age filter"),
-    premium_only: Optional[bool] = Query(None, description="Show premium content only"),
-    db: Session = Depends(get_db)
-):
-    """Get content library"""
-    query = db.query(Content)
-    
+def content_payload(item: Content) -> dict:
+    return {
+        "content_id": item.content_id,
+        "title": item.title,
+        "type": item.type,
+        "age_range": f"{item.age_range_min}-{item.age_range_max}",
+        "duration": item.duration,
+        "file_url": item.file_url,
+        "thumbnail_url": item.thumbnail_url,
+        "file_size": item.file_size,
+        "checksum": item.checksum,
+        "description": item.description,
+        "tags": parse_json_text(item.tags, []),
+        "is_premium": item.is_premium,
+        "created_at": item.created_at
+    }
+
+# Columns for streamed content listings, in content_payload order
+CONTENT_STREAM_COLUMNS = [
+    Content.content_id, Content.title, Content.type,
+    (cast(Content.age_range_min, String) + "-" + cast(Content.age_range_max, String)).label("age_range"),
+    Content.duration, Content.file_url, Content.thumbnail_url, Content.file_size, Content.checksum,
+    Content.description, Content.tags, Content.is_premium, Content.created_at,
+]
+
+def filter_content(query, content_type: Optional[str], age_min: Optional[int], age_max: Optional[int], premium_only: Optional[bool]):
+    """Apply the content library filters to a select."""
     if content_type:
         query = query.filter(Content.type == content_type)
     
@@ -176,33 +276,119 @@ async def get_content_library_v2(
     
     if premium_only is not None:
         query = query.filter(Content.is_premium == premium_only)
-    
-    content_items = query.all()
-    
-    return [
-        {
-            "content_id": item.content_id,
-            "title": item.title,
-            "type": item.type,
-            "age_range": f"{item.age_range_min}-{item.age_range_max}",
-            "duration": item.duration,
-            "file_url": item.file_url,
-            "thumbnail_url": item.thumbnail_url,
-            "file_size": item.file_size,
-            "checksum": item.checksum,
-            "description": item.description,
-            "tags": json.loads(item.tags) if item.tags else [],
-            "is_premium": item.is_premium,
-            "created_at": item.created_at
-        }
-        for item in content_items
-    ]
+    return query
+
+@router.get("/content/library", tags=["Content Management"], summary="Get content library")
+async def get_content_library_v2(
+    request: Request,
+    content_type: Optional[str] = Query(None, description="Filter by content type"),
+    age_min: Optional[int] = Query(None, description="Minimum age filter"),
+    age_max: Optional[int] = Query(None, description="Maximum age filter"),
+    premium_only: Optional[bool] = Query(None, description="Show premium content only"),
+    ids: Optional[str] = Query(None, description="Comma-separated content_ids to look up; other filters are ignored"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size; returns {items, next_cursor} when set"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: bool = Query(False, description="Stream every item as a chunked JSON array (or NDJSON with Accept: application/x-ndjson)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get content library.
+
+    Responses carry a strong ETag tied to the library version; send it back in
+    If-None-Match to get a 304 until content is added or deleted. Pass `limit`
+    (and then `cursor`) to page through by content_id. Pass `ids` to fetch
+    just those items, in the order given; unknown ids are left out.
+    """
+    if ids is not None:
+        content_ids = [content_id for content_id in ids.split(",") if content_id]
+        if len(content_ids) > config.PAGE_MAX_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {config.PAGE_MAX_LIMIT} ids per request")
+        found = await content_cache.get_many(db, content_ids, content_payload)
+        return Response(content=content_json.dump_list([found[c] for c in dict.fromkeys(content_ids) if c in found]), media_type="application/json")
+    
+    def filtered(query):
+        return filter_content(query, content_type, age_min, age_max, premium_only)
+    
+    if wants_stream(request, stream):
+        query = filtered(select(*CONTENT_STREAM_COLUMNS))
+        return streaming_json_response(request, iter_row_batches(query, [Content.content_id]), raw_json={"tags": "[]"})
+    
+    page_size = page_limit(limit, cursor)
+    variant = (content_type, age_min, age_max, premium_only, page_size, cursor)
+    etag = await content_library_cache.etag(db, ALL, variant)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    body = content_library_cache.get(ALL, variant, etag)
+    if body is None:
+        query = filtered(select(Content))
+        
+        if page_size is None:
+            content_items = (await db.scalars(query)).all()
+            body = content_json.dump_list([content_payload(item) for item in content_items])
+        else:
+            query = keyset_page(query, [Content.content_id], cursor, page_size)
+            content_items = (await db.scalars(query)).all()
+            body = content_json.dump_page(page_response(content_items, page_size, lambda c: [c.content_id], content_payload))
+        content_library_cache.put(ALL, variant, etag, body)
+    
+    return cached_json_response(body, etag)
+
+@router.get("/content/search", tags=["Content Management"], summary="Search content")
+async def search_content_v2(
+    q: str = Query(..., min_length=1, description="Words to find in title, tags and description; each may be the start of a word"),
+    content_type: Optional[str] = Query(None, description="Filter by content type"),
+    age_min: Optional[int] = Query(None, description="Minimum age filter"),
+    age_max: Optional[int] = Query(None, description="Maximum age filter"),
+    premium_only: Optional[bool] = Query(None, description="Show premium content only"),
+    limit: int = Query(20, ge=1, le=config.PAGE_MAX_LIMIT, description="Most results to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search the content library, best matches first."""
+    filtered = None
+    if any(value is not None for value in (content_type, age_min, age_max, premium_only)):
+        filtered = lambda query: filter_content(query, content_type, age_min, age_max, premium_only)
+    items = await search(db, q, limit, filtered)
+    return Response(content=content_json.dump_list([content_payload(item) for item in items or []]), media_type="application/json")
+
+@router.get("/content/library/{content_id}", tags=["Content Management"], summary="Get one content item")
+async def get_content_item_v2(content_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get a single content item, served from memory once it has been looked up."""
+    found = await content_cache.get_many(db, [content_id], content_payload)
+    if content_id not in found:
+        raise HTTPException(status_code=404, detail="Content not found")
+    return found[content_id]
+
+@router.get("/content/changes", tags=["Content Management"], summary="Content changes since a cursor")
+async def get_content_changes_v2(
+    since: int = Query(0, ge=0, description="next_since from the previous call; 0 for everything"),
+    limit: Optional[int] = Query(None, ge=1, description="Changes per page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Inserts/updates (`upsert`, with the item) and deletes (`delete`) after `since`, oldest first.
+
+    Keep `next_since` and pass it back next time; call again straight away
+    while `has_more` is true. Each item appears once, at its latest change.
+    `reset` means the cursor is ahead of the server (e.g. a restored
+    database); start again from 0.
+    """
+    page_size = min(limit or config.PAGE_DEFAULT_LIMIT, config.PAGE_MAX_LIMIT)
+    pairs, has_more = await read_changes(db, since, page_size)
+    if not pairs and since > await latest_seq(db):
+        return {"changes": [], "next_since": 0, "has_more": True, "reset": True}
+    
+    changes = []
+    for change, content in pairs:
+        if change.deleted or content is None:
+            changes.append({"seq": change.seq, "op": "delete", "content_id": change.content_id})
+        else:
+            changes.append({"seq": change.seq, "op": "upsert", "content": content_payload(content)})
+    return {"changes": changes, "next_since": pairs[-1][0].seq if pairs else since, "has_more": has_more}
 
 @router.post("/content/library", tags=["Content Management"], summary="Add content to library")
-async def add_content_v2(content_data: ContentCreate, db: Session = Depends(get_db)):
+async def add_content_v2(content_data: ContentCreate, db: AsyncSession = Depends(get_async_db)):
     """Add content to library"""
     # Check if content already exists
-    existing = db.query(Content).filter(Content.content_id == content_data.content_id).first()
+    existing = await db.get(Content, content_data.content_id)
     if existing:
         raise HTTPException(status_code=400, detail="Content ID already exists")
     
@@ -223,20 +409,30 @@ async def add_content_v2(content_data: ContentCreate, db: Session = Depends(get_
     )
     
     db.add(content)
-    db.commit()
+    await record_change(db, content.content_id)
+    await index_content(db, content.content_id)
+    await content_library_cache.bump(db)
+    await db.commit()
+    await content_cache.invalidate([content.content_id])
+    system_stats.adjust(content=1)
     
     return {"status": "added", "content_id": content.content_id}
 
 @router.delete("/content/library/{content_id}", tags=["Content Management"], summary="Delete content")
-async def delete_content_v2(content_id: str, db: Session = Depends(get_db)):
+async def delete_content_v2(content_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete content from library."""
-    content = db.query(Content).filter(Content.content_id == content_id).first()
+    content = await db.get(Content, content_id)
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    db.delete(content)
-    db.commit()
+    await db.delete(content)
+    await record_change(db, content_id, deleted=True)
+    await unindex_content(db, content_id)
+    await content_library_cache.bump(db)
+    await db.commit()
+    await content_cache.invalidate([content_id])
+    system_stats.adjust(content=-1)
     
     return {"status": "deleted", "content_id": content_id}
 
@@ -245,41 +441,157 @@ async def delete_content_v2(content_id: str, db: Session = Depends(get_db)):
 async def send_device_command_v2(
     device_id: str, 
     command_data: DeviceCommandRequest, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a command to a specific device."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await db.get(Device, device_id)
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    # Create command
+    return await queue_command(db, device, command_data.command, json.dumps(command_data.params), command_data.ttl_seconds)
+
+async def queue_command(db: AsyncSession, device: Device, command: str, params_json: str, ttl_seconds: Optional[int] = None) -> dict:
+    """Commit a command for the device (with any other pending changes in `db`) and hand it to the dispatcher."""
+    # The committed row is the outbox; the dispatcher delivers it and retries until acked or expired
     command = DeviceCommand(
-        device_id=device_id,
-        command=command_data.command,
-        params=json.dumps(command_data.params)
+        device_id=device.device_id,
+        command=command,
+        params=params_json,
+        **new_command_fields(ttl_seconds)
     )
     
     db.add(command)
-    db.commit()
+    await db.commit()
+    dispatcher.notify()
+    await command_waiters.announce([device.device_id])
+    await broadcaster.publish([command_status_event(device.device_id, device.user_id, command.id, "pending")])
     
-    # Try to send immediately via WebSocket if device is connected
-    if device_id in device_connections:
-        try:
-            await device_connections[device_id].send_text(json.dumps({
-                "id": command.id,
-                "command": command.command,
-                "params": command_data.params
-            }))
-            command.status = "sent"
-            db.commit()
-        except:
-            pass  # Will be sent on next heartbeat
-    
-    return {"status": "queued", "command_id": command.id}
+    return {"status": "queued", "command_id": command.id, "expires_at": command.expires_at}
+
+@router.get("/devices/{device_id}/commands", tags=["Device Control"], summary="Wait for commands (long poll)")
+async def poll_device_commands_v2(
+    device_id: str,
+    wait: float = Query(0, ge=0, le=config.LONG_POLL_MAX_WAIT, description="Seconds to wait for a command before returning empty"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Pending commands for the device, claimed as sent like in a heartbeat response.
+
+    With nothing pending and `wait` > 0, the request is held until a command
+    is queued for the device or `wait` seconds pass. No database connection
+    is held while waiting. Report results in the next heartbeat, or ack over
+    the WebSocket.
+    """
+    if wait > 0 and command_waiters.full:
+        command_waiters.rejected += 1
+        raise HTTPException(status_code=429, detail="Too many parked requests, retry later", headers={"Retry-After": str(max(1, round(wait)))})
+    
+    device = await db.get(Device, device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    user_id = device.user_id
+    
+    deadline = asyncio.get_running_loop().time() + wait
+    async with command_waiters.watch(device_id) as watcher:
+        while True:
+            commands = await claim_for_heartbeat(db, device_id) if await has_pending(db, device_id) else []
+            # Ends the transaction and hands the connection back before parking
+            await db.commit()
+            remaining = deadline - asyncio.get_running_loop().time()
+            if commands or remaining <= 0 or not await watcher.wait(remaining):
+                break
+    
+    await broadcaster.publish([command_status_event(device_id, user_id, cmd["id"], "sent") for cmd in commands])
+    return {"commands": commands}
+
+@router.post("/commands/bulk", tags=["Device Control"], summary="Send a command to many devices")
+async def send_bulk_command_v2(command_data: BulkCommandRequest, db: AsyncSession = Depends(get_async_db)):
+    """Queue one command for a list of devices and/or every device matching a filter.
+
+    `device_ids`, `user_id`, `firmware_version` and `online` combine with AND.
+    Devices with a WebSocket on this worker get the command straight away;
+    the dispatcher delivers the rest. Follow it with GET /commands/jobs/{job_id}.
+    """
+    target = command_data.model_dump(include={"device_ids", "user_id", "firmware_version", "online"}, exclude_none=True)
+    if not target:
+        raise HTTPException(status_code=400, detail="Give device_ids or at least one filter (user_id, firmware_version, online)")
+    
+    users = await bulk_targets(db, **target)
+    if len(users) > config.COMMAND_BULK_MAX_DEVICES:
+        raise HTTPException(status_code=400, detail=f"More than {config.COMMAND_BULK_MAX_DEVICES} devices match; narrow the target")
+    
+    params_json = json.dumps(command_data.params)
+    job, commands = await queue_bulk(db, users, command_data.command, params_json, target, command_data.ttl_seconds)
+    # Commands for sockets on this worker are claimed in the same transaction, so the dispatcher leaves them to us
+    claimed = set(await claim_commands(db, [commands[device_id] for device_id in commands if device_id in device_connections]))
+    await db.commit()
+    dispatcher.notify()
+    await command_waiters.announce(device_id for device_id, command_id in commands.items() if command_id not in claimed)
+    await broadcaster.publish([command_status_event(device_id, users[device_id], command_id, "pending") for device_id, command_id in commands.items()])
+    
+    messages = {
+        device_id: {"id": command_id, "command": command_data.command, "params": command_data.params or {}}
+        for device_id, command_id in commands.items() if command_id in claimed
+    }
+    pushed = await push_claimed_commands(messages, users)
+    
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "total": job.total,
+        "pushed": pushed,
+        "unknown_device_ids": sorted(set(command_data.device_ids) - users.keys()) if command_data.device_ids is not None else [],
+        "expires_at": job.expires_at
+    }
+
+@router.get("/commands/jobs/{job_id}", tags=["Device Control"], summary="Get bulk command progress")
+async def get_command_job_v2(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Per-status counts for the commands of a bulk job; `done` counts completed, failed and expired."""
+    job = await db.get(CommandJob, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    counts = await job_progress(db, job_id)
+    done = sum(counts[status] for status in TERMINAL_STATUSES)
+    return {
+        "job_id": job.id,
+        "command": job.command,
+        "params": parse_json_text(job.params, {}),
+        "target": parse_json_text(job.target, {}),
+        "total": job.total,
+        "counts": counts,
+        "done": done,
+        "progress": round(done / job.total, 4) if job.total else 1.0,
+        "created_at": job.created_at,
+        "expires_at": job.expires_at
+    }
+
+@router.get("/commands/{command_id}", tags=["Device Control"], summary="Get command delivery status")
+async def get_command_status_v2(command_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Where a command is in its lifecycle: pending, sent, acked, completed, failed or expired."""
+    command = await db.get(DeviceCommand, command_id)
+    
+    if not command:
+        raise HTTPException(status_code=404, detail="Command not found")
+    
+    return {
+        "id": command.id,
+        "device_id": command.device_id,
+        "command": command.command,
+        "params": json.loads(command.params) if command.params else {},
+        "status": command.status,
+        "attempts": command.attempts,
+        "created_at": command.created_at,
+        "sent_at": command.sent_at,
+        "acked_at": command.acked_at,
+        "executed_at": command.executed_at,
+        "expires_at": command.expires_at,
+        "last_error": command.last_error
+    }
 
 @router.post("/playback/play", tags=["Device Control"], summary="Play content on device")
-async def play_content_v2(playback: PlaybackCommand, db: Session = Depends(get_db)):
+async def play_content_v2(playback: PlaybackCommand, db: AsyncSession = Depends(get_async_db)):
     """Play specific content on a device."""
     return await send_device_command_v2(
         playback.device_id,
@@ -296,7 +608,7 @@ async def play_content_v2(playback: PlaybackCommand, db: Session = Depends(get_d
 @router.post("/playback/stop", tags=["Device Control"], summary="Stop playback")
 async def stop_playback_v2(
     device_id: str = Query(..., description="Device ID to stop playback"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Stop playback on a device."""
     return await send_device_command_v2(
@@ -309,197 +621,317 @@ async def stop_playback_v2(
 async def update_device_settings_v2(
     device_id: str, 
     settings: DeviceSettings, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update device settings."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await db.get(Device, device_id)
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    device.settings = settings.json()
-    db.commit()
+    # Serialized once: the same text is stored on the device and sent as the command's params
+    settings_json = settings.model_dump_json()
+    device.settings = settings_json
     
-    # Send settings update command
-    return await send_device_command_v2(
-        device_id,
-        DeviceCommandRequest(
-            command="update_settings",
-            params=settings.model_dump()
-        ),
-        db
-    )
+    await device_list_cache.bump(db, device.user_id)
+    
+    # Send settings update command, committed together with the new settings
+    result = await queue_command(db, device, "update_settings", settings_json)
+    return result
 
 # Analytics
 @router.post("/analytics/usage", tags=["Analytics"], summary="Log usage analytics")
 async def log_usage_analytics_v2(
     analytics_data: UsageAnalyticsCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Log device usage analytics."""
-    analytics = UsageAnalytics(
-        device_id=analytics_data.device_id,
-        content_id=analytics_data.content_id,
-        action=analytics_data.action,
-        duration=analytics_data.duration,
-        session_id=analytics_data.session_id
-    )
+    received_at = utcnow()
+    row = usage_row(UsageAnalyticsEvent(**analytics_data.model_dump()), received_at)
+    
+    await insert_usage_rows(db, [row])
+    await db.commit()
+    usage_rollups.record([row])
     
-    db.add(analytics)
-    db.commit()
+    return {"status": "logged", "timestamp": received_at}
+
+@router.post(
+    "/analytics/usage/batch",
+    tags=["Analytics"],
+    summary="Log a batch of usage analytics events",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": UsageAnalyticsEvent.model_json_schema()}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "One event object per line"}},
+            },
+        }
+    },
+)
+async def log_usage_analytics_batch_v2(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Log many usage events at once, as a JSON array or an NDJSON stream.
+
+    Events are written with one bulk insert per chunk, and every item gets its
+    own status (accepted, rejected or failed) in the response.
+    """
+    if is_ndjson(request.headers.get("content-type", "")):
+        items = iter_ndjson(request.stream())
+    else:
+        try:
+            items = list(iter_json_array(await request.body()))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Body must be a JSON array of events: {e}")
+        if len(items) > config.ANALYTICS_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch limit is {config.ANALYTICS_BATCH_MAX_ITEMS} events")
     
-    return {"status": "logged", "timestamp": analytics.timestamp}
+    return await ingest_usage_batch(db, items)
+
+# Fields returned per event, in response order
+USAGE_FIELDS = ["id", "content_id", "action", "duration", "session_id", "timestamp"]
 
 @router.get("/analytics/usage/{device_id}", tags=["Analytics"], summary="Get device usage analytics")
 async def get_usage_analytics(
+    request: Request,
     device_id: str,
     days: int = Query(7, description="Number of days to retrieve"),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, description="Page size; returns {items, next_cursor} when set"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: bool = Query(False, description="Stream every event as a chunked JSON array (or NDJSON with Accept: application/x-ndjson)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get usage analytics for a specific device."""
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
-    
-    analytics = db.query(UsageAnalytics).filter(
-        UsageAnalytics.device_id == device_id,
-        UsageAnalytics.timestamp >= start_date
-    ).all()
-    
-    return [
-        {
-            "id": a.id,
-            "content_id": a.content_id,
-            "action": a.action,
-            "duration": a.duration,
-            "session_id": a.session_id,
-            "timestamp": a.timestamp
-        }
-        for a in analytics
-    ]
+    """Get usage analytics for a specific device.
+
+    Pass `limit` (and then `cursor`) to page through newest first. Only the
+    monthly partitions overlapping the window are read.
+    """
+    start_date = utcnow() - timedelta(days=days)
+    
+    if wants_stream(request, stream):
+        return streaming_json_response(request, iter_usage_batches(device_id, start_date, USAGE_FIELDS))
+    
+    page_size = page_limit(limit, cursor)
+    if page_size is None:
+        analytics = await usage_rows(db, device_id, start_date, USAGE_FIELDS)
+        return Response(content=usage_json.dump_list(analytics), media_type="application/json")
+    
+    # (timestamp, id) so rows sharing a timestamp are neither skipped nor repeated
+    analytics = await usage_page(db, device_id, start_date, USAGE_FIELDS, cursor, page_size)
+    page = page_response(analytics, page_size, lambda a: [a["timestamp"], a["id"]], dict)
+    return Response(content=usage_json.dump_page(page), media_type="application/json")
+
+async def rollup_response(db: AsyncSession, scope: str, key: str, period: str, days: int) -> dict:
+    buckets = await read_rollups(db, period, scope, key, utcnow() - timedelta(days=days))
+    totals = {name: sum(bucket[name] for bucket in buckets) for name in ("events", "plays", "completes", "total_duration")}
+    return {
+        scope + "_id": key,
+        "period": period,
+        "buckets": buckets,
+        "totals": totals,
+        # Events newer than this many seconds may not be counted yet
+        "rollup_lag_seconds": round(usage_rollups.lag_seconds(), 3),
+        "last_flush_at": usage_rollups.last_flush_at,
+    }
+
+@router.get("/analytics/rollups/devices/{device_id}", tags=["Analytics"], summary="Get hourly/daily usage rollups for a device")
+async def get_device_rollups(
+    device_id: str,
+    period: str = Query("day", pattern="^(hour|day)$", description="Bucket size: hour or day"),
+    days: int = Query(7, ge=1, le=400, description="Number of days to retrieve"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Plays, completes, total duration and unique sessions per bucket for a device.
+
+    Read from the rollup tables only. `rollup_lag_seconds` is how far behind
+    the raw events they may be on this worker.
+    """
+    return await rollup_response(db, "device", device_id, period, days)
+
+@router.get("/analytics/rollups/content/{content_id}", tags=["Analytics"], summary="Get hourly/daily usage rollups for a content item")
+async def get_content_rollups(
+    content_id: str,
+    period: str = Query("day", pattern="^(hour|day)$", description="Bucket size: hour or day"),
+    days: int = Query(7, ge=1, le=400, description="Number of days to retrieve"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Plays, completes, total duration and unique sessions per bucket for a content item, across all devices."""
+    return await rollup_response(db, "content", content_id, period, days)
 
 # WebSocket endpoints
+async def push_command(device_id: str, message: dict, user_id: Optional[str] = None) -> bool:
+    """Send a pending command over this worker's socket for the device.
+
+    The command is claimed (pending -> sent) before it goes out so a heartbeat
+    racing with us can't deliver it twice; if the send fails it goes back to
+    pending for the dispatcher's next pass.
+    """
+    websocket = device_connections.get(device_id)
+    if websocket is None:
+        return False
+    
+    async with AsyncSessionLocal() as db:
+        claimed = await claim_command(db, message["id"])
+        await db.commit()
+    if not claimed:
+        return False
+    
+    try:
+        await websocket.send_text(json.dumps(message))
+    except Exception as e:
+        async with AsyncSessionLocal() as db:
+            await unclaim_command(db, message["id"], f"WebSocket send failed: {e}")
+            await db.commit()
+        return False
+    
+    await broadcaster.publish([command_status_event(device_id, user_id, message["id"], "sent")])
+    return True
+
+async def push_claimed_commands(messages: Dict[str, dict], users: Dict[str, Optional[str]]) -> int:
+    """Send already-claimed commands over this worker's sockets, all at once. Failed sends go back to pending."""
+    async def send(device_id: str, message: dict):
+        await device_connections[device_id].send_text(json.dumps(message))
+    
+    results = await asyncio.gather(*(send(device_id, message) for device_id, message in messages.items()), return_exceptions=True)
+    failed = {device_id: result for device_id, result in zip(messages, results) if result is not None}
+    if failed:
+        async with AsyncSessionLocal() as db:
+            await unclaim_commands(db, [messages[device_id]["id"] for device_id in failed], "WebSocket send failed")
+            await db.commit()
+    
+    await broadcaster.publish([
+        command_status_event(device_id, users.get(device_id), message["id"], "sent")
+        for device_id, message in messages.items() if device_id not in failed
+    ])
+    return len(messages) - len(failed)
+
+async def _on_backplane_command(channel: str, message: dict):
+    await push_command(channel.split(":", 1)[1], message["command"], message["user_id"])
+
 @router.websocket("/ws/device/{device_id}")
 async def device_websocket_v2(websocket: WebSocket, device_id: str):
     """WebSocket connection for devices."""
     await websocket.accept()
     device_connections[device_id] = websocket
+    presence.touch(device_id)
+    heartbeat_buffer.seen(device_id, utcnow())
+    await backplane.subscribe(device_channel(device_id), _on_backplane_command)
+    # Whatever queued up while the device was away goes out now rather than on the next dispatcher pass
+    await dispatcher.deliver_pending(device_id)
     
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
+            # Socket traffic counts as activity; last_seen follows so the presence sweep agrees
+            presence.touch(device_id)
+            heartbeat_buffer.seen(device_id, utcnow())
             
             # Handle device responses
-            if message.get("type") == "command_result":
-                # Update command status in database
-                db = SessionLocal()
-                command = db.query(DeviceCommand).filter(
-                    DeviceCommand.id == message.get("command_id")
-                ).first()
-                if command:
-                    command.status = "completed" if message.get("success") else "failed"
-                    command.executed_at = datetime.utcnow()
-                    db.commit()
-                db.close()
+            if message.get("type") in ("command_ack", "command_result"):
+                async with AsyncSessionLocal() as db:
+                    if message["type"] == "command_ack":
+                        change = await record_ack(db, device_id, message.get("command_id"))
+                        changes = [change] if change else []
+                    else:
+                        changes = await record_results(db, device_id, [message])
+                    device = await db.get(Device, device_id) if changes else None
+                    await db.commit()
+                user_id = device.user_id if device else None
+                await broadcaster.publish([command_status_event(device_id, user_id, c["command_id"], c["status"]) for c in changes])
                 
     except WebSocketDisconnect:
-        if device_id in device_connections:
+        # A reconnect may already have replaced this socket
+        if device_connections.get(device_id) is websocket:
             del device_connections[device_id]
+            await backplane.unsubscribe(device_channel(device_id))
 
 @router.websocket("/ws/mobile")
-async def mobile_websocket_v2(websocket: WebSocket):
-    """WebSocket connection for mobile apps."""
+async def mobile_websocket_v2(websocket: WebSocket, user_id: Optional[str] = None):
+    """WebSocket connection for mobile apps.
+
+    Pushes device_status, battery and command_status events for the devices
+    of `user_id` (all devices if omitted). An `overflow` frame means events
+    were dropped because the app fell behind; refetch /devices to resync.
+    """
     await websocket.accept()
-    mobile_connections.append(websocket)
-    
-    try:
-        while True:
-            data = await websocket.receive_text()
-            # Handle mobile app messages if needed
-            
-    except WebSocketDisconnect:
-        mobile_connections.remove(websocket)
-        
+    await broadcaster.serve(websocket, user_id)
+
+@router.get("/events", tags=["Real-time"], summary="Server-Sent Events stream")
+async def event_stream_v2(request: Request, user_id: Optional[str] = None, last_event_id: Optional[str] = Query(None, description="Resume after this event id (same as the Last-Event-ID header)")):
+    """device_status, battery and command_status events as text/event-stream.
+
+    The same events as /ws/mobile, for clients whose proxies break
+    WebSockets. Reconnects with Last-Event-ID replay missed events from
+    memory. A `reset` event means some could not be replayed; refetch
+    /devices. A `stats` event (the /stats counters) is sent when the
+    stream is quiet.
+    """
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_stream.stream(user_id, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # System endpoints
 @router.get("/health", tags=["System"], summary="Health check")
 async def health_check_v2():
     """API health check endpoint."""
     return {
         "status": "healthy",
-        "timestamp": datetime.now(timezone.utc),
+        "timestamp": utcnow(),
         "version": "2.0.0"
     }
 
 @router.get("/stats", tags=["System"], summary="System statistics")
-async def get_system_stats_v2(db: Session = Depends(get_db)):
-    """Get system statistics."""
-    total_devices = db.query(Device).count()
-    online_devices = db.query(Device).filter(Device.is_online == True).count()
-    provisioned_devices = db.query(Device).filter(Device.wifi_provisioned == True).count()
-    total_content = db.query(Content).count()
-    
+async def get_system_stats_v2():
+    """Get system statistics.
+
+    Served from in-memory counters; `computed_at` is when they were last
+    recounted from the database.
+    """
+    if system_stats.computed_at is None:
+        await system_stats.reconcile()
     return {
-        "devices": {
-            "total": total_devices,
-            "online": online_devices,
-            "offline": total_devices - online_devices,
-            "provisioned": provisioned_devices,
-            "unprovisioned": total_devices - provisioned_devices
-        },
-        "content": {
-            "total": total_content
-        },
+        **system_stats.snapshot(),
         "connections": {
             "device_websockets": len(device_connections),
-            "mobile_websockets": len(mobile_connections)
+            "mobile_websockets": broadcaster.metrics()["connections"]
         }
     }
 
 
+@router.get("/metrics", tags=["System"], summary="Internal pipeline metrics")
+async def get_metrics_v2():
+    """Get metrics for the background write pipelines."""
+    return {
+        "admission": admission.metrics(),
+        "heartbeats": heartbeat_buffer.metrics(),
+        "long_poll": command_waiters.metrics(),
+        "heartbeat_cadence": heartbeat_cadence.metrics(),
+        "backplane": backplane.metrics(),
+        "mobile": broadcaster.metrics(),
+        "sse": event_stream.metrics(),
+        "content_cache": content_cache.metrics(),
+        "commands": dispatcher.metrics(),
+        "stats": system_stats.metrics(),
+        "presence": presence.metrics(),
+        "rollups": usage_rollups.metrics(),
+        "usage_partitions": usage_partitions.metrics(),
+        "pages": page_cache.metrics(),
+        "json_parse_cache": parse_cache_info()
+    }
+
 @router.get("/", response_class=HTMLResponse, tags=["System"], summary="API Documentation Home", include_in_schema=False)
 async def home_page_v2(request: Request):
     """Home page with API documentation and navigation."""
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    return templates.TemplateResponse("home.html", {
-        "request": request,
-        "navbar_html": navbar_html,
-        "footer_html": footer_html
-    })
-
-# Custom docs endpoints
+    return page_cache.response(request, "home")
+
+# Custom docs endpoints, prerendered with the navbar and footer (services/pages.py)
 @router.get("/docs", response_class=HTMLResponse, include_in_schema=False)
 async def custom_swagger_ui_html_v2(request: Request):
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    custom_css = add_custom_color("#f4edf8")
-    
-    return HTMLResponse(
-        get_swagger_ui_html(
-        openapi_url=request.app.openapi_url,
-        title=request.app.title + " - Swagger UI",
-        swagger_js_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui-bundle.js",
-        swagger_css_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui.css",
-    ).body.decode().replace(
-        "<body>", 
-        f"<body>{navbar_html}{custom_css}"
-    ).replace(
-            "</body>",
-            f"{footer_html}</body>"
-        )
-    )
+    return page_cache.response(request, "swagger")
     
 @router.get("/redoc", response_class=HTMLResponse, include_in_schema=False)
 async def custom_redoc_html_v2(request: Request):
-    navbar_html, footer_html = load_navbar_and_footer_html()
-    custom_css = add_custom_color("#f4edf8")
-    
-    return HTMLResponse(
-        get_redoc_html(
-        openapi_url=request.app.openapi_url,
-        title=request.app.title + " - ReDoc",
-        redoc_js_url="https://cdn.jsdelivr.net/npm/redoc@2.1.2/bundles/redoc.standalone.js",
-    ).body.decode().replace(
-        "<body>", 
-        f"<body>{navbar_html}{custom_css}"
-    ).replace(
-            "</body>",
-            f"{footer_html}</body>"
-        ))
+    return page_cache.response(request, "redoc")
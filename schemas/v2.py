@@ -10,10 +10,16 @@ class DeviceRegister(BaseModel):
     ip_address: str = Field(..., example="192.168.1.100", description="Device IP address")
     firmware_version: str = Field(default="1.0.0", example="1.0.0", description="Device firmware version")
 
+class CommandResult(BaseModel):
+    command_id: str = Field(..., example="cmd_123", description="ID of a command received earlier")
+    success: bool = Field(default=True, example=True, description="Whether the command ran successfully")
+    error: Optional[str] = Field(None, example="content not downloaded", description="Failure reason")
+
 class DeviceHeartbeat(BaseModel):
     battery_level: int = Field(..., example=85, description="Battery level percentage (0-100)")
     status: str = Field(default="online", example="online", description="Device status")
     wifi_ssid: Optional[str] = Field(None, example="HomeNetwork", description="Connected WiFi network")
+    command_results: List[CommandResult] = Field(default=[], description="Results for commands received since the last heartbeat")
 
 class PlaybackCommand(BaseModel):
     device_id: str = Field(..., example="ZR-ABC123", description="Target device ID")
@@ -47,6 +53,13 @@ class ContentCreate(BaseModel):
 class DeviceCommandRequest(BaseModel):
     command: str = Field(..., example="play", description="Command to execute")
     params: Optional[Dict[str, Any]] = Field(default={}, example={"content_id": "story_001", "volume": 0.8})
+    ttl_seconds: Optional[int] = Field(None, ge=1, example=600, description="Give up if not acknowledged within this many seconds")
+
+class BulkCommandRequest(DeviceCommandRequest):
+    device_ids: Optional[List[str]] = Field(None, example=["ZR-ABC123", "ZR-DEF456"], description="Target these devices")
+    user_id: Optional[str] = Field(None, example="user_123", description="Target this user's devices")
+    firmware_version: Optional[str] = Field(None, example="1.0.0", description="Target devices on this firmware")
+    online: Optional[bool] = Field(None, example=True, description="Target only online (true) or offline (false) devices")
 
 class UsageAnalyticsCreate(BaseModel):
     device_id: str = Field(..., example="ZR-ABC123")
@@ -55,6 +68,9 @@ class UsageAnalyticsCreate(BaseModel):
     duration: int = Field(default=0, example=300, description="Duration in seconds")
     session_id: Optional[str] = Field(None, example="session_123")
 
+class UsageAnalyticsEvent(UsageAnalyticsCreate):
+    timestamp: Optional[datetime] = Field(None, example="2025-07-21T12:56:33Z", description="When the event happened on the device (defaults to receive time)")
+
 class WiFiProvisionUpdate(BaseModel):
     wifi_ssid: str = Field(..., example="HomeNetwork")
     provisioned_at: Optional[datetime] = None
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the hot query paths
+
+Runs EXPLAIN on every query the API issues on its hot paths and exits
+non-zero if any of them falls back to a full table scan.
+
+    # Fresh SQLite schema built from the models
+    uv run python scripts/check_query_plans.py
+
+    # An existing database, e.g. after `alembic upgrade head` and one API start (which creates this month's usage table)
+    uv run python scripts/check_query_plans.py --database-url postgresql://...
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from db import Base
+from models.v2 import Content, ContentChange, Device, DeviceCommand, UsageRollup, UsageRollupSession
+from services.partitions import month_start, partition_table
+from utils.pagination import encode_cursor, keyset_page
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "sqlite")
+def _explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _explain_postgresql(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+def hot_queries():
+    """(name, statement) pairs for every query that must stay on an index."""
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    # Analytics reads run against each month table in the window; they all share one layout
+    usage = partition_table(month_start(datetime.now(timezone.utc)))
+    return [
+        ("heartbeat: pending commands", select(DeviceCommand).filter(
+            DeviceCommand.device_id == "ZR-ABC123",
+            DeviceCommand.status == "pending",
+        )),
+        ("command status by device", select(DeviceCommand).filter(
+            DeviceCommand.device_id == "ZR-ABC123",
+            DeviceCommand.status == "sent",
+        )),
+        ("dispatcher: due deliveries", select(DeviceCommand).filter(
+            DeviceCommand.status == "pending",
+            DeviceCommand.next_attempt_at <= since,
+        )),
+        ("dispatcher: ack timeouts", select(DeviceCommand).filter(
+            DeviceCommand.status == "sent",
+            DeviceCommand.next_attempt_at <= since,
+        )),
+        ("bulk job progress", select(DeviceCommand.status, func.count()).filter(
+            DeviceCommand.job_id == "job_1",
+        ).group_by(DeviceCommand.status)),
+        ("analytics: device window", select(usage).filter(
+            usage.c.device_id == "ZR-ABC123",
+            usage.c.timestamp >= since,
+        )),
+        ("devices: by user", select(Device).filter(Device.user_id == "user_1")),
+        ("devices: offline sweep", select(Device).filter(
+            Device.last_seen < since,
+            Device.is_online == True,
+        )),
+        ("stats: online count", select(func.count()).select_from(Device).filter(Device.is_online == True)),
+        ("content: by type", select(Content).filter(Content.type == "story")),
+        ("content: by type and age", select(Content).filter(
+            Content.type == "story",
+            Content.age_range_max >= 3,
+            Content.age_range_min <= 7,
+        )),
+        ("content: by age", select(Content).filter(
+            Content.age_range_max >= 3,
+            Content.age_range_min <= 7,
+        )),
+        ("content feed: since cursor", select(ContentChange.seq, ContentChange.content_id, ContentChange.deleted).filter(ContentChange.seq > 5).order_by(ContentChange.seq).limit(500)),
+        ("devices: keyset page", keyset_page(select(Device), [Device.device_id], encode_cursor(["ZR-ABC123"]), 100)),
+        ("analytics: keyset page", keyset_page(
+            select(usage).filter(usage.c.device_id == "ZR-ABC123", usage.c.timestamp >= since),
+            [usage.c.timestamp, usage.c.id],
+            encode_cursor([datetime(2026, 1, 1), "x"]),
+            100,
+            descending=True,
+        )),
+        ("rollups: device window", select(UsageRollup).filter(
+            UsageRollup.period == "hour",
+            UsageRollup.scope == "device",
+            UsageRollup.key == "ZR-ABC123",
+            UsageRollup.bucket_start >= since,
+        ).order_by(UsageRollup.bucket_start)),
+        ("rollups: session prune", select(UsageRollupSession).filter(UsageRollupSession.bucket_start < since)),
+    ]
+
+
+def plan_rows(conn, statement):
+    rows = conn.execute(Explain(statement)).all()
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def is_table_scan(dialect: str, line: str) -> bool:
+    line = line.strip()
+    if dialect == "sqlite":
+        # "SCAN devices" is a full scan; "SCAN devices USING COVERING INDEX ..." walks an index
+        return line.startswith("SCAN ") and " USING " not in line
+    return "Seq Scan" in line
+
+
+def check(engine) -> bool:
+    ok = True
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Small tables always seq scan; ask whether an index *could* serve the query
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        for name, statement in hot_queries():
+            lines = plan_rows(conn, statement)
+            scans = [line for line in lines if is_table_scan(conn.dialect.name, line)]
+            status = "SCAN" if scans else "ok"
+            ok = ok and not scans
+            print(f"[{status:>4}] {name}")
+            for line in lines:
+                print(f"         {line}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Check an existing database instead of a fresh SQLite schema")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        partition_table(month_start(datetime.now(timezone.utc))).create(engine)
+
+    if not check(engine):
+        print("\nOne or more hot queries fall back to a full table scan.")
+        sys.exit(1)
+    print("\nAll hot queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Create the database schema without starting the API
+
+Creates any missing tables from the models, plus this month's and next
+month's usage_analytics tables. Run it once before starting workers with
+AUTO_CREATE_SCHEMA=false (the "fast" startup profile). Deployments that use
+alembic run `alembic upgrade head` instead.
+
+    uv run python scripts/create_schema.py
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import SessionLocal, create_schema, engine
+from services.partitions import add_months, month_start, usage_partitions
+
+
+def main():
+    create_schema()
+    current = month_start(datetime.now(timezone.utc))
+    db = SessionLocal()
+    try:
+        usage_partitions.ensure_sync(db, [current, add_months(current, 1)])
+    finally:
+        db.close()
+    print(f"Schema ready on {engine.url.render_as_string(hide_password=True)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Admission control for device registration and heartbeats
+
+After an outage or a firmware push, every Pi comes back at about the same
+time. Register and heartbeat requests then arrive together and keep arriving
+together, because every client retries on the same fixed interval. Two
+token buckets sit in front of those two endpoints:
+
+- a per-device bucket (ADMISSION_DEVICE_RATE/BURST) that stops a single
+  misbehaving device from hammering the API
+- a global bucket (ADMISSION_GLOBAL_RATE/BURST) that caps how many
+  register/heartbeat requests this worker accepts per second
+
+A request that finds either bucket empty gets a 429 and never touches the
+database. The Retry-After it gets back is not just "when the next token
+comes". Rejected requests are handed consecutive slots at the global rate,
+plus random jitter, so a herd of N devices is told to come back spread over
+about N / rate seconds instead of all retrying at once. The hint is capped at
+ADMISSION_MAX_RETRY_AFTER.
+
+The buckets live in process memory, so with uvicorn --workers N the global
+limit applies per worker.
+"""
+
+import math
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+import config
+
+# Forget idle device buckets once this many are tracked; a full bucket is the same as none
+PRUNE_THRESHOLD = 50_000
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait(self, now: float) -> float:
+        """Seconds until the next token."""
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        device_rate: float,
+        device_burst: float,
+        global_rate: float,
+        global_burst: float,
+        max_retry_after: float,
+        jitter: float,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        # A rate of 0 turns that limit off
+        self.device_rate = device_rate
+        self.device_burst = max(1.0, device_burst)
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self._clock = clock
+        self._random = rng or random.Random()
+        self._devices: Dict[str, TokenBucket] = {}
+        self._global = TokenBucket(global_rate, max(1.0, global_burst), clock()) if global_rate > 0 else None
+        # Next free retry slot handed to a rejected request
+        self._next_slot = 0.0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected_device = 0
+        self.rejected_global = 0
+        self.max_hint = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.device_rate > 0 or self._global is not None
+
+    def _device_bucket(self, device_id: str, now: float) -> TokenBucket:
+        bucket = self._devices.get(device_id)
+        if bucket is None:
+            if len(self._devices) >= PRUNE_THRESHOLD:
+                self._prune(now)
+            bucket = self._devices[device_id] = TokenBucket(self.device_rate, self.device_burst, now)
+        return bucket
+
+    def _prune(self, now: float):
+        idle = [device_id for device_id, bucket in self._devices.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst]
+        for device_id in idle:
+            del self._devices[device_id]
+
+    def _spread(self, now: float, wait: float) -> Tuple[float, float]:
+        # Give each rejected request its own slot at the global rate, so retries arrive at about that rate
+        slot = max(now + wait, self._next_slot)
+        if self._global is not None:
+            self._next_slot = slot + 1 / self._global.rate
+        delay = min(slot - now, self.max_retry_after)
+        spread = max(1.0, delay) * self.jitter
+        return delay + self._random.uniform(0, spread), spread
+
+    def check(self, device_id: str) -> Optional[Tuple[float, float]]:
+        """None if the request may go ahead, else (retry_after, jitter) in seconds."""
+        if not self.enabled:
+            self.admitted += 1
+            return None
+        now = self._clock()
+        bucket = self._device_bucket(device_id, now) if self.device_rate > 0 else None
+        if bucket is not None and not bucket.take(now):
+            # One device alone; no need to move the shared slots
+            self.rejected_device += 1
+            wait = bucket.wait(now)
+            hint = (wait + self._random.uniform(0, max(1.0, wait) * self.jitter), max(1.0, wait) * self.jitter)
+        elif self._global is not None and not self._global.take(now):
+            if bucket is not None:
+                bucket.tokens += 1
+            self.rejected_global += 1
+            hint = self._spread(now, self._global.wait(now))
+        else:
+            self.admitted += 1
+            return None
+        self.max_hint = max(self.max_hint, hint[0])
+        return hint
+
+    def admit(self, device_id: str):
+        """Raise a 429 with Retry-After when the device has to back off."""
+        hint = self.check(device_id)
+        if hint is None:
+            return
+        retry_after, jitter = hint
+        raise HTTPException(
+            status_code=429,
+            detail={"message": "Too many requests, retry later", "retry_after": round(retry_after, 3), "jitter": round(jitter, 3)},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def metrics(self) -> dict:
+        now = self._clock()
+        return {
+            "enabled": self.enabled,
+            "admitted": self.admitted,
+            "rejected_device": self.rejected_device,
+            "rejected_global": self.rejected_global,
+            "tracked_devices": len(self._devices),
+            "global_tokens": round(self._global.tokens, 2) if self._global else None,
+            "retry_backlog_seconds": round(max(0.0, self._next_slot - now), 3),
+            "max_retry_after": round(self.max_hint, 3),
+        }
+
+
+admission = AdmissionController(
+    config.ADMISSION_DEVICE_RATE,
+    config.ADMISSION_DEVICE_BURST,
+    config.ADMISSION_GLOBAL_RATE,
+    config.ADMISSION_GLOBAL_BURST,
+    config.ADMISSION_MAX_RETRY_AFTER,
+    config.ADMISSION_JITTER,
+)
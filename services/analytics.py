@@ -0,0 +1,234 @@
+"""
+Usage analytics ingestion and reads
+
+Single events and batches both go through insert_usage_rows. It groups rows
+by month partition (services/partitions.py) and writes each group with the
+dialect's fastest bulk path: one multi-row INSERT on SQLite, COPY (or
+executemany for small sets) on Postgres.
+
+Reads walk the month tables overlapping the window newest first, and stop as
+soon as a page is full.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from db import AsyncSessionLocal
+from schemas.v2 import UsageAnalyticsEvent
+from services.partitions import USAGE_COLUMNS, month_start, partition_table, retention_cutoff, usage_partitions
+from services.rollups import usage_rollups
+from utils.ids import uuid7
+from utils.pagination import decode_cursor, keyset_page
+from utils.streaming import iter_row_batches
+
+
+def usage_row(event: UsageAnalyticsEvent, received_at: datetime) -> dict:
+    """Build a usage_analytics row; events without a timestamp get the receive time."""
+    timestamp = event.timestamp or received_at
+    if timestamp.tzinfo is not None:
+        # Column is a naive DateTime holding UTC
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return {
+        "id": uuid7(),
+        "device_id": event.device_id,
+        "content_id": event.content_id,
+        "action": event.action,
+        "duration": event.duration,
+        "session_id": event.session_id,
+        "timestamp": timestamp,
+    }
+
+
+def timestamp_error(timestamp: datetime, received_at: datetime) -> Optional[str]:
+    """Why a row's naive UTC timestamp can't be stored, or None.
+
+    A month table is created for whatever month an event falls in, so a Pi
+    whose clock reads 1970 (or 2099) must not get that far. Anything older
+    than the retention cutoff would also land where reads no longer look.
+    """
+    if timestamp > received_at + timedelta(seconds=config.ANALYTICS_MAX_CLOCK_SKEW):
+        return "Timestamp is in the future; check the device clock"
+    cutoff = retention_cutoff(received_at)
+    if cutoff is not None and month_start(timestamp) < cutoff:
+        return f"Timestamp is older than the retention window (starts {cutoff.isoformat()})"
+    return None
+
+
+def rows_by_month(rows: Iterable[dict]) -> Dict[Any, List[dict]]:
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[month_start(row["timestamp"])].append(row)
+    return grouped
+
+
+async def insert_usage_rows(db: AsyncSession, rows: List[dict]):
+    """Insert analytics rows, one round trip per month they fall in. The caller commits.
+
+    Creating a missing month table commits the session first, so call this
+    before staging anything else in it.
+    """
+    if not rows:
+        return
+    grouped = rows_by_month(rows)
+    await usage_partitions.ensure(db, grouped)
+    conn = await db.connection()
+    for month, month_rows in grouped.items():
+        table = partition_table(month)
+        if conn.dialect.name == "postgresql" and len(month_rows) >= config.ANALYTICS_COPY_MIN_ROWS:
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.name,
+                records=[tuple(row[column] for column in USAGE_COLUMNS) for row in month_rows],
+                columns=USAGE_COLUMNS,
+            )
+        elif conn.dialect.name == "postgresql":
+            await db.execute(insert(table), month_rows)
+        else:
+            await db.execute(insert(table).values(month_rows))
+
+
+def _window_query(table, columns: Sequence[str], device_id: Optional[str], start: datetime):
+    query = select(*[table.c[name] for name in columns]).filter(table.c.timestamp >= start)
+    if device_id is not None:
+        query = query.filter(table.c.device_id == device_id)
+    return query
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+async def usage_rows(db: AsyncSession, device_id: Optional[str], start: datetime, columns: Sequence[str]) -> List[dict]:
+    """Every event since `start`, newest month first. Pass device_id=None for all devices."""
+    start = _naive_utc(start)
+    rows = []
+    for table in await usage_partitions.tables_for(db, start):
+        rows += [dict(row) for row in (await db.execute(_window_query(table, columns, device_id, start))).mappings()]
+    return rows
+
+
+async def usage_page(
+    db: AsyncSession, device_id: str, start: datetime, columns: Sequence[str], cursor: Optional[str], limit: int,
+) -> List[dict]:
+    """One keyset page, newest first, in the shape page_response expects (up to limit + 1 rows).
+
+    Starts at the cursor's month and moves to older months only while the
+    page isn't full.
+    """
+    start = _naive_utc(start)
+    end = None
+    if cursor:
+        template = partition_table(month_start(start))
+        try:
+            end = decode_cursor(cursor, [template.c.timestamp, template.c.id])[0]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    rows = []
+    for table in await usage_partitions.tables_for(db, start, end):
+        query = keyset_page(
+            _window_query(table, columns, device_id, start),
+            [table.c.timestamp, table.c.id], cursor, limit - len(rows), descending=True,
+        )
+        rows += [dict(row) for row in (await db.execute(query)).mappings()]
+        if len(rows) > limit:
+            break
+    return rows
+
+
+async def iter_usage_batches(device_id: Optional[str], start: datetime, columns: Sequence[str]) -> AsyncIterator[List[Mapping]]:
+    """Stream batches for every event since `start`, newest first, month by month."""
+    start = _naive_utc(start)
+    async with AsyncSessionLocal() as db:
+        tables = await usage_partitions.tables_for(db, start)
+    for table in tables:
+        async for rows in iter_row_batches(_window_query(table, columns, device_id, start), [table.c.timestamp, table.c.id], descending=True):
+            yield rows
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+async def ingest_usage_batch(
+    db: AsyncSession,
+    items: Union[Iterable[Tuple[int, Any]], AsyncIterable[Tuple[int, Any]]],
+) -> dict:
+    """Validate events and write them one bulk INSERT per chunk.
+
+    `items` yields (index, payload) pairs; a payload that is an exception
+    (e.g. a malformed NDJSON line) is rejected as-is. Every item gets a
+    status: accepted, rejected (invalid), out_of_range (timestamp outside
+    what timestamp_error allows) or failed (its chunk could not be written).
+
+    Reading stops at ANALYTICS_BATCH_MAX_ITEMS; the rest of the body is
+    left unread and reported once, as `overflow`.
+    """
+    results: List[dict] = []
+    chunk: List[Tuple[int, dict]] = []
+    overflow = None
+    received_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async def write_chunk():
+        if not chunk:
+            return
+        try:
+            await insert_usage_rows(db, [row for _, row in chunk])
+            await db.commit()
+            usage_rollups.record(row for _, row in chunk)
+            results.extend({"index": index, "status": "accepted", "id": row["id"]} for index, row in chunk)
+        except Exception as e:
+            await db.rollback()
+            print(f"Analytics batch chunk failed ({len(chunk)} events): {e}")
+            results.extend({"index": index, "status": "failed", "error": "Could not store event"} for index, _ in chunk)
+        chunk.clear()
+
+    if not hasattr(items, "__aiter__"):
+        items = _aiter(items)
+
+    async for index, payload in items:
+        if index >= config.ANALYTICS_BATCH_MAX_ITEMS:
+            overflow = {"index": index, "error": f"Batch limit is {config.ANALYTICS_BATCH_MAX_ITEMS} events; this and later items were not read"}
+            break
+        if isinstance(payload, Exception):
+            results.append({"index": index, "status": "rejected", "error": str(payload)})
+            continue
+        try:
+            event = UsageAnalyticsEvent.model_validate(payload)
+        except ValidationError as e:
+            results.append({"index": index, "status": "rejected", "error": _validation_message(e)})
+            continue
+
+        row = usage_row(event, received_at)
+        error = timestamp_error(row["timestamp"], received_at)
+        if error is not None:
+            results.append({"index": index, "status": "out_of_range", "error": error})
+            continue
+        chunk.append((index, row))
+        if len(chunk) >= config.ANALYTICS_BATCH_CHUNK_SIZE:
+            await write_chunk()
+
+    await write_chunk()
+
+    results.sort(key=lambda result: result["index"])
+    counts = {"accepted": 0, "rejected": 0, "out_of_range": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    response = {"status": "processed", **counts, "results": results}
+    if overflow is not None:
+        response["overflow"] = overflow
+    return response
@@ -0,0 +1,312 @@
+"""
+Cross-worker pub/sub backplane
+
+Each worker only holds the WebSockets that connected to it. A worker
+subscribes to a channel (e.g. `device:ZR-ABC123`) while it holds the
+matching socket, and anything published on that channel from any worker
+is handed to its handler.
+
+    memory  single process; publish calls local handlers directly
+    unix    workers talk through a small broker on a Unix socket. The
+            first worker to take the lock file hosts the broker and the
+            others connect to it. If that worker dies, another one takes
+            over. `python -m services.backplane` runs a standalone broker.
+
+Delivery is best effort. A message published while the broker is
+unreachable is dropped. A worker whose unread frames at the broker pass
+BACKPLANE_MAX_BUFFER is disconnected, and it reconnects and resubscribes.
+So callers keep the database as the source of truth (e.g. a command stays
+pending and goes out on the next heartbeat).
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import config
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+def device_channel(device_id: str) -> str:
+    return f"device:{device_id}"
+
+
+def acquire_broker_lock(socket_path: str) -> Optional[int]:
+    """Take the broker lock without blocking; returns the held fd, or None if another process has it."""
+    fd = os.open(socket_path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class InProcessBackplane:
+    """Backplane for a single worker: publish goes straight to local handlers."""
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self.published = 0
+        self.delivered = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self._handlers.clear()
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+
+    async def publish(self, channel: str, message: dict):
+        """Deliver to the one worker subscribed to `channel`."""
+        self.published += 1
+        await self._dispatch(channel, message)
+
+    async def broadcast(self, channel: str, message: dict):
+        """Deliver to every worker subscribed to `channel`, this one included."""
+        await self.publish(channel, message)
+
+    async def _dispatch(self, channel: str, message: dict):
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        self.delivered += 1
+        try:
+            await handler(channel, message)
+        except Exception as e:
+            print(f"Backplane handler error on {channel}: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            "type": "memory",
+            "published": self.published,
+            "delivered": self.delivered,
+            "subscriptions": len(self._handlers),
+        }
+
+
+class UnixSocketBackplane(InProcessBackplane):
+    """Backplane over a local broker; frames are one JSON object per line."""
+
+    def __init__(self, socket_path: str, host_broker: bool = True):
+        super().__init__()
+        self.socket_path = socket_path
+        self.host_broker = host_broker
+        self._broker: Optional["Broker"] = None
+        self._lock_fd: Optional[int] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.reconnects = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            print(f"Backplane broker at {self.socket_path} not reachable yet, retrying in the background")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._connected.clear()
+        if self._writer is not None:
+            self._writer.close()
+        if self._broker is not None:
+            await self._broker.close()
+            self._broker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        await super().stop()
+
+    async def subscribe(self, channel: str, handler: Handler):
+        await super().subscribe(channel, handler)
+        await self._send({"op": "sub", "channel": channel})
+
+    async def unsubscribe(self, channel: str):
+        await super().unsubscribe(channel)
+        await self._send({"op": "unsub", "channel": channel})
+
+    async def publish(self, channel: str, message: dict):
+        self.published += 1
+        if channel in self._handlers:
+            # Subscribed here, no need for the round trip
+            await self._dispatch(channel, message)
+        elif not await self._send({"op": "pub", "channel": channel, "message": message}):
+            self.dropped += 1
+
+    async def broadcast(self, channel: str, message: dict):
+        self.published += 1
+        await self._dispatch(channel, message)
+        if not await self._send({"op": "pub", "channel": channel, "message": message, "others": True}):
+            self.dropped += 1
+
+    async def _send(self, frame: dict) -> bool:
+        if not self._connected.is_set():
+            return False
+        try:
+            self._writer.write(json.dumps(frame).encode() + b"\n")
+            await self._writer.drain()
+            return True
+        except (ConnectionError, RuntimeError):
+            return False
+
+    async def _run(self):
+        delay = 0.05
+        while True:
+            if self.host_broker and self._broker is None:
+                self._lock_fd = acquire_broker_lock(self.socket_path)
+            if self._lock_fd is not None and self._broker is None:
+                self._broker = Broker(self.socket_path)
+                await self._broker.start()
+                print(f"Backplane broker listening on {self.socket_path}")
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+
+            delay = 0.05
+            # Replay subscriptions so the broker knows where our sockets are
+            for channel in list(self._handlers):
+                self._writer.write(json.dumps({"op": "sub", "channel": channel}).encode() + b"\n")
+            self._connected.set()
+            try:
+                while line := await reader.readline():
+                    frame = json.loads(line)
+                    await self._dispatch(frame["channel"], frame["message"])
+            except (ConnectionError, ValueError) as e:
+                # ValueError covers bad JSON and frames over the stream limit
+                print(f"Backplane connection error: {e}")
+            self._connected.clear()
+            self._writer.close()
+            self.reconnects += 1
+
+    def metrics(self) -> dict:
+        return {
+            **super().metrics(),
+            "type": "unix",
+            "socket": self.socket_path,
+            "connected": self._connected.is_set(),
+            "hosting_broker": self._broker is not None,
+            "slow_subscribers_dropped": self._broker.slow_dropped if self._broker is not None else None,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+class Broker:
+    """Forwards published frames to every connection subscribed to the channel."""
+
+    def __init__(self, socket_path: str, max_buffer: int = config.BACKPLANE_MAX_BUFFER):
+        self.socket_path = socket_path
+        self.max_buffer = max_buffer
+        self.slow_dropped = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._subscribers: Dict[str, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        # Only the lock holder gets here, so whatever is at the path is stale
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        # Drop every client so they notice and fail over to the next broker
+        for writer in list(self._connections):
+            writer.close()
+        self._subscribers.clear()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels: Set[str] = set()
+        self._connections.add(writer)
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                op, channel = frame.get("op"), frame.get("channel")
+                if op == "sub":
+                    channels.add(channel)
+                    self._subscribers[channel].add(writer)
+                elif op == "unsub":
+                    channels.discard(channel)
+                    self._unsubscribe(channel, writer)
+                elif op == "pub":
+                    out = json.dumps({"channel": channel, "message": frame.get("message")}).encode() + b"\n"
+                    for subscriber in list(self._subscribers.get(channel, ())):
+                        # "others": the publisher already delivered it locally
+                        if not (frame.get("others") and subscriber is writer):
+                            self._deliver(subscriber, out)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for channel in channels:
+                self._unsubscribe(channel, writer)
+            self._connections.discard(writer)
+            writer.close()
+
+    def _deliver(self, subscriber: asyncio.StreamWriter, out: bytes):
+        """Queue a frame without waiting; a worker that stopped reading is cut off instead of buffered without bound."""
+        if subscriber.is_closing():
+            return
+        if subscriber.transport.get_write_buffer_size() > self.max_buffer:
+            self.slow_dropped += 1
+            print(f"Backplane subscriber over {self.max_buffer} buffered bytes, disconnecting it")
+            # abort, not close: close would wait for the buffer to flush
+            subscriber.transport.abort()
+            return
+        subscriber.write(out)
+
+    def _unsubscribe(self, channel: str, writer: asyncio.StreamWriter):
+        writers = self._subscribers.get(channel)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self._subscribers[channel]
+
+
+def create_backplane():
+    if config.BACKPLANE == "unix":
+        return UnixSocketBackplane(config.BACKPLANE_SOCKET)
+    return InProcessBackplane()
+
+
+backplane = create_backplane()
+
+
+async def _serve_forever(socket_path: str):
+    if acquire_broker_lock(socket_path) is None:
+        raise SystemExit(f"A broker already holds {socket_path}.lock")
+    broker = Broker(socket_path)
+    await broker.start()
+    print(f"Backplane broker listening on {socket_path}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the WebSocket backplane broker on its own")
+    parser.add_argument("--socket", default=config.BACKPLANE_SOCKET)
+    args = parser.parse_args()
+    asyncio.run(_serve_forever(args.socket))
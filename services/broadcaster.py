@@ -0,0 +1,197 @@
+"""
+Real-time events for mobile apps
+
+Device status (online/offline), battery and command status changes are
+pushed to `/ws/mobile` connections, filtered by the user_id the app
+subscribed with; a connection without a user_id gets every event.
+
+Publishing never waits on a phone. Each connection has its own bounded
+queue drained by its own sender task. A newer event for the same thing
+(e.g. the battery of one device) replaces the queued one. When the queue is
+full, the oldest event is dropped and the app gets an `overflow` notice
+telling it to resync over REST. A phone that doesn't take a frame within
+MOBILE_SEND_TIMEOUT is disconnected.
+
+Events travel through the backplane so that a heartbeat handled on one
+worker reaches phones connected to another. Each worker also keeps the
+recent ones for the SSE stream (services/sse.py).
+"""
+
+import asyncio
+import json
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+import config
+from services.backplane import backplane
+from services.sse import event_stream
+
+CHANNEL = "mobile:events"
+ALL_USERS = None  # subscription key for connections without a user_id filter
+
+
+def device_status_event(device_id: str, user_id: Optional[str], is_online: bool) -> dict:
+    return {"type": "device_status", "device_id": device_id, "user_id": user_id, "is_online": is_online, "at": _now()}
+
+
+def battery_event(device_id: str, user_id: Optional[str], battery_level: int) -> dict:
+    return {"type": "battery", "device_id": device_id, "user_id": user_id, "battery_level": battery_level, "at": _now()}
+
+
+def command_status_event(device_id: str, user_id: Optional[str], command_id: str, status: str) -> dict:
+    return {
+        "type": "command_status", "device_id": device_id, "user_id": user_id,
+        "command_id": command_id, "status": status, "at": _now(),
+    }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _coalesce_key(event: dict):
+    if event["type"] == "command_status":
+        return ("command", event["command_id"])
+    return (event["type"], event["device_id"])
+
+
+class MobileSubscriber:
+    """One mobile connection's queue and sender."""
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[str], queue_size: int, send_timeout: float):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._queue: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._dropped_unreported = 0
+        self._overflow_reported = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def offer(self, event: dict):
+        """Queue an event without waiting; coalesces or drops instead of growing."""
+        key = _coalesce_key(event)
+        if key in self._queue:
+            self._queue[key] = event
+            self.coalesced += 1
+        else:
+            if len(self._queue) >= self.queue_size:
+                self._queue.popitem(last=False)
+                self.dropped += 1
+                self._dropped_unreported += 1
+            self._queue[key] = event
+        self._ready.set()
+
+    def _overflow_pending(self) -> bool:
+        # One notice per backlog: the app resyncs once, not after every drop
+        return self._dropped_unreported > 0 and not self._overflow_reported
+
+    async def run(self):
+        """Drain the queue into the socket until it fails or is too slow."""
+        while True:
+            await self._ready.wait()
+            if self._overflow_pending():
+                frame = {"type": "overflow", "dropped": self._dropped_unreported}
+                self._dropped_unreported = 0
+                self._overflow_reported = True
+            else:
+                _, frame = self._queue.popitem(last=False)
+            if not self._queue:
+                # Caught up; the next backlog gets its own notice
+                self._overflow_reported = False
+                if not self._overflow_pending():
+                    self._ready.clear()
+            await asyncio.wait_for(self.websocket.send_text(json.dumps(frame)), timeout=self.send_timeout)
+            self.sent += 1
+
+
+class Broadcaster:
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._subscribers: Dict[Optional[str], Set[MobileSubscriber]] = defaultdict(set)
+        self.published = 0
+        self.offered = 0
+        self.send_timeouts = 0
+        self._closed_coalesced = 0
+        self._closed_dropped = 0
+
+    async def start(self):
+        await backplane.subscribe(CHANNEL, self._on_backplane)
+
+    async def stop(self):
+        await backplane.unsubscribe(CHANNEL)
+
+    async def publish(self, events: Iterable[dict]):
+        """Send events to every worker's matching mobile connections."""
+        events = list(events)
+        if events:
+            self.published += len(events)
+            await backplane.broadcast(CHANNEL, {"events": events})
+
+    async def _on_backplane(self, channel: str, message: dict):
+        self.deliver(message["events"])
+
+    def deliver(self, events: List[dict]):
+        """Queue events for this worker's connections."""
+        event_stream.append(events)
+        everyone = self._subscribers.get(ALL_USERS, ())
+        for event in events:
+            user_id = event.get("user_id")
+            if user_id is not None:
+                self._offer(self._subscribers.get(user_id, ()), event)
+            self._offer(everyone, event)
+
+    def _offer(self, subscribers: Iterable[MobileSubscriber], event: dict):
+        for subscriber in subscribers:
+            subscriber.offer(event)
+            self.offered += 1
+
+    async def serve(self, websocket: WebSocket, user_id: Optional[str]):
+        """Push events to an accepted mobile socket until it disconnects."""
+        subscriber = MobileSubscriber(websocket, user_id, self.queue_size, self.send_timeout)
+        self._subscribers[user_id].add(subscriber)
+        sender = asyncio.create_task(subscriber.run())
+        receiver = asyncio.create_task(self._drain(websocket))
+        try:
+            done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done and isinstance(sender.exception(), asyncio.TimeoutError):
+                self.send_timeouts += 1
+                await websocket.close(code=1013)  # try again later
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            self._subscribers[user_id].discard(subscriber)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+            self._closed_coalesced += subscriber.coalesced
+            self._closed_dropped += subscriber.dropped
+
+    @staticmethod
+    async def _drain(websocket: WebSocket):
+        # Apps don't send anything yet; reading is how we notice the disconnect
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    def metrics(self) -> dict:
+        subscribers = [s for group in self._subscribers.values() for s in group]
+        return {
+            "connections": len(subscribers),
+            "published": self.published,
+            "offered": self.offered,
+            "coalesced": self._closed_coalesced + sum(s.coalesced for s in subscribers),
+            "dropped": self._closed_dropped + sum(s.dropped for s in subscribers),
+            "send_timeouts": self.send_timeouts,
+            "max_queue_depth": max((len(s._queue) for s in subscribers), default=0),
+        }
+
+
+broadcaster = Broadcaster(config.MOBILE_QUEUE_SIZE, config.MOBILE_SEND_TIMEOUT)
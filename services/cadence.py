@@ -0,0 +1,122 @@
+"""
+Server-driven heartbeat interval
+
+Every v2 heartbeat response carries `next_heartbeat_in`, the number of seconds
+the device should wait before its next heartbeat. The Pi client sleeps for
+exactly that long, so the server decides the steady-state heartbeat rate:
+
+- commands just went out with this heartbeat: HEARTBEAT_MIN_INTERVAL, so
+  their results come back, and follow-up commands go out, quickly
+- the device has a WebSocket open on this worker: HEARTBEAT_SOCKET_INTERVAL,
+  because commands reach it over the socket and the heartbeat only keeps
+  presence and battery level fresh
+- otherwise HEARTBEAT_INTERVAL
+
+When this worker sees more than HEARTBEAT_TARGET_RATE heartbeats per second,
+the interval is stretched by the overload factor, so the fleet slows down
+before admission control starts answering 429. Stretching never applies to
+the fast path for devices with commands in flight.
+
+Every interval is capped at HEARTBEAT_MAX_INTERVAL and at two thirds of
+PRESENCE_TIMEOUT, so a device misses one heartbeat at most before it is
+marked offline. The value gets +/-10% jitter so devices drift apart.
+
+The fast path never undercuts admission control: HEARTBEAT_MIN_INTERVAL is
+raised, if needed, so that even with jitter taken off it stays 10% above
+1 / ADMISSION_DEVICE_RATE. A device doing what it was told is never 429'd.
+"""
+
+import math
+import random
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+import config
+
+# Weight of the newest one-second sample in the heartbeat rate average
+RATE_SMOOTHING = 0.3
+# Intervals are multiplied by a random factor in [1 - JITTER, 1 + JITTER]
+JITTER = 0.1
+
+
+class HeartbeatCadence:
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float,
+        max_interval: float,
+        socket_interval: float,
+        target_rate: float,
+        presence_timeout: float,
+        device_rate: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_interval = min(max_interval, presence_timeout * 2 / 3)
+        self.interval = min(interval, self.max_interval)
+        self.min_interval = min(min_interval, self.interval)
+        if device_rate > 0:
+            # Shortest interval that, jittered down, stays over 1 / device_rate
+            # with JITTER to spare for requests bunching up in transit
+            floor = math.ceil(10 * (1 + JITTER) / (device_rate * (1 - JITTER))) / 10
+            self.min_interval = max(self.min_interval, floor)
+        self.socket_interval = min(socket_interval, self.max_interval)
+        self.target_rate = target_rate
+        self._clock = clock
+        self._random = rng or random.Random()
+        # Heartbeats counted in the current one-second window, and the smoothed rate
+        self._window_start = clock()
+        self._window_count = 0
+        self.rate = 0.0
+
+        # Metrics
+        self.reasons = Counter()
+
+    def _observe(self, now: float):
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= 1:
+            sample = self._window_count / elapsed
+            self.rate = sample if self.rate == 0 else self.rate + RATE_SMOOTHING * (sample - self.rate)
+            self._window_start = now
+            self._window_count = 0
+
+    def load_factor(self) -> float:
+        if self.target_rate <= 0:
+            return 1.0
+        return max(1.0, self.rate / self.target_rate)
+
+    def next_interval(self, commands_in_flight: bool, has_socket: bool) -> float:
+        """Seconds until this device's next heartbeat; call once per heartbeat."""
+        self._observe(self._clock())
+        if commands_in_flight:
+            reason, interval = "commands", self.min_interval
+        else:
+            reason, interval = ("socket", self.socket_interval) if has_socket else ("idle", self.interval)
+            factor = self.load_factor()
+            if factor > 1:
+                reason, interval = "load", interval * factor
+        self.reasons[reason] += 1
+        # Leave room under the cap for the jitter, so capped devices still drift apart
+        interval = min(self.max_interval / (1 + JITTER), interval) * self._random.uniform(1 - JITTER, 1 + JITTER)
+        return round(interval, 1)
+
+    def metrics(self) -> dict:
+        return {
+            "heartbeat_rate": round(self.rate, 2),
+            "target_rate": self.target_rate,
+            "load_factor": round(self.load_factor(), 2),
+            "intervals": dict(self.reasons),
+        }
+
+
+heartbeat_cadence = HeartbeatCadence(
+    config.HEARTBEAT_INTERVAL,
+    config.HEARTBEAT_MIN_INTERVAL,
+    config.HEARTBEAT_MAX_INTERVAL,
+    config.HEARTBEAT_SOCKET_INTERVAL,
+    config.HEARTBEAT_TARGET_RATE,
+    config.PRESENCE_TIMEOUT,
+    config.ADMISSION_DEVICE_RATE,
+)
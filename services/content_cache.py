@@ -0,0 +1,103 @@
+"""
+Read-through cache for single-item content lookups
+
+`GET /content/library/{content_id}` and `GET /content/library?ids=a,b,c` are
+what a Pi asks when it has to play something it hasn't downloaded. The
+response payload for each item is kept in an LRU of CONTENT_CACHE_SIZE
+entries. A lookup serves what it can from memory and loads the rest with
+one `IN (...)` query.
+
+Content writes drop the item here and announce the id on a backplane
+channel, so every worker drops it too. A load that started before a write
+doesn't put its (now stale) rows back. Unknown ids aren't cached, so content
+added later is found on the next lookup.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from models.v2 import Content
+from services.backplane import backplane
+
+CHANNEL = "content:changed"
+
+
+class ContentCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        # Moves on every invalidation, so a load that raced a write can tell
+        self._generation = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    async def start(self):
+        await backplane.subscribe(CHANNEL, self._on_backplane)
+
+    async def stop(self):
+        await backplane.unsubscribe(CHANNEL)
+        self._entries.clear()
+
+    async def get_many(self, db: AsyncSession, content_ids: List[str], payload: Callable[[Content], dict]) -> Dict[str, dict]:
+        """Payloads for the ids that exist, keyed by content_id."""
+        found = {}
+        missing = []
+        for content_id in dict.fromkeys(content_ids):
+            entry = self._entries.get(content_id)
+            if entry is None:
+                missing.append(content_id)
+            else:
+                self._entries.move_to_end(content_id)
+                found[content_id] = entry
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            generation = self._generation
+            items = (await db.scalars(select(Content).filter(Content.content_id.in_(missing)))).all()
+            for item in items:
+                found[item.content_id] = entry = payload(item)
+                if generation == self._generation:
+                    self._put(item.content_id, entry)
+        return found
+
+    def _put(self, content_id: str, entry: dict):
+        self._entries[content_id] = entry
+        self._entries.move_to_end(content_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, content_ids: Iterable[str]):
+        """Call after committing a content write; drops the items here and on every other worker."""
+        content_ids = list(content_ids)
+        self.drop(content_ids)
+        await backplane.broadcast(CHANNEL, {"content_ids": content_ids})
+
+    async def _on_backplane(self, channel: str, message: dict):
+        self.drop(message["content_ids"])
+
+    def drop(self, content_ids: Iterable[str]):
+        self._generation += 1
+        for content_id in content_ids:
+            if self._entries.pop(content_id, None) is not None:
+                self.invalidated += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidated": self.invalidated,
+        }
+
+
+content_cache = ContentCache(config.CONTENT_CACHE_SIZE)
@@ -0,0 +1,79 @@
+"""
+Content change feed for delta library sync
+
+Every content write also writes the item's row in `content_changes`. The
+old row for the item is replaced, and the new one gets the next `seq`.
+Deleting an item leaves a tombstone row (`deleted`) instead of removing
+it. `GET /content/changes?since=<seq>` returns the rows after the cursor,
+joined to the current content. A device that keeps the last seq it applied
+gets only what changed since then, and an empty page once it is up to date.
+
+Since each item has a single row, the feed is at most one row per content
+id ever created, however often items change. Tombstones are kept, so any
+cursor stays valid. On Postgres, writers take a transaction-level advisory
+lock, so seqs commit in order and a reader never skips a seq that commits
+late. On SQLite, writes are already serialized.
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, false, insert, literal, select, text
+
+from models.v2 import Content, ContentChange
+
+changes_table = ContentChange.__table__
+
+# pg_advisory_xact_lock key for content writes
+ADVISORY_LOCK_KEY = 0x5A0C0
+LOCK_SQL = text(f"SELECT pg_advisory_xact_lock({ADVISORY_LOCK_KEY})")
+
+
+def _statements(content_id: str, deleted: bool):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return (
+        delete(changes_table).where(changes_table.c.content_id == content_id),
+        insert(changes_table).values(content_id=content_id, deleted=deleted, changed_at=now),
+    )
+
+
+async def record_change(db, content_id: str, deleted: bool = False):
+    """Give the item the next change seq, in the caller's transaction."""
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(LOCK_SQL)
+    for statement in _statements(content_id, deleted):
+        await db.execute(statement)
+
+
+def record_change_sync(db, content_id: str, deleted: bool = False):
+    """record_change for the v1 (sync Session) routes."""
+    if db.bind.dialect.name == "postgresql":
+        db.execute(LOCK_SQL)
+    for statement in _statements(content_id, deleted):
+        db.execute(statement)
+
+
+def backfill_sync(db) -> int:
+    """Add feed rows for content that has none (e.g. a database from before the feed, created without alembic)."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    missing = select(Content.content_id, false(), literal(now)).where(
+        ~select(changes_table.c.seq).where(changes_table.c.content_id == Content.content_id).exists()
+    ).order_by(Content.created_at, Content.content_id)
+    result = db.execute(insert(changes_table).from_select(["content_id", "deleted", "changed_at"], missing))
+    return result.rowcount
+
+
+async def read_changes(db, since: int, limit: int) -> Tuple[List[Tuple[ContentChange, Optional[Content]]], bool]:
+    """Up to `limit` (change, content) pairs after `since`, oldest first, and whether more follow. content is None for deletes."""
+    rows = (await db.execute(
+        select(ContentChange, Content)
+        .outerjoin(Content, Content.content_id == ContentChange.content_id)
+        .where(ContentChange.seq > since)
+        .order_by(ContentChange.seq)
+        .limit(limit + 1)
+    )).all()
+    return [tuple(row) for row in rows[:limit]], len(rows) > limit
+
+
+async def latest_seq(db) -> int:
+    return (await db.scalar(select(ContentChange.seq).order_by(ContentChange.seq.desc()).limit(1))) or 0
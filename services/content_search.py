@@ -0,0 +1,152 @@
+"""
+Full-text content search
+
+`GET /content/search?q=...` matches words in `title`, `tags` and
+`description`. Every word must match the start of a word in the item, so
+"dino sto" finds "Dinosaur Story" while the user is still typing. Title
+matches rank above tag matches, which rank above description matches.
+
+SQLite: an FTS5 table `content_search` holds a copy of the three columns.
+Its rowid is a 64-bit hash of the content_id, so a write can replace an
+item's entry without scanning the table. The content write paths keep it in
+step in the same transaction (`index_content` / `unindex_content`), and
+`create_schema` / the migration fill it for content that predates it.
+Results are ranked by bm25 inside the FTS table, and only the top `limit`
+are joined to `content`; with library filters the join has to come first.
+
+Postgres: a GIN expression index over a weighted tsvector of the same
+columns (`content_search_vector` in models/v2.py). It is maintained by
+Postgres, so the write-path hooks do nothing there. Results are ordered by
+ts_rank.
+"""
+
+import hashlib
+import re
+from typing import List, Optional
+
+from sqlalchemy import column, func, literal_column, select, table, text
+
+from models.v2 import Content, content_search_vector
+
+SEARCH_TABLE = "content_search"
+# The FTS5 table and its shadow tables, which alembic autogenerate should leave alone
+SEARCH_TABLE_NAME = re.compile(rf"^{SEARCH_TABLE}(_(data|idx|content|docsize|config))?$")
+
+# remove_diacritics: "eleve" finds "élève". prefix: index 2 and 3 character prefixes for search-as-you-type
+CREATE_SQL = text(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "content_id UNINDEXED, title, tags, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+INDEX_SQL = text(
+    f"INSERT INTO {SEARCH_TABLE} (rowid, content_id, title, tags, description) "
+    "SELECT :rowid, content_id, title, tags, description FROM content WHERE content_id = :content_id"
+)
+UNINDEX_SQL = text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid")
+# search_rowid() is registered on the connection as a SQL function for this one
+BACKFILL_SQL = text(
+    f"INSERT INTO {SEARCH_TABLE} (rowid, content_id, title, tags, description) "
+    "SELECT search_rowid(content_id), content_id, title, tags, description FROM content "
+    f"WHERE content_id NOT IN (SELECT content_id FROM {SEARCH_TABLE}) "
+    # Inserting in rowid order is several times faster than in hash order
+    "ORDER BY 1"
+)
+
+# Words past this many are ignored
+MAX_TERMS = 8
+
+search_table = table(SEARCH_TABLE, column("rowid"), column("content_id"))
+# bm25 weights, in column order: content_id (unindexed), title, tags, description
+BM25 = func.bm25(literal_column(SEARCH_TABLE), 0.0, 10.0, 4.0, 1.0)
+
+
+def terms(q: str) -> List[str]:
+    """Lower-cased words of a search box entry; punctuation and FTS syntax are dropped."""
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def _uses_fts(db) -> bool:
+    return db.bind.dialect.name == "sqlite"
+
+
+def search_rowid(content_id: str) -> int:
+    """FTS rowid for an item; stable across processes, unlike hash()."""
+    return int.from_bytes(hashlib.blake2b(content_id.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def _params(content_id: str) -> dict:
+    return {"rowid": search_rowid(content_id), "content_id": content_id}
+
+
+async def index_content(db, content_id: str):
+    """(Re)index an item after its content row is added or changed, in the caller's transaction."""
+    if _uses_fts(db):
+        # Raw SQL doesn't autoflush; the INSERT ... SELECT has to see the pending content row
+        await db.flush()
+        await db.execute(UNINDEX_SQL, _params(content_id))
+        await db.execute(INDEX_SQL, _params(content_id))
+
+
+async def unindex_content(db, content_id: str):
+    if _uses_fts(db):
+        await db.execute(UNINDEX_SQL, _params(content_id))
+
+
+def index_content_sync(db, content_id: str):
+    """index_content for the v1 (sync Session) routes."""
+    if _uses_fts(db):
+        db.flush()
+        db.execute(UNINDEX_SQL, _params(content_id))
+        db.execute(INDEX_SQL, _params(content_id))
+
+
+def unindex_content_sync(db, content_id: str):
+    if _uses_fts(db):
+        db.execute(UNINDEX_SQL, _params(content_id))
+
+
+def create_sync(db) -> int:
+    """Create the SQLite search table if needed and index content missing from it; returns rows added."""
+    if not _uses_fts(db):
+        return 0
+    db.execute(CREATE_SQL)
+    db.connection().connection.create_function("search_rowid", 1, search_rowid, deterministic=True)
+    return db.execute(BACKFILL_SQL).rowcount
+
+
+def search_query(db, words: List[str], limit: int, filtered=None):
+    """Best matches first, for the words from `terms()`; `filtered` adds the library filters."""
+    if _uses_fts(db):
+        match = literal_column(SEARCH_TABLE).op("MATCH")(" ".join(f'"{word}"*' for word in words))
+        if filtered is None:
+            # Rank and cut inside the FTS table; reading every match's content row costs more than ranking it
+            ranked = select(search_table.c.rowid, BM25.label("score")).where(match).order_by("score").limit(limit).subquery()
+            hit = search_table.alias("hit")
+            return (
+                select(Content)
+                .select_from(ranked)
+                .join(hit, hit.c.rowid == ranked.c.rowid)
+                .join(Content, Content.content_id == hit.c.content_id)
+                .order_by(ranked.c.score, Content.content_id)
+            )
+        query = (
+            select(Content)
+            .join(search_table, search_table.c.content_id == Content.content_id)
+            .where(match)
+            .order_by(BM25)
+        )
+    else:
+        tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{word}:*" for word in words))
+        vector = content_search_vector(Content.title, Content.tags, Content.description)
+        query = select(Content).where(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc())
+    if filtered is not None:
+        query = filtered(query)
+    return query.order_by(Content.content_id).limit(limit)
+
+
+async def search(db, q: str, limit: int, filtered=None) -> Optional[List[Content]]:
+    """Matching content, best first; None when `q` has no words to search for."""
+    words = terms(q)
+    if not words:
+        return None
+    return list((await db.scalars(search_query(db, words, limit, filtered))).all())
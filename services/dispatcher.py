@@ -0,0 +1,412 @@
+"""
+Device command delivery
+
+`device_commands` doubles as the outbox: the API commits a pending row and
+returns, and the dispatcher takes it from there.
+
+    pending   waiting to be delivered. The dispatcher publishes it to the
+              device's channel, and the worker holding the device's socket
+              claims it. A heartbeat also picks it up.
+    sent      delivered; waiting for an ack until next_attempt_at.
+              Without an ack it goes back to pending after a backoff, and
+              is marked failed once COMMAND_MAX_ATTEMPTS is reached.
+    acked     the device has it and is working on it
+    completed / failed / expired
+              terminal. A command that is still pending or sent at
+              expires_at is expired. Rows without expires_at (queued
+              before it existed) expire COMMAND_TTL after created_at.
+
+Devices ack over the WebSocket (`command_ack` / `command_result`) or in
+`command_results` on their next heartbeat. A redelivered command keeps its
+id, so a device can tell it has already run it.
+
+A bulk command (POST /commands/bulk) is a `command_jobs` row plus one
+ordinary command per device, all inserted in one statement and tagged with
+the job id. Job progress is a GROUP BY status over those commands.
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, insert, or_, select, update
+
+import config
+from db import AsyncSessionLocal
+from models.v2 import CommandJob, Device, DeviceCommand
+from services.backplane import backplane, device_channel
+from services.broadcaster import broadcaster, command_status_event
+
+commands_table = DeviceCommand.__table__
+
+TERMINAL_STATUSES = ("completed", "failed", "expired")
+COMMAND_STATUSES = ("pending", "sent", "acked", "completed", "failed", "expired")
+
+
+def utcnow() -> datetime:
+    # Columns are naive DateTime holding UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before redelivering after `attempts` unacknowledged deliveries."""
+    return min(config.COMMAND_RETRY_BASE * 2 ** max(attempts - 1, 0), config.COMMAND_RETRY_MAX)
+
+
+def new_command_fields(ttl_seconds: Optional[int] = None) -> dict:
+    """Column values for a freshly queued command."""
+    now = utcnow()
+    return {
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+        "expires_at": now + timedelta(seconds=ttl_seconds or config.COMMAND_TTL),
+    }
+
+
+def command_message(command_id: str, command: str, params: Optional[str]) -> dict:
+    """What the device receives, over the WebSocket or in a heartbeat response."""
+    return {"id": command_id, "command": command, "params": json.loads(params) if params else {}}
+
+
+def _claim(where):
+    now = utcnow()
+    return (
+        update(commands_table)
+        .where(commands_table.c.status == "pending", where)
+        .values(
+            status="sent",
+            attempts=commands_table.c.attempts + 1,
+            sent_at=now,
+            next_attempt_at=now + timedelta(seconds=config.COMMAND_ACK_TIMEOUT),
+        )
+    )
+
+
+async def claim_command(db, command_id: str) -> bool:
+    """Mark one pending command as delivered. False if it was no longer pending."""
+    result = await db.execute(_claim(commands_table.c.id == command_id))
+    return result.rowcount == 1
+
+
+async def claim_commands(db, command_ids: Sequence[str]) -> List[str]:
+    """Mark many pending commands as delivered in one UPDATE. Returns the ids that were still pending."""
+    if not command_ids:
+        return []
+    rows = await db.execute(_claim(commands_table.c.id.in_(command_ids)).returning(commands_table.c.id))
+    return [row.id for row in rows]
+
+
+async def unclaim_command(db, command_id: str, error: str):
+    """Put back a command whose delivery failed, for the next attempt."""
+    await unclaim_commands(db, [command_id], error)
+
+
+async def unclaim_commands(db, command_ids: Sequence[str], error: str):
+    if not command_ids:
+        return
+    await db.execute(
+        update(commands_table)
+        .where(commands_table.c.id.in_(command_ids), commands_table.c.status == "sent")
+        .values(status="pending", next_attempt_at=utcnow(), last_error=error)
+    )
+
+
+async def bulk_targets(
+    db,
+    device_ids: Optional[Sequence[str]] = None,
+    user_id: Optional[str] = None,
+    firmware_version: Optional[str] = None,
+    online: Optional[bool] = None,
+) -> Dict[str, Optional[str]]:
+    """device_id -> user_id for the devices a bulk command goes to."""
+    query = select(Device.device_id, Device.user_id)
+    if device_ids is not None:
+        query = query.where(Device.device_id.in_(set(device_ids)))
+    if user_id is not None:
+        query = query.where(Device.user_id == user_id)
+    if firmware_version is not None:
+        query = query.where(Device.firmware_version == firmware_version)
+    if online is not None:
+        query = query.where(Device.is_online.is_(online))
+    # One row past the cap tells the caller the target was too big
+    rows = await db.execute(query.order_by(Device.device_id).limit(config.COMMAND_BULK_MAX_DEVICES + 1))
+    return {row.device_id: row.user_id for row in rows}
+
+
+async def queue_bulk(db, device_ids: Iterable[str], command: str, params_json: str, target: dict,
+                     ttl_seconds: Optional[int] = None) -> Tuple[CommandJob, Dict[str, str]]:
+    """Add a job and one pending command per device (one multi-row INSERT). Returns (job, {device_id: command_id}); not committed."""
+    fields = new_command_fields(ttl_seconds)
+    commands = {device_id: str(uuid.uuid4()) for device_id in device_ids}
+    job = CommandJob(
+        id=str(uuid.uuid4()), command=command, params=params_json, target=json.dumps(target),
+        total=len(commands), created_at=fields["created_at"], expires_at=fields["expires_at"],
+    )
+    db.add(job)
+    if commands:
+        await db.execute(insert(commands_table), [
+            {"id": command_id, "device_id": device_id, "job_id": job.id, "command": command, "params": params_json, **fields}
+            for device_id, command_id in commands.items()
+        ])
+    return job, commands
+
+
+async def job_progress(db, job_id: str) -> Dict[str, int]:
+    """Commands in the job per status."""
+    rows = await db.execute(
+        select(commands_table.c.status, func.count())
+        .where(commands_table.c.job_id == job_id)
+        .group_by(commands_table.c.status)
+    )
+    counts = dict.fromkeys(COMMAND_STATUSES, 0)
+    counts.update({status: count for status, count in rows})
+    return counts
+
+
+async def has_pending(db, device_id: str) -> bool:
+    """Cheap read-only check (partial index) before claiming, so idle polls don't take a write lock."""
+    row = (await db.execute(
+        select(commands_table.c.id).where(commands_table.c.device_id == device_id, commands_table.c.status == "pending").limit(1)
+    )).first()
+    return row is not None
+
+
+async def claim_for_heartbeat(db, device_id: str) -> List[dict]:
+    """Claim every pending command for a device in one UPDATE ... RETURNING."""
+    rows = (await db.execute(
+        _claim(commands_table.c.device_id == device_id).returning(
+            commands_table.c.id, commands_table.c.command, commands_table.c.params, commands_table.c.created_at,
+        )
+    )).all()
+    rows = sorted(rows, key=lambda row: row.created_at or datetime.min)
+    return [command_message(row.id, row.command, row.params) for row in rows]
+
+
+async def record_ack(db, device_id: str, command_id: str) -> Optional[dict]:
+    """Device confirmed receipt; stops redelivery. Returns the mobile event, if any."""
+    result = await db.execute(
+        update(commands_table)
+        .where(
+            commands_table.c.id == command_id,
+            commands_table.c.device_id == device_id,
+            commands_table.c.status.in_(("pending", "sent")),
+        )
+        .values(status="acked", acked_at=utcnow())
+    )
+    return {"command_id": command_id, "status": "acked"} if result.rowcount else None
+
+
+async def record_results(db, device_id: str, results: Iterable[dict]) -> List[dict]:
+    """Apply command results reported by a device.
+
+    `results` are {"command_id", "success", "error"} dicts. Commands that
+    already reached a terminal status are left alone.
+    """
+    now = utcnow()
+    changed = []
+    for result in results:
+        status = "completed" if result.get("success") else "failed"
+        updated = await db.execute(
+            update(commands_table)
+            .where(
+                commands_table.c.id == result.get("command_id"),
+                commands_table.c.device_id == device_id,
+                commands_table.c.status.notin_(TERMINAL_STATUSES),
+            )
+            .values(
+                status=status,
+                executed_at=now,
+                acked_at=func.coalesce(commands_table.c.acked_at, now),
+                last_error=result.get("error"),
+            )
+        )
+        if updated.rowcount:
+            changed.append({"command_id": result.get("command_id"), "status": status})
+    return changed
+
+
+async def _user_ids(db, device_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    device_ids = set(device_ids)
+    if not device_ids:
+        return {}
+    rows = await db.execute(select(Device.device_id, Device.user_id).where(Device.device_id.in_(device_ids)))
+    return {row.device_id: row.user_id for row in rows}
+
+
+class CommandDispatcher:
+    def __init__(self, interval: float, batch_size: int, session_factory=AsyncSessionLocal):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._session_factory = session_factory
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.published = 0
+        self.retried = 0
+        self.failed = 0
+        self.expired = 0
+        self.runs = 0
+        self.idle_runs = 0
+        self.errors = 0
+        self.last_run_at: Optional[datetime] = None
+
+    def notify(self):
+        """Wake the dispatcher, e.g. right after a command is committed."""
+        self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # Keep going while there are full batches of due commands
+                while await self.run_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                self.errors += 1
+                print(f"Command dispatcher error: {e}")
+
+    async def run_once(self) -> int:
+        """One pass: expire, time out unacked deliveries, publish due commands. Returns how many were published."""
+        now = utcnow()
+        events = []
+        async with self._session_factory() as db:
+            # Nothing pending or sent: skip the write statements below (an index probe on status)
+            live = (await db.execute(
+                select(commands_table.c.id).where(commands_table.c.status.in_(("pending", "sent"))).limit(1)
+            )).first()
+            if live is None:
+                self.idle_runs += 1
+                self.last_run_at = datetime.now(timezone.utc)
+                return 0
+
+            # Expired before anyone acknowledged them
+            expired = (await db.execute(
+                update(commands_table)
+                .where(
+                    commands_table.c.status.in_(("pending", "sent")),
+                    or_(
+                        commands_table.c.expires_at <= now,
+                        and_(
+                            commands_table.c.expires_at.is_(None),
+                            commands_table.c.created_at <= now - timedelta(seconds=config.COMMAND_TTL),
+                        ),
+                    ),
+                )
+                .values(status="expired", last_error="Not acknowledged before expiry")
+                .returning(commands_table.c.id, commands_table.c.device_id)
+            )).all()
+
+            # Delivered but never acknowledged: give up, or queue a retry after a backoff
+            timed_out = (await db.execute(
+                select(commands_table.c.id, commands_table.c.device_id, commands_table.c.attempts)
+                .where(commands_table.c.status == "sent", commands_table.c.next_attempt_at <= now)
+                .limit(self.batch_size)
+            )).all()
+            failed = [row for row in timed_out if row.attempts >= config.COMMAND_MAX_ATTEMPTS]
+            retry = [row for row in timed_out if row.attempts < config.COMMAND_MAX_ATTEMPTS]
+            if failed:
+                await db.execute(
+                    update(commands_table)
+                    .where(commands_table.c.id.in_([row.id for row in failed]), commands_table.c.status == "sent")
+                    .values(status="failed", last_error=f"No acknowledgement after {config.COMMAND_MAX_ATTEMPTS} attempts")
+                )
+            for row in retry:
+                await db.execute(
+                    update(commands_table)
+                    .where(commands_table.c.id == row.id, commands_table.c.status == "sent")
+                    .values(status="pending", next_attempt_at=now + timedelta(seconds=retry_delay(row.attempts)), last_error="Not acknowledged")
+                )
+
+            # Due for a push; holding them back an ack timeout keeps devices without a socket from being republished every pass
+            due = (
+                select(commands_table.c.id, commands_table.c.device_id, commands_table.c.command, commands_table.c.params)
+                .where(
+                    commands_table.c.status == "pending",
+                    or_(commands_table.c.next_attempt_at.is_(None), commands_table.c.next_attempt_at <= now),
+                )
+                .order_by(commands_table.c.next_attempt_at)
+                .limit(self.batch_size)
+            )
+            if db.bind.dialect.name == "postgresql":
+                # Several workers dispatch at once; each takes different rows
+                due = due.with_for_update(skip_locked=True)
+            due = (await db.execute(due)).all()
+            if due:
+                await db.execute(
+                    update(commands_table)
+                    .where(commands_table.c.id.in_([row.id for row in due]))
+                    .values(next_attempt_at=now + timedelta(seconds=config.COMMAND_ACK_TIMEOUT))
+                )
+
+            users = await _user_ids(db, [row.device_id for row in (*expired, *failed, *due)])
+            await db.commit()
+
+        events += [command_status_event(row.device_id, users.get(row.device_id), row.id, "expired") for row in expired]
+        events += [command_status_event(row.device_id, users.get(row.device_id), row.id, "failed") for row in failed]
+        await broadcaster.publish(events)
+
+        for row in due:
+            await backplane.publish(device_channel(row.device_id), {
+                "command": command_message(row.id, row.command, row.params),
+                "user_id": users.get(row.device_id),
+            })
+
+        self.published += len(due)
+        self.retried += len(retry)
+        self.failed += len(failed)
+        self.expired += len(expired)
+        self.runs += 1
+        self.last_run_at = datetime.now(timezone.utc)
+        return len(due)
+
+    async def deliver_pending(self, device_id: str):
+        """Publish a device's pending commands now, e.g. when its socket connects."""
+        async with self._session_factory() as db:
+            rows = (await db.execute(
+                select(commands_table.c.id, commands_table.c.command, commands_table.c.params)
+                .where(commands_table.c.device_id == device_id, commands_table.c.status == "pending")
+                .order_by(commands_table.c.created_at)
+            )).all()
+            users = await _user_ids(db, [device_id])
+        for row in rows:
+            await backplane.publish(device_channel(device_id), {
+                "command": command_message(row.id, row.command, row.params),
+                "user_id": users.get(device_id),
+            })
+
+    def metrics(self) -> dict:
+        return {
+            "published": self.published,
+            "retried": self.retried,
+            "failed": self.failed,
+            "expired": self.expired,
+            "runs": self.runs,
+            "idle_runs": self.idle_runs,
+            "errors": self.errors,
+            "last_run_at": self.last_run_at,
+        }
+
+
+dispatcher = CommandDispatcher(config.COMMAND_DISPATCH_INTERVAL, config.COMMAND_DISPATCH_BATCH)
@@ -0,0 +1,239 @@
+"""
+Heartbeat write coalescing
+
+Heartbeats land in an in-memory buffer keyed by device_id (a newer beat
+replaces an older one) and are written to `devices` in periodic bulk
+UPDATEs instead of one commit per request. Device WebSocket messages go
+through the same buffer via seen(), which only moves last_seen, so the
+presence sweep (which checks last_seen) agrees with a socket-only device.
+
+A flush only moves the /devices listing ETag for users whose listing
+actually changes: a device coming online, a new battery level or SSID, or
+last_seen crossing into a new HEARTBEAT_LAST_SEEN_RESOLUTION window.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, select, update
+
+import config
+from db import AsyncSessionLocal
+from models.v2 import Device
+from services.response_cache import device_list_cache
+from services.stats import system_stats
+
+devices_table = Device.__table__
+
+# One statement per row shape, executed as an executemany
+_update_seen = (
+    update(devices_table)
+    .where(devices_table.c.device_id == bindparam("b_device_id"))
+    .values(last_seen=bindparam("b_last_seen"), is_online=True)
+)
+_update_status = _update_seen.values(battery_level=bindparam("b_battery_level"))
+_update_status_and_ssid = _update_status.values(wifi_ssid=bindparam("b_wifi_ssid"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _changes_listing(current, row: dict, last_seen_resolution: float) -> bool:
+    """Whether writing a buffered row changes what GET /devices shows for the device."""
+    if not current.is_online:
+        return True
+    if "b_battery_level" in row and row["b_battery_level"] != current.battery_level:
+        return True
+    if "b_wifi_ssid" in row and row["b_wifi_ssid"] != current.wifi_ssid:
+        return True
+    if current.last_seen is None or last_seen_resolution <= 0:
+        return current.last_seen != row["b_last_seen"]
+    # last_seen alone moves the listing once per resolution window, not on every beat
+    def window(seen_at: datetime) -> float:
+        return (seen_at - _EPOCH).total_seconds() // last_seen_resolution
+    return window(current.last_seen) != window(row["b_last_seen"])
+
+
+class HeartbeatBuffer:
+    def __init__(
+        self,
+        flush_interval: float,
+        flush_size: int,
+        session_factory=AsyncSessionLocal,
+        last_seen_resolution: float = config.HEARTBEAT_LAST_SEEN_RESOLUTION,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.last_seen_resolution = last_seen_resolution
+        self._session_factory = session_factory
+        self._pending: Dict[str, dict] = {}
+        self._oldest_pending: Optional[float] = None
+        self._flush_now = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.received = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_flushed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_lag = 0.0
+        self.max_flush_lag = 0.0
+        self.last_flush_duration = 0.0
+        self.last_flush_at: Optional[datetime] = None
+
+    def record(
+        self,
+        device_id: str,
+        battery_level: int,
+        seen_at: datetime,
+        wifi_ssid: Optional[str] = None,
+    ):
+        """Buffer a heartbeat; it is written on the next flush."""
+        if seen_at.tzinfo is not None:
+            # last_seen is a naive DateTime holding UTC; asyncpg won't take an aware value for it
+            seen_at = seen_at.astimezone(timezone.utc).replace(tzinfo=None)
+        previous = self._pending.get(device_id)
+        # Keep an SSID reported earlier in the same window
+        wifi_ssid = wifi_ssid or (previous or {}).get("b_wifi_ssid")
+        row = {"b_device_id": device_id, "b_battery_level": battery_level, "b_last_seen": seen_at}
+        if wifi_ssid:
+            row["b_wifi_ssid"] = wifi_ssid
+        self._queue(device_id, row)
+
+    def seen(self, device_id: str, seen_at: datetime):
+        """Buffer a last_seen update for a device heard from without a status report."""
+        if seen_at.tzinfo is not None:
+            seen_at = seen_at.astimezone(timezone.utc).replace(tzinfo=None)
+        row = dict(self._pending.get(device_id) or {"b_device_id": device_id})
+        row["b_last_seen"] = seen_at
+        self._queue(device_id, row)
+
+    def _queue(self, device_id: str, row: dict):
+        self.received += 1
+        if device_id in self._pending:
+            self.coalesced += 1
+        elif self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+        self._pending[device_id] = row
+
+        if len(self._pending) >= self.flush_size:
+            self._flush_now.set()
+
+    async def flush(self):
+        """Write everything buffered so far in one transaction."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            oldest, self._oldest_pending = self._oldest_pending, None
+
+            started = time.monotonic()
+            with_ssid = [row for row in batch.values() if "b_wifi_ssid" in row]
+            without_ssid = [row for row in batch.values() if "b_wifi_ssid" not in row and "b_battery_level" in row]
+            seen_only = [row for row in batch.values() if "b_battery_level" not in row]
+            try:
+                async with self._session_factory() as db:
+                    # Compare with what the listing shows, and count offline -> online
+                    # transitions for /stats, before the bulk write hides them
+                    came_online = 0
+                    changed_users = set()
+                    device_ids = list(batch)
+                    for i in range(0, len(device_ids), 500):
+                        current = await db.execute(
+                            select(
+                                devices_table.c.device_id, devices_table.c.user_id, devices_table.c.is_online,
+                                devices_table.c.battery_level, devices_table.c.wifi_ssid, devices_table.c.last_seen,
+                            ).where(devices_table.c.device_id.in_(device_ids[i:i + 500]))
+                        )
+                        changed_users.update(
+                            row.user_id for row in current
+                            if _changes_listing(row, batch[row.device_id], self.last_seen_resolution)
+                        )
+                        result = await db.execute(
+                            update(devices_table)
+                            .where(devices_table.c.device_id.in_(device_ids[i:i + 500]), devices_table.c.is_online == False)
+                            .values(is_online=True)
+                        )
+                        came_online += result.rowcount
+                    if without_ssid:
+                        await db.execute(_update_status, without_ssid)
+                    if with_ssid:
+                        await db.execute(_update_status_and_ssid, with_ssid)
+                    if seen_only:
+                        await db.execute(_update_seen, seen_only)
+                    if changed_users:
+                        await device_list_cache.bump(db, *changed_users)
+                    await db.commit()
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Heartbeat flush failed ({len(batch)} devices): {e}")
+                # Put the batch back unless a newer beat arrived meanwhile
+                for device_id, row in batch.items():
+                    self._pending.setdefault(device_id, row)
+                if self._pending and self._oldest_pending is None:
+                    self._oldest_pending = oldest
+                return
+
+            system_stats.adjust(online=came_online)
+
+            finished = time.monotonic()
+            self.flushes += 1
+            self.rows_flushed += len(batch)
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_flush_lag = finished - oldest if oldest is not None else 0.0
+            self.max_flush_lag = max(self.max_flush_lag, self.last_flush_lag)
+            self.last_flush_duration = finished - started
+            self.last_flush_at = datetime.now(timezone.utc)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "flush_size": self.flush_size,
+            "last_seen_resolution_seconds": self.last_seen_resolution,
+            "pending": len(self._pending),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "rows_flushed": self.rows_flushed,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": round(self.rows_flushed / self.flushes, 2) if self.flushes else 0,
+            "last_flush_lag_seconds": round(self.last_flush_lag, 4),
+            "max_flush_lag_seconds": round(self.max_flush_lag, 4),
+            "last_flush_duration_seconds": round(self.last_flush_duration, 4),
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+heartbeat_buffer = HeartbeatBuffer(config.HEARTBEAT_FLUSH_INTERVAL, config.HEARTBEAT_FLUSH_SIZE)
@@ -0,0 +1,120 @@
+"""
+Long-poll command delivery
+
+`GET /devices/{device_id}/commands?wait=N` gives a device without a
+WebSocket its commands as soon as they are queued, instead of on its next
+heartbeat. The request checks for pending commands, and if there are none it
+parks on an asyncio.Event for that device until a command is queued or
+`wait` runs out.
+
+A parked request holds no database connection. It is a coroutine and an
+Event shared by every request for the device, so one worker can hold
+thousands. Queuing a command announces the device ids on a backplane
+channel, which wakes parked requests on every worker. The woken request
+claims the commands from the database, so the database stays the source of
+truth. A wake-up can come to nothing if a heartbeat claimed the commands
+first; the request then goes back to waiting for the rest of `wait`.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable
+
+import config
+from services.backplane import backplane
+
+CHANNEL = "commands:queued"
+
+
+class _Parked:
+    """Parked requests for one device."""
+    __slots__ = ("event", "count")
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.count = 0
+
+
+class Watcher:
+    def __init__(self, parked: _Parked):
+        self._parked = parked
+        self._event = parked.event
+
+    async def wait(self, timeout: float) -> bool:
+        """True once a command was queued for the device (possibly before this call), False on timeout."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        # Arm for the next announcement
+        self._event = self._parked.event
+        return True
+
+
+class CommandWaiters:
+    def __init__(self, max_waiters: int):
+        self.max_waiters = max_waiters
+        self._parked: Dict[str, _Parked] = {}
+        self.waiting = 0
+
+        # Metrics
+        self.announced = 0
+        self.woken = 0
+        self.rejected = 0
+
+    async def start(self):
+        await backplane.subscribe(CHANNEL, self._on_backplane)
+
+    async def stop(self):
+        await backplane.unsubscribe(CHANNEL)
+
+    @property
+    def full(self) -> bool:
+        return self.waiting >= self.max_waiters
+
+    @asynccontextmanager
+    async def watch(self, device_id: str):
+        """Register interest before checking the database, so a command queued in between isn't missed."""
+        parked = self._parked.get(device_id)
+        if parked is None:
+            parked = self._parked[device_id] = _Parked()
+        parked.count += 1
+        self.waiting += 1
+        try:
+            yield Watcher(parked)
+        finally:
+            parked.count -= 1
+            self.waiting -= 1
+            if parked.count == 0 and self._parked.get(device_id) is parked:
+                del self._parked[device_id]
+
+    async def announce(self, device_ids: Iterable[str]):
+        """Commands were queued for these devices; wake their parked requests on every worker."""
+        device_ids = list(device_ids)
+        if device_ids:
+            self.announced += len(device_ids)
+            await backplane.broadcast(CHANNEL, {"device_ids": device_ids})
+
+    async def _on_backplane(self, channel: str, message: dict):
+        self.wake(message["device_ids"])
+
+    def wake(self, device_ids: Iterable[str]):
+        for device_id in device_ids:
+            parked = self._parked.get(device_id)
+            if parked is not None:
+                # Requests that are waiting hold the old event; later waits use a fresh one
+                event, parked.event = parked.event, asyncio.Event()
+                event.set()
+                self.woken += parked.count
+
+    def metrics(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "devices": len(self._parked),
+            "announced": self.announced,
+            "woken": self.woken,
+            "rejected": self.rejected,
+        }
+
+
+command_waiters = CommandWaiters(config.LONG_POLL_MAX_WAITERS)
@@ -0,0 +1,161 @@
+"""
+Prerendered HTML pages: the API home page, Swagger UI and ReDoc
+
+Each page is rendered once, at startup or on its first request, together
+with a gzip copy of the body and an ETag. Requests are answered from
+memory: 304 for a matching If-None-Match, the gzip bytes for clients that
+accept them, otherwise the plain HTML. The pages only change when a
+template does, so they are served with a long max-age.
+
+With PAGE_TEMPLATE_RELOAD=true (for editing templates) every request checks
+the template mtimes, rebuilds the page when one changed, and asks browsers
+to revalidate instead of caching.
+"""
+
+import gzip
+import hashlib
+import os
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
+
+from fastapi import FastAPI, Response
+from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+from fastapi.requests import Request
+
+import config
+from services.response_cache import etag_matches
+from utils.helper import add_custom_color, load_navbar_and_footer_html
+
+TEMPLATES = ["templates/home.html", "templates/navbar.html", "templates/footer.html"]
+DOCS_BACKGROUND = "#f4edf8"
+
+
+@lru_cache(maxsize=1)
+def _templates():
+    # jinja2 is only needed for the home page; keep it off the import path
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
+
+
+def _mtimes() -> Tuple[float, ...]:
+    return tuple(os.stat(path).st_mtime_ns for path in TEMPLATES)
+
+
+def _with_navbar_and_footer(html: str) -> str:
+    navbar_html, footer_html = load_navbar_and_footer_html()
+    custom_css = add_custom_color(DOCS_BACKGROUND)
+    return html.replace("<body>", f"<body>{navbar_html}{custom_css}").replace("</body>", f"{footer_html}</body>")
+
+
+def render_home(app: FastAPI) -> str:
+    navbar_html, footer_html = load_navbar_and_footer_html()
+    return _templates().get_template("home.html").render(navbar_html=navbar_html, footer_html=footer_html)
+
+
+def render_swagger(app: FastAPI) -> str:
+    return _with_navbar_and_footer(get_swagger_ui_html(
+        openapi_url=app.openapi_url,
+        title=app.title + " - Swagger UI",
+        swagger_js_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui-bundle.js",
+        swagger_css_url="https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui.css",
+    ).body.decode())
+
+
+def render_redoc(app: FastAPI) -> str:
+    return _with_navbar_and_footer(get_redoc_html(
+        openapi_url=app.openapi_url,
+        title=app.title + " - ReDoc",
+        redoc_js_url="https://cdn.jsdelivr.net/npm/redoc@2.1.2/bundles/redoc.standalone.js",
+    ).body.decode())
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """True if an Accept-Encoding header allows gzip: listed (or covered by `*`) with a q-value above 0."""
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return quality > 0
+
+
+class _Page:
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "mtimes")
+
+    def __init__(self, html: str, mtimes: Tuple[float, ...]):
+        self.body = html.encode()
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha1(self.body).hexdigest()[:24]
+        # Each encoding is its own representation, so each gets its own strong ETag
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.mtimes = mtimes
+
+
+class PageCache:
+    def __init__(self, reload: bool, max_age: int):
+        self.reload = reload
+        self.max_age = max_age
+        self._renderers: Dict[str, Callable[[FastAPI], str]] = {
+            "home": render_home,
+            "swagger": render_swagger,
+            "redoc": render_redoc,
+        }
+        self._pages: Dict[str, _Page] = {}
+
+        # Metrics
+        self.renders = 0
+        self.not_modified = 0
+        self.served = 0
+
+    def _page(self, name: str, app: FastAPI) -> _Page:
+        page = self._pages.get(name)
+        mtimes = _mtimes() if self.reload or page is None else page.mtimes
+        if page is None or page.mtimes != mtimes:
+            page = self._pages[name] = _Page(self._renderers[name](app), mtimes)
+            self.renders += 1
+        return page
+
+    def warm(self, app: FastAPI):
+        """Render every page now rather than on its first request."""
+        for name in self._renderers:
+            self._page(name, app)
+
+    def response(self, request: Request, name: str) -> Response:
+        page = self._page(name, request.app)
+        gzipped = accepts_gzip(request.headers.get("accept-encoding", ""))
+        etag = page.gzip_etag if gzipped else page.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache" if self.reload else f"public, max-age={self.max_age}",
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request, page.etag) or etag_matches(request, page.gzip_etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        self.served += 1
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=page.gzip_body, media_type="text/html; charset=utf-8", headers=headers)
+        return Response(content=page.body, media_type="text/html; charset=utf-8", headers=headers)
+
+    def metrics(self) -> dict:
+        return {
+            "reload": self.reload,
+            "pages": {name: {"bytes": len(page.body), "gzip_bytes": len(page.gzip_body)} for name, page in self._pages.items()},
+            "renders": self.renders,
+            "served": self.served,
+            "not_modified": self.not_modified,
+        }
+
+
+page_cache = PageCache(config.PAGE_TEMPLATE_RELOAD, config.PAGE_CACHE_MAX_AGE)
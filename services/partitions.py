@@ -0,0 +1,325 @@
+"""
+Monthly usage_analytics partitions
+
+Usage events live in one table per calendar month (UTC), named
+usage_analytics_YYYY_MM. The same layout is used on SQLite and Postgres, so
+both go through one code path. Writes are routed to the month of each
+event's timestamp. Reads list only the months that overlap the requested
+window (services/analytics.py). Each table has its own (device_id, timestamp)
+index, and dropping a month is a single DROP TABLE rather than a large
+DELETE.
+
+The months that exist are cached per worker. The cache is reloaded from the
+catalog when a read asks for a month it doesn't know, at most every
+ANALYTICS_PARTITION_REFRESH_INTERVAL seconds. Every worker creates the
+current and next month ahead of time. A month older than
+ANALYTICS_RETENTION_MONTHS is left out of reads, and the retention job
+(`archive_cold_partitions`) streams it to a gzip NDJSON file in
+ANALYTICS_ARCHIVE_DIR before dropping it. Because reads already skip such a
+month, no worker is reading a table when it is dropped.
+
+    python -m services.partitions --archive      # run the retention job once
+    python -m services.partitions --list         # months in the hot database
+"""
+
+import argparse
+import asyncio
+import fcntl
+import gzip
+import json
+import os
+import re
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, func, inspect, select, text
+
+import config
+from db import AsyncSessionLocal
+from utils.pagination import encode_cursor, keyset_page
+
+PARTITION_PREFIX = "usage_analytics_"
+PARTITION_NAME = re.compile(r"^usage_analytics_(\d{4})_(\d{2})$")
+USAGE_COLUMNS = ["id", "device_id", "content_id", "action", "duration", "session_id", "timestamp"]
+
+# Partition tables are built on demand and kept out of Base.metadata, so create_all doesn't touch them
+partition_metadata = MetaData()
+
+
+def month_start(value: datetime) -> date:
+    """First day of the UTC month `value` falls in."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+def partition_table(month: date) -> Table:
+    """Table for one month of usage events."""
+    name = partition_name(month)
+    table = partition_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name, partition_metadata,
+            Column("id", String, primary_key=True),  # UUIDv7, so new rows land at the right-hand edge of the index
+            Column("device_id", String, nullable=False),
+            Column("content_id", String, nullable=False),
+            Column("action", String, nullable=False),  # play, pause, stop, complete
+            Column("duration", Integer, default=0),
+            Column("session_id", String, nullable=True),
+            Column("timestamp", DateTime, nullable=False),
+            Index(f"ix_{name}_device_timestamp", "device_id", "timestamp"),
+        )
+    return table
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[date]:
+    """Oldest month still served from the hot database, or None when retention is off."""
+    if config.ANALYTICS_RETENTION_MONTHS <= 0:
+        return None
+    return add_months(month_start(now or datetime.now(timezone.utc)), -config.ANALYTICS_RETENTION_MONTHS)
+
+
+class UsagePartitions:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._months: Set[date] = set()
+        self._refreshed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.refreshes = 0
+        self.created = 0
+        self.archived = 0
+        self.archived_rows = 0
+        self.archive_errors = 0
+        self.last_archive_at: Optional[datetime] = None
+
+    # Sync halves, shared by the async session (run_sync) and the v1 Session
+    def _load(self, conn):
+        self._months = {
+            date(int(match.group(1)), int(match.group(2)), 1)
+            for match in map(PARTITION_NAME.match, inspect(conn).get_table_names())
+            if match
+        }
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    def _create(self, conn, months: Iterable[date]):
+        for month in sorted(set(months) - self._months):
+            partition_table(month).create(conn, checkfirst=True)
+            self._months.add(month)
+            self.created += 1
+
+    def _stale(self) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.refresh_interval
+
+    def _overlapping(self, start: datetime, end: Optional[datetime]) -> List[date]:
+        first = month_start(start)
+        cutoff = retention_cutoff()
+        if cutoff is not None and first < cutoff:
+            first = cutoff
+        last = month_start(end) if end is not None else None
+        return sorted((m for m in self._months if m >= first and (last is None or m <= last)), reverse=True)
+
+    def _wants_refresh(self, start: datetime, end: Optional[datetime]) -> bool:
+        # A month in the window we don't know about may have been created by another worker
+        if not self._stale():
+            return False
+        first = month_start(start)
+        last = month_start(end or datetime.now(timezone.utc))
+        month = first
+        while month <= last:
+            if month not in self._months:
+                return True
+            month = add_months(month, 1)
+        return False
+
+    async def refresh(self, db):
+        await db.run_sync(lambda session: self._load(session.connection()))
+
+    async def ensure(self, db, months: Iterable[date]):
+        """Create any missing month tables. Commits the session, so call it before staging other work."""
+        months = set(months)
+        if self._refreshed_at is None:
+            await self.refresh(db)
+        if months - self._months:
+            await db.run_sync(lambda session: self._create(session.connection(), months))
+            await db.commit()
+
+    def ensure_sync(self, db, months: Iterable[date]):
+        """ensure() for a sync Session (v1)."""
+        months = set(months)
+        if self._refreshed_at is None:
+            self._load(db.connection())
+        if months - self._months:
+            self._create(db.connection(), months)
+            db.commit()
+
+    async def tables_for(self, db, start: datetime, end: Optional[datetime] = None) -> List[Table]:
+        """Month tables overlapping [start, end], newest first."""
+        if self._wants_refresh(start, end):
+            await self.refresh(db)
+        return [partition_table(month) for month in self._overlapping(start, end)]
+
+    def tables_for_sync(self, db, start: datetime, end: Optional[datetime] = None) -> List[Table]:
+        if self._wants_refresh(start, end):
+            self._load(db.connection())
+        return [partition_table(month) for month in self._overlapping(start, end)]
+
+    def months(self) -> List[date]:
+        return sorted(self._months)
+
+    async def prepare(self):
+        """Load the catalog and create this month's and next month's tables."""
+        current = month_start(datetime.now(timezone.utc))
+        async with AsyncSessionLocal() as db:
+            await self.refresh(db)
+            await self.ensure(db, [current, add_months(current, 1)])
+
+    async def archive_month(self, month: date, archive_dir: Path, batch_size: int = 5000) -> int:
+        """Write one month to gzip NDJSON, then drop its table. Returns the rows archived."""
+        table = partition_table(month)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        final = archive_dir / f"{table.name}.{stamp}.ndjson.gz"
+        partial = final.with_suffix(".partial")
+
+        written = 0
+        key_columns = [table.c.timestamp, table.c.id]
+        cursor = None
+        with gzip.open(partial, "wt", encoding="utf-8") as out:
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(keyset_page(select(table), key_columns, cursor, batch_size))).mappings().all()
+                for row in rows[:batch_size]:
+                    out.write(json.dumps({**row, "timestamp": row["timestamp"].isoformat()}, separators=(",", ":")) + "\n")
+                written += len(rows[:batch_size])
+                if len(rows) <= batch_size:
+                    break
+                cursor = encode_cursor([rows[batch_size - 1]["timestamp"], rows[batch_size - 1]["id"]])
+            out.flush()
+            os.fsync(out.fileno())
+        partial.rename(final)
+
+        # Drop only if nothing was written to the month while we were copying it
+        async with AsyncSessionLocal() as db:
+            if db.bind.dialect.name == "postgresql":
+                await db.execute(text(f'LOCK TABLE "{table.name}" IN ACCESS EXCLUSIVE MODE'))
+            count = await db.scalar(select(func.count()).select_from(table))
+            if count != written:
+                await db.rollback()
+                final.unlink()
+                raise RuntimeError(f"{table.name} changed while archiving ({written} written, {count} now); retrying next run")
+            await db.run_sync(lambda session: table.drop(session.connection()))
+            await db.commit()
+        self._months.discard(month)
+        partition_metadata.remove(table)
+        print(f"Archived {written} usage events from {table.name} to {final}")
+        return written
+
+    async def archive_cold_partitions(self) -> int:
+        """Retention job: archive and drop every month older than ANALYTICS_RETENTION_MONTHS."""
+        cutoff = retention_cutoff()
+        if cutoff is None:
+            return 0
+        archive_dir = Path(config.ANALYTICS_ARCHIVE_DIR)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        # One archiver at a time across the workers on this host
+        with open(archive_dir / ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            async with AsyncSessionLocal() as db:
+                await self.refresh(db)
+            archived = 0
+            for month in self.months():
+                if month >= cutoff:
+                    break
+                try:
+                    rows = await self.archive_month(month, archive_dir)
+                except Exception as e:
+                    self.archive_errors += 1
+                    print(f"Archiving {partition_name(month)} failed: {e}")
+                    continue
+                archived += 1
+                self.archived += 1
+                self.archived_rows += rows
+                self.last_archive_at = datetime.now(timezone.utc)
+            return archived
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(config.ANALYTICS_MAINTENANCE_INTERVAL)
+            try:
+                await self.prepare()
+                await self.archive_cold_partitions()
+            except Exception as e:
+                print(f"Usage partition maintenance failed: {e}")
+
+    async def start(self):
+        try:
+            await self.prepare()
+        except Exception as e:
+            print(f"Usage partition setup failed, creating months on first write: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        cutoff = retention_cutoff()
+        return {
+            "months": [partition_name(month) for month in self.months()],
+            "retention_cutoff": partition_name(cutoff) if cutoff else None,
+            "refreshes": self.refreshes,
+            "created": self.created,
+            "archived": self.archived,
+            "archived_rows": self.archived_rows,
+            "archive_errors": self.archive_errors,
+            "last_archive_at": self.last_archive_at,
+        }
+
+
+usage_partitions = UsagePartitions(config.ANALYTICS_PARTITION_REFRESH_INTERVAL)
+
+
+async def _cli(args):
+    async with AsyncSessionLocal() as db:
+        await usage_partitions.refresh(db)
+    if args.list:
+        cutoff = retention_cutoff()
+        for month in usage_partitions.months():
+            print(partition_name(month) + ("  (past retention)" if cutoff and month < cutoff else ""))
+    if args.archive:
+        archived = await usage_partitions.archive_cold_partitions()
+        print(f"Archived {archived} month(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Usage analytics partition maintenance")
+    parser.add_argument("--list", action="store_true", help="list the month tables in the database")
+    parser.add_argument("--archive", action="store_true", help="archive and drop months past ANALYTICS_RETENTION_MONTHS")
+    args = parser.parse_args()
+    if args.list or args.archive:
+        asyncio.run(_cli(args))
+    else:
+        parser.print_help()
@@ -0,0 +1,201 @@
+"""
+Device presence tracking
+
+Replaces the 5-minute offline sweep. Every heartbeat, registration and
+device WebSocket message pushes the device's deadline out by
+PRESENCE_TIMEOUT seconds. Deadlines sit in a min-heap. A small task pops the
+expired ones every PRESENCE_CHECK_INTERVAL seconds and marks them offline in
+one bulk UPDATE. Each transition goes out as a device_status event.
+
+The UPDATE only matches devices whose last_seen in the database is also
+past the timeout. A device that is heartbeating through another worker is
+left alone, and its deadline here is moved to match the database. WebSocket
+messages reach last_seen through heartbeat_buffer.seen(), so socket-only
+devices pass the same check. On startup
+the tracker loads deadlines for every device the database says is online.
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+
+import config
+from db import AsyncSessionLocal
+from models.v2 import Device
+from services.broadcaster import broadcaster, device_status_event
+from services.response_cache import device_list_cache
+from services.stats import system_stats
+
+devices_table = Device.__table__
+
+# Devices per UPDATE ... WHERE device_id IN (...)
+CHUNK_SIZE = 500
+
+
+class PresenceTracker:
+    def __init__(self, timeout: float, check_interval: float, session_factory=AsyncSessionLocal):
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._session_factory = session_factory
+        # Current deadline per device, and a heap that may also hold older deadlines for it
+        self._deadlines: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.went_offline = 0
+        self.rearmed = 0
+        self.sweeps = 0
+        self.sweep_errors = 0
+        self.last_sweep_duration = 0.0
+        self.max_detection_lag = 0.0
+        self.last_offline_at: Optional[datetime] = None
+
+    def touch(self, device_id: str, seen_at: Optional[float] = None):
+        """Device was heard from; it goes offline PRESENCE_TIMEOUT seconds after its last touch."""
+        deadline = (seen_at if seen_at is not None else time.monotonic()) + self.timeout
+        self._deadlines[device_id] = deadline
+        heapq.heappush(self._heap, (deadline, device_id))
+        if len(self._heap) > 4 * len(self._deadlines) + 1000:
+            self._compact()
+
+    def _compact(self):
+        # Drop superseded heap entries; a device heartbeating every 30s leaves a few per timeout
+        self._heap = [(deadline, device_id) for device_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_expired(self, now: float) -> Dict[str, float]:
+        expired = {}
+        while self._heap and self._heap[0][0] <= now:
+            deadline, device_id = heapq.heappop(self._heap)
+            if self._deadlines.get(device_id) == deadline:
+                del self._deadlines[device_id]
+                expired[device_id] = deadline
+        return expired
+
+    def _arm_from_last_seen(self, device_id: str, last_seen: Optional[datetime]):
+        if last_seen is None:
+            self.touch(device_id)
+            return
+        if last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - last_seen).total_seconds()
+        self.touch(device_id, time.monotonic() - max(age, 0.0))
+
+    async def load(self):
+        """Arm a deadline for every device currently marked online."""
+        async with self._session_factory() as db:
+            rows = await db.execute(
+                select(devices_table.c.device_id, devices_table.c.last_seen).where(devices_table.c.is_online == True)
+            )
+            for row in rows:
+                if row.device_id not in self._deadlines:
+                    self._arm_from_last_seen(row.device_id, row.last_seen)
+
+    async def sweep(self) -> int:
+        """Mark every device past its deadline offline. Returns how many went offline."""
+        now = time.monotonic()
+        expired = self._pop_expired(now)
+        if not expired:
+            return 0
+
+        started = time.monotonic()
+        # last_seen is a naive DateTime holding UTC
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.timeout)
+        offline, still_online = [], []
+        device_ids = list(expired)
+        try:
+            async with self._session_factory() as db:
+                for i in range(0, len(device_ids), CHUNK_SIZE):
+                    chunk = device_ids[i:i + CHUNK_SIZE]
+                    went_offline = (await db.execute(
+                        update(devices_table)
+                        .where(
+                            devices_table.c.device_id.in_(chunk),
+                            devices_table.c.is_online == True,
+                            or_(devices_table.c.last_seen < cutoff, devices_table.c.last_seen.is_(None)),
+                        )
+                        .values(is_online=False)
+                        .returning(devices_table.c.device_id, devices_table.c.user_id)
+                    )).all()
+                    offline += went_offline
+                    if len(went_offline) < len(chunk):
+                        # Still online: seen through another worker, or a buffered heartbeat landed late
+                        still_online += (await db.execute(
+                            select(devices_table.c.device_id, devices_table.c.last_seen).where(
+                                devices_table.c.device_id.in_(chunk),
+                                devices_table.c.is_online == True,
+                            )
+                        )).all()
+                if offline:
+                    await device_list_cache.bump(db, *{row.user_id for row in offline})
+                await db.commit()
+        except Exception as e:
+            self.sweep_errors += 1
+            print(f"Presence sweep failed ({len(expired)} devices): {e}")
+            # Try again next tick, unless the device was heard from meanwhile
+            for device_id in device_ids:
+                if device_id not in self._deadlines:
+                    self.touch(device_id, now - self.timeout)
+            return 0
+
+        for row in still_online:
+            if row.device_id not in self._deadlines:
+                self._arm_from_last_seen(row.device_id, row.last_seen)
+                self.rearmed += 1
+
+        if offline:
+            system_stats.adjust(online=-len(offline))
+            await broadcaster.publish(device_status_event(row.device_id, row.user_id, False) for row in offline)
+            self.last_offline_at = datetime.now(timezone.utc)
+
+        finished = time.monotonic()
+        self.went_offline += len(offline)
+        self.sweeps += 1
+        self.last_sweep_duration = finished - started
+        self.max_detection_lag = max(self.max_detection_lag, finished - min(expired.values()))
+        return len(offline)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.sweep()
+
+    async def start(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Presence load failed, tracking only new activity: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "timeout_seconds": self.timeout,
+            "check_interval_seconds": self.check_interval,
+            "tracked": len(self._deadlines),
+            "heap_size": len(self._heap),
+            "went_offline": self.went_offline,
+            "rearmed": self.rearmed,
+            "sweeps": self.sweeps,
+            "sweep_errors": self.sweep_errors,
+            "last_sweep_duration_seconds": round(self.last_sweep_duration, 4),
+            "max_detection_lag_seconds": round(self.max_detection_lag, 4),
+            "last_offline_at": self.last_offline_at,
+        }
+
+
+presence = PresenceTracker(config.PRESENCE_TIMEOUT, config.PRESENCE_CHECK_INTERVAL)
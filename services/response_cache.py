@@ -0,0 +1,94 @@
+"""
+Version-stamped response caching for list endpoints
+
+Each cache keeps a version counter per scope (e.g. per user_id for the
+device list) in `response_cache_versions`. Write paths bump it inside the
+transaction that makes the change, so the new version becomes visible to
+every worker at the same moment as the data. ETags are derived from the
+scope's version and the query variant, so a matching If-None-Match is
+answered with 304 after a single primary-key lookup, and the serialized
+body for the current version is reused instead of rebuilt.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from fastapi import Response
+from fastapi.requests import Request
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.v2 import ResponseCacheVersion
+
+versions_table = ResponseCacheVersion.__table__
+
+ALL = "*"  # scope for unfiltered listings
+
+
+class ResponseCache:
+    def __init__(self, name: str, max_entries: int = 128):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, Hashable], Tuple[str, bytes]]" = OrderedDict()
+
+    def _bump_statement(self, dialect: str, scopes):
+        # The unfiltered scope always changes with the others. Rows are written in
+        # sorted order so concurrent bumps lock them in the same order on Postgres.
+        scopes = sorted({str(scope) for scope in scopes if scope is not None} | {ALL})
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        upsert = insert(versions_table).values([{"cache": self.name, "scope": scope, "version": 1} for scope in scopes])
+        return upsert.on_conflict_do_update(
+            index_elements=[versions_table.c.cache, versions_table.c.scope],
+            set_={"version": versions_table.c.version + 1},
+        )
+
+    async def bump(self, db, *scopes: Optional[Hashable]):
+        """Mark scopes changed; call before committing the write they belong to."""
+        await db.execute(self._bump_statement(db.bind.dialect.name, scopes))
+
+    def bump_sync(self, db, *scopes: Optional[Hashable]):
+        """bump() for the sync Session used by the v1 routes."""
+        db.execute(self._bump_statement(db.bind.dialect.name, scopes))
+
+    async def etag(self, db, scope: Hashable, variant: Hashable) -> str:
+        version = await db.scalar(
+            select(versions_table.c.version).where(versions_table.c.cache == self.name, versions_table.c.scope == str(scope))
+        )
+        digest = hashlib.sha1(repr((self.name, version or 0, variant)).encode()).hexdigest()
+        return f'"{digest[:24]}"'
+
+    def get(self, scope: Hashable, variant: Hashable, etag: str) -> Optional[bytes]:
+        entry = self._entries.get((scope, variant))
+        if entry is None or entry[0] != etag:
+            return None
+        self._entries.move_to_end((scope, variant))
+        return entry[1]
+
+    def put(self, scope: Hashable, variant: Hashable, etag: str, body: bytes):
+        self._entries[(scope, variant)] = (etag, body)
+        self._entries.move_to_end((scope, variant))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_json_response(body: bytes, etag: str) -> Response:
+    # no-cache: clients may store the body but must revalidate with the ETag
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+content_library_cache = ResponseCache("content_library")
+device_list_cache = ResponseCache("devices")
@@ -0,0 +1,301 @@
+"""
+Hourly and daily usage rollups
+
+Every analytics event that is committed is also counted into in-memory
+rollup buckets: hour and day, per device and per content item. Each bucket
+holds events, plays, completes, total duration and unique sessions. Every
+ROLLUP_FLUSH_INTERVAL seconds the pending deltas are upserted into
+`usage_rollups` in one transaction (`plays = plays + excluded.plays`).
+Unique sessions are kept exact through `usage_rollup_sessions`: only
+sessions inserted for the first time in a bucket are added to its count.
+
+Rollup lag is how long the oldest pending delta has been waiting. The
+rollup endpoints return it with every response, and /metrics reports it
+too. Deltas still pending when a worker dies are lost. Recompute the
+affected window from the raw events with:
+
+    python -m services.rollups --rebuild --days 2
+
+Session rows older than ROLLUP_SESSION_RETENTION_DAYS are pruned. A session
+arriving later than that may be counted twice in its bucket.
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+import config
+from db import AsyncSessionLocal
+from models.v2 import UsageRollup, UsageRollupSession
+from services.partitions import usage_partitions
+
+rollups_table = UsageRollup.__table__
+sessions_table = UsageRollupSession.__table__
+
+PERIODS = ("hour", "day")
+SCOPES = ("device", "content")
+COUNTERS = ("events", "plays", "completes", "total_duration")
+CHUNK_SIZE = 500
+
+# (period, scope, key, bucket_start)
+BucketKey = Tuple[str, str, str, datetime]
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bucket_start(timestamp: datetime, period: str) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class _Bucket:
+    __slots__ = ("events", "plays", "completes", "total_duration", "sessions")
+
+    def __init__(self):
+        self.events = 0
+        self.plays = 0
+        self.completes = 0
+        self.total_duration = 0
+        self.sessions = set()
+
+    def merge(self, other: "_Bucket"):
+        self.events += other.events
+        self.plays += other.plays
+        self.completes += other.completes
+        self.total_duration += other.total_duration
+        self.sessions |= other.sessions
+
+
+def _insert(dialect: str):
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+
+class RollupBuffer:
+    def __init__(self, flush_interval: float, session_retention_days: int, session_factory=AsyncSessionLocal):
+        self.flush_interval = flush_interval
+        self.session_retention_days = session_retention_days
+        self._session_factory = session_factory
+        self._pending: Dict[BucketKey, _Bucket] = {}
+        self._oldest_pending: Optional[float] = None
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune: Optional[float] = None
+
+        # Metrics
+        self.recorded = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.buckets_flushed = 0
+        self.last_flush_duration = 0.0
+        self.max_lag = 0.0
+        self.last_flush_at: Optional[datetime] = None
+
+    def record(self, rows: Iterable[dict]):
+        """Count committed usage_analytics rows (dicts with the column names) into the pending buckets."""
+        for row in rows:
+            self.recorded += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            timestamp = row.get("timestamp") or utcnow()
+            action = row.get("action")
+            for period in PERIODS:
+                start = bucket_start(timestamp, period)
+                for scope, key in (("device", row["device_id"]), ("content", row["content_id"])):
+                    bucket = self._pending.get((period, scope, key, start))
+                    if bucket is None:
+                        bucket = self._pending[(period, scope, key, start)] = _Bucket()
+                    bucket.events += 1
+                    bucket.plays += action == "play"
+                    bucket.completes += action == "complete"
+                    bucket.total_duration += row.get("duration") or 0
+                    if row.get("session_id"):
+                        bucket.sessions.add(row["session_id"])
+
+    def lag_seconds(self) -> float:
+        """How long the oldest not-yet-written event has been waiting."""
+        return time.monotonic() - self._oldest_pending if self._oldest_pending is not None else 0.0
+
+    async def flush(self):
+        """Upsert every pending bucket in one transaction."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            oldest, self._oldest_pending = self._oldest_pending, None
+
+            started = time.monotonic()
+            try:
+                async with self._session_factory() as db:
+                    await self._write(db, batch)
+                    await db.commit()
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Rollup flush failed ({len(batch)} buckets): {e}")
+                # Put the deltas back, merged with anything recorded meanwhile
+                for key, bucket in batch.items():
+                    current = self._pending.get(key)
+                    if current is None:
+                        self._pending[key] = bucket
+                    else:
+                        current.merge(bucket)
+                if oldest is not None:
+                    self._oldest_pending = min(oldest, self._oldest_pending or oldest)
+                return
+
+            finished = time.monotonic()
+            self.flushes += 1
+            self.buckets_flushed += len(batch)
+            self.last_flush_duration = finished - started
+            if oldest is not None:
+                self.max_lag = max(self.max_lag, finished - oldest)
+            self.last_flush_at = datetime.now(timezone.utc)
+
+    async def _write(self, db, batch: Dict[BucketKey, _Bucket]):
+        insert = _insert(db.bind.dialect.name)
+
+        # Sessions first: only the ones new to their bucket count towards unique_sessions
+        session_rows = [
+            {"period": period, "scope": scope, "key": key, "bucket_start": start, "session_id": session_id}
+            for (period, scope, key, start), bucket in batch.items()
+            for session_id in bucket.sessions
+        ]
+        new_sessions = Counter()
+        for i in range(0, len(session_rows), CHUNK_SIZE):
+            inserted = await db.execute(
+                insert(sessions_table)
+                .values(session_rows[i:i + CHUNK_SIZE])
+                .on_conflict_do_nothing()
+                .returning(sessions_table.c.period, sessions_table.c.scope, sessions_table.c.key, sessions_table.c.bucket_start)
+            )
+            new_sessions.update(tuple(row) for row in inserted)
+
+        now = utcnow()
+        rollup_rows = [
+            {
+                "period": period, "scope": scope, "key": key, "bucket_start": start,
+                "events": bucket.events, "plays": bucket.plays, "completes": bucket.completes,
+                "total_duration": bucket.total_duration,
+                "unique_sessions": new_sessions[(period, scope, key, start)],
+                "updated_at": now,
+            }
+            for (period, scope, key, start), bucket in batch.items()
+        ]
+        for i in range(0, len(rollup_rows), CHUNK_SIZE):
+            upsert = insert(rollups_table).values(rollup_rows[i:i + CHUNK_SIZE])
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[rollups_table.c.period, rollups_table.c.scope, rollups_table.c.key, rollups_table.c.bucket_start],
+                set_={
+                    **{name: rollups_table.c[name] + upsert.excluded[name] for name in (*COUNTERS, "unique_sessions")},
+                    "updated_at": upsert.excluded.updated_at,
+                },
+            )
+            await db.execute(upsert)
+
+    async def prune_sessions(self):
+        cutoff = bucket_start(utcnow() - timedelta(days=self.session_retention_days), "day")
+        async with self._session_factory() as db:
+            await db.execute(delete(sessions_table).where(sessions_table.c.bucket_start < cutoff))
+            await db.commit()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if self._last_prune is None or time.monotonic() - self._last_prune > 3600:
+                self._last_prune = time.monotonic()
+                try:
+                    await self.prune_sessions()
+                except Exception as e:
+                    print(f"Rollup session prune failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "pending_buckets": len(self._pending),
+            "lag_seconds": round(self.lag_seconds(), 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "buckets_flushed": self.buckets_flushed,
+            "last_flush_duration_seconds": round(self.last_flush_duration, 4),
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+async def read_rollups(db, period: str, scope: str, key: str, start: datetime, end: Optional[datetime] = None) -> List[dict]:
+    """Buckets for one device or content item, oldest first."""
+    query = select(
+        rollups_table.c.bucket_start, rollups_table.c.events, rollups_table.c.plays, rollups_table.c.completes,
+        rollups_table.c.total_duration, rollups_table.c.unique_sessions,
+    ).where(
+        rollups_table.c.period == period,
+        rollups_table.c.scope == scope,
+        rollups_table.c.key == key,
+        rollups_table.c.bucket_start >= bucket_start(start, period),
+    ).order_by(rollups_table.c.bucket_start)
+    if end is not None:
+        query = query.where(rollups_table.c.bucket_start < end)
+    return [dict(row._mapping) for row in await db.execute(query)]
+
+
+usage_rollups = RollupBuffer(config.ROLLUP_FLUSH_INTERVAL, config.ROLLUP_SESSION_RETENTION_DAYS)
+
+
+async def rebuild(days: int, batch_size: int = 5000):
+    """Recompute rollups for the last `days` days (whole UTC days) from the raw usage events."""
+    since = bucket_start(utcnow() - timedelta(days=days), "day")
+    buffer = RollupBuffer(0, config.ROLLUP_SESSION_RETENTION_DAYS)
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(rollups_table).where(rollups_table.c.bucket_start >= since))
+        await db.execute(delete(sessions_table).where(sessions_table.c.bucket_start >= since))
+        await db.commit()
+
+        # Month by month, only the partitions overlapping the window
+        columns = ["device_id", "content_id", "action", "duration", "session_id", "timestamp"]
+        for table in await usage_partitions.tables_for(db, since):
+            result = await db.stream(select(*[table.c[name] for name in columns]).where(table.c.timestamp >= since))
+            # Only buckets and session ids are held in memory, not the events
+            async for rows in result.mappings().partitions(batch_size):
+                buffer.record(rows)
+    await buffer.flush()
+    if buffer.flush_errors:
+        raise RuntimeError("Rollup rebuild could not write its buckets")
+    print(f"Rebuilt rollups since {since.isoformat()} from {buffer.recorded} events")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Usage rollup maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="recompute rollups from the raw usage events")
+    parser.add_argument("--days", type=int, default=2, help="how many days back to rebuild")
+    args = parser.parse_args()
+    if args.rebuild:
+        asyncio.run(rebuild(args.days))
+    else:
+        parser.print_help()
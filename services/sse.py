@@ -0,0 +1,134 @@
+"""
+Server-Sent Events stream for dashboards behind WebSocket-hostile proxies
+
+`GET /api/v2/events` carries the same device_status, battery and
+command_status events as `/ws/mobile`, as plain HTTP. Each event is
+serialized once, when the broadcaster delivers it to this worker, and goes
+into a ring buffer of the last SSE_BUFFER_SIZE events. A connection does not
+get its own queue. It keeps a cursor into the ring, sleeps until something
+is appended, then writes everything after its cursor. A slow client can't
+grow memory. If it falls more than a ring's worth behind, it gets a `reset`
+event and continues from the newest event.
+
+Event ids are `<stream>-<seq>`, where `<stream>` is random per worker
+process. A browser reconnecting with Last-Event-ID gets the missed events
+from the ring without a database query. When the id comes from another
+worker or a previous process, or is already out of the ring, the client
+gets `reset` and should refetch over REST. Between events the stream sends
+an `event: stats` snapshot every SSE_PING_INTERVAL seconds. That keeps
+proxies from closing an idle connection and saves dashboards polling
+/stats.
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Tuple
+
+import pydantic_core
+
+import config
+from services.stats import system_stats
+
+# Browsers reconnect after this many ms when the stream drops
+RETRY_MS = 3000
+
+
+def _frame(event_id: Optional[str], name: str, data) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {name}\ndata: {pydantic_core.to_json(data).decode()}\n\n"
+
+
+class EventStream:
+    def __init__(self, buffer_size: int, ping_interval: float):
+        self.ping_interval = ping_interval
+        self.stream_id = uuid.uuid4().hex[:8]
+        self._buffer: Deque[Tuple[int, Optional[str], str]] = deque(maxlen=buffer_size)  # (seq, user_id, frame)
+        self._seq = 0
+        self._appended = asyncio.Event()
+
+        # Metrics
+        self.connections = 0
+        self.resumed = 0
+        self.resets = 0
+        self.sent = 0
+
+    def append(self, events: Iterable[dict]):
+        """Add events delivered to this worker and wake every open stream."""
+        for event in events:
+            self._seq += 1
+            frame = _frame(f"{self.stream_id}-{self._seq}", event["type"], event)
+            self._buffer.append((self._seq, event.get("user_id"), frame))
+        # Streams asleep on the old event wake; the next wait uses a fresh one
+        appended, self._appended = self._appended, asyncio.Event()
+        appended.set()
+
+    def _first_seq(self) -> int:
+        return self._buffer[0][0] if self._buffer else self._seq + 1
+
+    def _resume_from(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Cursor for a reconnect, or None when its events can't be replayed."""
+        stream_id, _, seq = (last_event_id or "").partition("-")
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq or seq < self._first_seq() - 1:
+            return None
+        return seq
+
+    def _after(self, cursor: int) -> List[Tuple[int, Optional[str], str]]:
+        return list(islice(self._buffer, max(0, cursor - self._first_seq() + 1), None))
+
+    def _reset(self) -> str:
+        self.resets += 1
+        return _frame(f"{self.stream_id}-{self._seq}", "reset", {"reason": "missed events; refetch over REST"})
+
+    async def stream(self, user_id: Optional[str], last_event_id: Optional[str]) -> AsyncIterator[str]:
+        """Frames for one connection; events for `user_id` only, or all events when it's None."""
+        self.connections += 1
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            cursor = self._resume_from(last_event_id) if last_event_id else self._seq
+            if cursor is None:
+                cursor = self._seq
+                yield self._reset()
+            elif last_event_id:
+                self.resumed += 1
+
+            while True:
+                # Taken before writing, so events appended while we write aren't slept through
+                appended = self._appended
+                if cursor < self._first_seq() - 1:
+                    # Fell a whole ring behind
+                    cursor = self._seq
+                    yield self._reset()
+                frames = []
+                for seq, event_user_id, frame in self._after(cursor):
+                    if user_id is None or event_user_id == user_id:
+                        frames.append(frame)
+                    cursor = seq
+                if frames:
+                    self.sent += len(frames)
+                    yield "".join(frames)
+
+                try:
+                    await asyncio.wait_for(appended.wait(), self.ping_interval)
+                except asyncio.TimeoutError:
+                    yield _frame(None, "stats", system_stats.snapshot())
+        finally:
+            self.connections -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "connections": self.connections,
+            "buffered": len(self._buffer),
+            "last_seq": self._seq,
+            "resumed": self.resumed,
+            "resets": self.resets,
+            "sent": self.sent,
+        }
+
+
+event_stream = EventStream(config.SSE_BUFFER_SIZE, config.SSE_PING_INTERVAL)
@@ -0,0 +1,125 @@
+"""
+System statistics counters
+
+`/stats` used to run four COUNT(*) queries per call. The counts are now kept
+in memory. The write paths (register, heartbeat, offline sweep, WiFi
+provisioning, content add/delete) adjust them after they commit, and a
+background task reconciles them against the database every
+STATS_RECONCILE_INTERVAL seconds. Reading them costs nothing.
+
+Counters are per process. With several workers, a change made on another
+worker shows up here at the next reconcile.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Integer, cast, func, select
+
+import config
+from db import AsyncSessionLocal
+from models.v2 import Content, Device
+
+COUNTERS = ("devices", "online", "provisioned", "content")
+
+
+def count_statements():
+    """The reconcile queries: one pass over devices, one over content."""
+    devices = select(
+        func.count(),
+        func.coalesce(func.sum(cast(Device.is_online, Integer)), 0),
+        func.coalesce(func.sum(cast(Device.wifi_provisioned, Integer)), 0),
+    ).select_from(Device)
+    content = select(func.count()).select_from(Content)
+    return devices, content
+
+
+class SystemStats:
+    def __init__(self, reconcile_interval: float, session_factory=AsyncSessionLocal):
+        self.reconcile_interval = reconcile_interval
+        self._session_factory = session_factory
+        self._counts = dict.fromkeys(COUNTERS, 0)
+        # Changes made while a reconcile query is in flight, re-applied on top of its result
+        self._in_flight: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self.computed_at: Optional[datetime] = None
+        self.reconciles = 0
+        self.last_drift = dict.fromkeys(COUNTERS, 0)
+
+    def adjust(self, devices: int = 0, online: int = 0, provisioned: int = 0, content: int = 0):
+        """Apply a committed change, e.g. adjust(devices=1, online=1) for a new device."""
+        for name, delta in (("devices", devices), ("online", online), ("provisioned", provisioned), ("content", content)):
+            if delta:
+                self._counts[name] += delta
+                if self._in_flight is not None:
+                    self._in_flight[name] += delta
+
+    async def reconcile(self):
+        """Replace the counters with fresh counts from the database."""
+        devices_query, content_query = count_statements()
+        self._in_flight = dict.fromkeys(COUNTERS, 0)
+        try:
+            async with self._session_factory() as db:
+                devices, online, provisioned = (await db.execute(devices_query)).one()
+                content = await db.scalar(content_query)
+        except Exception:
+            self._in_flight = None
+            raise
+        fresh = {"devices": devices, "online": int(online), "provisioned": int(provisioned), "content": content}
+        for name in COUNTERS:
+            fresh[name] += self._in_flight[name]
+            self.last_drift[name] = self._counts[name] - fresh[name]
+        self._counts = fresh
+        self._in_flight = None
+        self.computed_at = datetime.now(timezone.utc)
+        self.reconciles += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"Stats reconcile failed: {e}")
+
+    async def start(self):
+        await self.reconcile()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        counts = self._counts
+        return {
+            "devices": {
+                "total": counts["devices"],
+                "online": counts["online"],
+                "offline": counts["devices"] - counts["online"],
+                "provisioned": counts["provisioned"],
+                "unprovisioned": counts["devices"] - counts["provisioned"],
+            },
+            "content": {
+                "total": counts["content"],
+            },
+            "computed_at": self.computed_at,
+        }
+
+    def metrics(self) -> dict:
+        return {
+            "reconcile_interval_seconds": self.reconcile_interval,
+            "reconciles": self.reconciles,
+            "computed_at": self.computed_at,
+            "last_drift": dict(self.last_drift),
+        }
+
+
+system_stats = SystemStats(config.STATS_RECONCILE_INTERVAL)
@@ -0,0 +1,35 @@
+"""Shared fixtures: the app, with its lifespan running, against a throwaway SQLite file."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Before any app module reads the environment
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp(prefix='zuri-test-')) / 'test.db'}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+# Tests call device endpoints back to back; per-device rate limiting is not what they check
+os.environ["ADMISSION_DEVICE_RATE"] = "0"
+# App modules resolve templates relative to the repo root
+os.chdir(ROOT)
+sys.path.insert(0, str(ROOT))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(client):
+    """Call an async function on the app's event loop, where the async engine lives."""
+    return client.portal.call
@@ -0,0 +1,77 @@
+import random
+
+import routers.v2
+from services.admission import AdmissionController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(clock, device_rate=0.0, device_burst=1, global_rate=0.0, global_burst=1, jitter=0.0):
+    return AdmissionController(device_rate, device_burst, global_rate, global_burst, max_retry_after=120, jitter=jitter, clock=clock, rng=random.Random(7))
+
+
+def test_device_bucket_allows_the_burst_then_refills():
+    clock = Clock()
+    gate = controller(clock, device_rate=0.5, device_burst=2)
+    assert gate.check("ZR-1") is None and gate.check("ZR-1") is None
+    retry_after, _ = gate.check("ZR-1")
+    assert retry_after == 2.0
+    # Other devices have their own bucket
+    assert gate.check("ZR-2") is None
+    clock.now += 2
+    assert gate.check("ZR-1") is None
+    assert (gate.admitted, gate.rejected_device) == (4, 1)
+
+
+def test_global_rejections_get_consecutive_retry_slots():
+    clock = Clock()
+    gate = controller(clock, global_rate=10, global_burst=1)
+    assert gate.check("ZR-0") is None
+    hints = [gate.check(f"ZR-{i}")[0] for i in range(1, 6)]
+    # A herd is told to come back one slot apart at the global rate, not all at once
+    assert [round(hint, 3) for hint in hints] == [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert gate.rejected_global == 5
+
+
+def test_global_rejection_refunds_the_device_token():
+    clock = Clock()
+    gate = controller(clock, device_rate=1, device_burst=1, global_rate=1, global_burst=1)
+    assert gate.check("ZR-A") is None
+    assert gate.check("ZR-B") is not None  # global bucket empty
+    clock.now += 1
+    # ZR-B's own token was not spent by the rejected request
+    assert gate.check("ZR-B") is None
+
+
+def test_retry_after_is_capped_and_jittered():
+    clock = Clock()
+    gate = controller(clock, device_rate=0.001, device_burst=1, jitter=0.1)
+    gate.check("ZR-1")
+    retry_after, jitter = gate.check("ZR-1")
+    assert 1000 <= retry_after <= 1000 + jitter
+    gate = controller(clock, global_rate=0.001, global_burst=1)
+    gate.check("ZR-1")
+    assert gate.check("ZR-2")[0] == 120
+
+
+def test_zero_rates_disable_admission():
+    gate = controller(Clock())
+    assert not gate.enabled
+    assert all(gate.check("ZR-1") is None for _ in range(100))
+
+
+def test_rejected_heartbeat_gets_429_with_retry_after(client, monkeypatch):
+    client.post("/api/v2/devices/register", json={"device_id": "ZR-ADMISSION", "device_name": "Test", "ip_address": "10.0.0.1"})
+    monkeypatch.setattr(routers.v2, "admission", controller(Clock(), device_rate=0.5, device_burst=1))
+    beat = {"battery_level": 80}
+    assert client.post("/api/v2/devices/ZR-ADMISSION/heartbeat", json=beat).status_code == 200
+    response = client.post("/api/v2/devices/ZR-ADMISSION/heartbeat", json=beat)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+    assert response.json()["detail"]["retry_after"] == 2.0
@@ -0,0 +1,96 @@
+import asyncio
+import tempfile
+from pathlib import Path
+
+from services.backplane import UnixSocketBackplane
+
+
+def socket_path() -> str:
+    # Unix socket paths are capped around 100 bytes, so keep it short
+    return str(Path(tempfile.mkdtemp(prefix="bp")) / "bp.sock")
+
+
+async def wait_until(condition, timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def collector():
+    received = []
+
+    async def handler(channel, message):
+        received.append((channel, message))
+    return received, handler
+
+
+def test_publish_reaches_the_worker_holding_the_channel():
+    async def scenario():
+        path = socket_path()
+        a, b = UnixSocketBackplane(path), UnixSocketBackplane(path)
+        await a.start()
+        await b.start()
+        received, handler = collector()
+        await a.subscribe("device:ZR-1", handler)
+        await asyncio.sleep(0.1)  # subscriptions travel on other connections than the publish
+        await b.publish("device:ZR-1", {"command": "play"})
+        await wait_until(lambda: received)
+        assert received == [("device:ZR-1", {"command": "play"})]
+        assert a.metrics()["hosting_broker"] and not b.metrics()["hosting_broker"]
+        await b.stop()
+        await a.stop()
+    asyncio.run(scenario())
+
+
+def test_broadcast_reaches_every_worker_once():
+    async def scenario():
+        path = socket_path()
+        a, b = UnixSocketBackplane(path), UnixSocketBackplane(path)
+        await a.start()
+        await b.start()
+        got_a, handler_a = collector()
+        got_b, handler_b = collector()
+        await a.subscribe("stats", handler_a)
+        await b.subscribe("stats", handler_b)
+        await asyncio.sleep(0.1)  # subscriptions travel on other connections than the publish
+        await a.broadcast("stats", {"online": 1})
+        await wait_until(lambda: got_b)
+        await asyncio.sleep(0.1)
+        assert got_a == got_b == [("stats", {"online": 1})]
+        await b.stop()
+        await a.stop()
+    asyncio.run(scenario())
+
+
+def test_broker_fails_over_when_its_host_stops():
+    async def scenario():
+        path = socket_path()
+        a, b, c = UnixSocketBackplane(path), UnixSocketBackplane(path), UnixSocketBackplane(path)
+        await a.start()
+        await b.start()
+        await c.start()
+        received, handler = collector()
+        await b.subscribe("device:ZR-2", handler)
+
+        await a.stop()
+        # One of the survivors takes the lock, and both reconnect and resubscribe
+        await wait_until(lambda: b.metrics()["hosting_broker"] or c.metrics()["hosting_broker"])
+        await wait_until(lambda: b.metrics()["connected"] and c.metrics()["connected"] and b.reconnects and c.reconnects)
+        await asyncio.sleep(0.1)
+        await c.publish("device:ZR-2", {"command": "stop"})
+        await wait_until(lambda: received)
+        assert received == [("device:ZR-2", {"command": "stop"})]
+        await c.stop()
+        await b.stop()
+    asyncio.run(scenario())
+
+
+def test_publish_without_a_broker_is_dropped():
+    async def scenario():
+        worker = UnixSocketBackplane(socket_path(), host_broker=False)
+        worker._task = asyncio.create_task(asyncio.sleep(3600))  # no connect loop
+        await worker.publish("device:ZR-3", {"command": "play"})
+        assert worker.dropped == 1
+        await worker.stop()
+    asyncio.run(scenario())
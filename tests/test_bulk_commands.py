@@ -0,0 +1,60 @@
+import config
+
+USER_ID = "user-bulk"
+DEVICES = ["ZR-BULK-1", "ZR-BULK-2", "ZR-BULK-3"]
+
+
+def register(client, device_id, user_id=USER_ID):
+    assert client.post("/api/v2/devices/register", json={"device_id": device_id, "device_name": "Test", "ip_address": "10.0.0.1"}).status_code == 200
+    assert client.post(f"/api/v2/devices/{device_id}/pair", json={"user_id": user_id}).status_code == 200
+
+
+def test_bulk_job_reports_progress_as_devices_answer(client):
+    for device_id in DEVICES:
+        register(client, device_id)
+    queued = client.post("/api/v2/commands/bulk", json={"command": "sync_content", "user_id": USER_ID}).json()
+    assert (queued["status"], queued["total"], queued["pushed"]) == ("queued", 3, 0)
+
+    job = client.get(f"/api/v2/commands/jobs/{queued['job_id']}").json()
+    assert job["counts"]["pending"] == 3 and job["done"] == 0
+    assert job["target"] == {"user_id": USER_ID}
+
+    # One device picks its command up with a heartbeat and reports back with the next one
+    [command] = client.post(f"/api/v2/devices/{DEVICES[0]}/heartbeat", json={"battery_level": 90}).json()["commands"]
+    assert command["command"] == "sync_content"
+    client.post(f"/api/v2/devices/{DEVICES[0]}/heartbeat", json={"battery_level": 90, "command_results": [{"command_id": command["id"]}]})
+
+    job = client.get(f"/api/v2/commands/jobs/{queued['job_id']}").json()
+    assert (job["counts"]["completed"], job["counts"]["pending"], job["done"]) == (1, 2, 1)
+    assert job["progress"] == round(1 / 3, 4)
+
+
+def test_device_ids_are_combined_with_filters_and_unknown_ids_reported(client):
+    register(client, "ZR-BULK-OTHER", user_id="someone-else")
+    queued = client.post("/api/v2/commands/bulk", json={
+        "command": "stop", "device_ids": [DEVICES[0], "ZR-BULK-OTHER", "ZR-BULK-MISSING"], "user_id": USER_ID,
+    }).json()
+    assert queued["total"] == 1
+    assert queued["unknown_device_ids"] == ["ZR-BULK-MISSING", "ZR-BULK-OTHER"]
+
+
+def test_bulk_needs_a_target(client):
+    assert client.post("/api/v2/commands/bulk", json={"command": "stop"}).status_code == 400
+
+
+def test_bulk_rejects_targets_over_the_cap(client, monkeypatch):
+    monkeypatch.setattr(config, "COMMAND_BULK_MAX_DEVICES", 2)
+    response = client.post("/api/v2/commands/bulk", json={"command": "stop", "user_id": USER_ID})
+    assert response.status_code == 400
+
+
+def test_devices_with_a_socket_get_the_command_pushed(client):
+    register(client, "ZR-BULK-SOCKET", user_id="user-bulk-socket")
+    with client.websocket_connect("/api/v2/ws/device/ZR-BULK-SOCKET") as socket:
+        queued = client.post("/api/v2/commands/bulk", json={"command": "led", "params": {"color": "blue"}, "user_id": "user-bulk-socket"}).json()
+        assert queued["pushed"] == 1
+        message = socket.receive_json()
+    assert (message["command"], message["params"]) == ("led", {"color": "blue"})
+
+    job = client.get(f"/api/v2/commands/jobs/{queued['job_id']}").json()
+    assert job["counts"]["sent"] == 1
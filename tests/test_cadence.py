@@ -0,0 +1,67 @@
+import random
+
+from services.cadence import JITTER, HeartbeatCadence
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def cadence(clock=None, target_rate=0, device_rate=0, presence_timeout=90):
+    return HeartbeatCadence(
+        interval=30, min_interval=5, max_interval=60, socket_interval=60,
+        target_rate=target_rate, presence_timeout=presence_timeout, device_rate=device_rate,
+        clock=clock or Clock(), rng=random.Random(3),
+    )
+
+
+def within_jitter(value, expected):
+    return expected * (1 - JITTER) - 0.05 <= value <= expected * (1 + JITTER) + 0.05
+
+
+def test_interval_by_device_state():
+    heartbeats = cadence()
+    assert within_jitter(heartbeats.next_interval(commands_in_flight=True, has_socket=False), 5)
+    assert within_jitter(heartbeats.next_interval(commands_in_flight=False, has_socket=False), 30)
+    # Socket interval is capped below 60 so the jittered value stays under the cap
+    assert heartbeats.next_interval(commands_in_flight=False, has_socket=True) <= 60
+    assert dict(heartbeats.reasons) == {"commands": 1, "idle": 1, "socket": 1}
+
+
+def test_intervals_stay_under_two_thirds_of_the_presence_timeout():
+    heartbeats = cadence(presence_timeout=30)
+    assert heartbeats.max_interval == 20
+    assert all(heartbeats.next_interval(False, True) <= 20 for _ in range(200))
+
+
+def test_min_interval_is_raised_above_the_admission_rate():
+    heartbeats = cadence(device_rate=0.2)
+    # 1 / 0.2 = 5s; even jittered down it must stay 10% above that
+    assert heartbeats.min_interval == 6.2
+    assert all(heartbeats.next_interval(True, False) >= 5.5 for _ in range(200))
+
+
+def test_overload_stretches_idle_devices_but_not_the_command_path():
+    clock = Clock()
+    heartbeats = cadence(clock, target_rate=10)
+    # 40 heartbeats in one second is four times the target
+    for _ in range(40):
+        heartbeats.next_interval(False, False)
+    clock.now = 1.0
+    heartbeats.next_interval(False, False)
+    assert heartbeats.load_factor() == 4.1
+
+    assert heartbeats.next_interval(False, False) <= 60
+    assert heartbeats.next_interval(False, False) >= 60 / (1 + JITTER) * (1 - JITTER) - 0.05
+    assert within_jitter(heartbeats.next_interval(True, False), 5)
+    assert heartbeats.reasons["load"] >= 2
+
+
+def test_heartbeat_response_carries_next_heartbeat_in(client):
+    client.post("/api/v2/devices/register", json={"device_id": "ZR-CADENCE", "device_name": "Test", "ip_address": "10.0.0.1"})
+    body = client.post("/api/v2/devices/ZR-CADENCE/heartbeat", json={"battery_level": 90}).json()
+    assert 0 < body["next_heartbeat_in"] <= 60
@@ -0,0 +1,85 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import insert, select, update
+
+import config
+from db import AsyncSessionLocal
+from services.dispatcher import claim_command, commands_table, dispatcher, new_command_fields, utcnow
+
+DEVICE_ID = "ZR-COMMANDS"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def device(client):
+    response = client.post("/api/v2/devices/register", json={"device_id": DEVICE_ID, "device_name": "Test", "ip_address": "10.0.0.1"})
+    assert response.status_code == 200
+
+
+def add_command(run, **fields) -> str:
+    command_id = str(uuid.uuid4())
+
+    async def add():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(commands_table).values(id=command_id, device_id=DEVICE_ID, command="stop", **fields))
+            await db.commit()
+    run(add)
+    return command_id
+
+
+def command_row(run, command_id: str):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(commands_table).where(commands_table.c.id == command_id))).one()
+    return run(load)
+
+
+def test_claim_only_once(run):
+    command_id = add_command(run, **new_command_fields())
+
+    async def claim():
+        async with AsyncSessionLocal() as db:
+            claimed = await claim_command(db, command_id)
+            await db.commit()
+            return claimed
+    assert run(claim) is True
+    assert run(claim) is False
+    row = command_row(run, command_id)
+    assert (row.status, row.attempts) == ("sent", 1)
+    assert row.next_attempt_at > utcnow()
+
+
+@pytest.mark.parametrize("status", ["pending", "sent"])
+def test_expires_at_ends_an_unacked_command(run, status):
+    fields = {**new_command_fields(), "status": status, "expires_at": utcnow() - timedelta(seconds=1)}
+    command_id = add_command(run, **fields)
+    run(dispatcher.run_once)
+    row = command_row(run, command_id)
+    assert row.status == "expired"
+
+
+def test_command_without_expires_at_expires_after_ttl(run):
+    old = utcnow() - timedelta(seconds=config.COMMAND_TTL + 60)
+    command_id = add_command(run, status="sent", attempts=1, created_at=old)
+    run(dispatcher.run_once)
+    assert command_row(run, command_id).status == "expired"
+
+
+def test_v1_command_gets_a_ttl(client, run):
+    response = client.post(f"/api/v1/devices/{DEVICE_ID}/command", json={"command": "stop", "params": {}})
+    assert response.status_code == 200
+    row = command_row(run, response.json()["command_id"])
+    assert row.status == "pending"
+    assert row.expires_at == row.created_at + timedelta(seconds=config.COMMAND_TTL)
+
+
+def test_idle_pass_skips_the_writes(run):
+    async def settle():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(commands_table).where(commands_table.c.status.in_(("pending", "sent"))).values(status="completed"))
+            await db.commit()
+    run(settle)
+    idle_runs = dispatcher.idle_runs
+    assert run(dispatcher.run_once) == 0
+    assert dispatcher.idle_runs == idle_runs + 1
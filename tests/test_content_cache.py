@@ -0,0 +1,85 @@
+from db import AsyncSessionLocal
+from routers.v2 import content_payload
+from services.backplane import backplane
+from services.content_cache import CHANNEL, ContentCache, content_cache
+
+
+def add(client, content_id):
+    response = client.post("/api/v2/content/library", json={
+        "content_id": content_id, "title": f"Title {content_id}", "type": "story", "duration": 60,
+        "file_url": f"https://example.com/{content_id}.mp3",
+    })
+    assert response.status_code == 200
+
+
+def lookup(run, cache, content_ids, payload=content_payload):
+    async def go():
+        async with AsyncSessionLocal() as db:
+            return await cache.get_many(db, content_ids, payload)
+    return run(go)
+
+
+def test_second_lookup_is_served_from_memory(client):
+    add(client, "cache_a")
+    before = content_cache.metrics()
+    first = client.get("/api/v2/content/library/cache_a")
+    second = client.get("/api/v2/content/library/cache_a")
+    assert first.status_code == 200 and first.json()["content_id"] == "cache_a"
+    assert second.json() == first.json()
+    after = content_cache.metrics()
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+
+
+def test_ids_keep_request_order_and_leave_out_unknown(client):
+    add(client, "cache_b")
+    add(client, "cache_c")
+    response = client.get("/api/v2/content/library", params={"ids": "cache_c,cache_missing,cache_b,cache_c"})
+    assert [item["content_id"] for item in response.json()] == ["cache_c", "cache_b"]
+
+
+def test_unknown_ids_are_not_cached(client):
+    assert client.get("/api/v2/content/library/cache_later").status_code == 404
+    add(client, "cache_later")
+    assert client.get("/api/v2/content/library/cache_later").status_code == 200
+
+
+def test_delete_drops_the_cached_item(client):
+    add(client, "cache_d")
+    assert client.get("/api/v2/content/library/cache_d").status_code == 200
+    assert client.delete("/api/v2/content/library/cache_d").status_code == 200
+    assert client.get("/api/v2/content/library/cache_d").status_code == 404
+
+
+def test_backplane_message_drops_the_item_on_this_worker(client, run):
+    add(client, "cache_e")
+    client.get("/api/v2/content/library/cache_e")
+    invalidated = content_cache.metrics()["invalidated"]
+    # What another worker's content write sends
+    run(backplane.broadcast, CHANNEL, {"content_ids": ["cache_e"]})
+    assert content_cache.metrics()["invalidated"] == invalidated + 1
+
+
+def test_load_that_raced_a_write_is_not_kept(client, run):
+    add(client, "cache_f")
+    cache = ContentCache(max_entries=10)
+
+    def payload(item):
+        # A write lands while the rows are being read
+        cache.drop([item.content_id])
+        return content_payload(item)
+
+    assert "cache_f" in lookup(run, cache, ["cache_f"], payload)
+    assert cache.metrics()["entries"] == 0
+    lookup(run, cache, ["cache_f"])
+    assert cache.metrics()["entries"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(client, run):
+    for content_id in ("cache_g", "cache_h", "cache_i"):
+        add(client, content_id)
+    cache = ContentCache(max_entries=2)
+    lookup(run, cache, ["cache_g", "cache_h"])
+    lookup(run, cache, ["cache_g"])
+    lookup(run, cache, ["cache_i"])
+    assert list(cache._entries) == ["cache_g", "cache_i"]
+    assert cache.metrics() == {"entries": 2, "hits": 1, "misses": 3, "hit_rate": 0.25, "invalidated": 0}
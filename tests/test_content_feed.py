@@ -0,0 +1,56 @@
+def add(client, content_id):
+    response = client.post("/api/v2/content/library", json={
+        "content_id": content_id, "title": f"Title {content_id}", "type": "story", "duration": 60,
+        "file_url": f"https://example.com/{content_id}.mp3",
+    })
+    assert response.status_code == 200
+
+
+def changes(client, since, **params):
+    return client.get("/api/v2/content/changes", params={"since": since, **params}).json()
+
+
+def head(client) -> int:
+    cursor = 0
+    while True:
+        page = changes(client, cursor, limit=100)
+        cursor = page["next_since"]
+        if not page["has_more"]:
+            return cursor
+
+
+def test_changes_after_a_cursor_oldest_first(client):
+    cursor = head(client)
+    add(client, "feed_a")
+    add(client, "feed_b")
+    page = changes(client, cursor)
+    assert [(change["op"], change["content"]["content_id"]) for change in page["changes"]] == [("upsert", "feed_a"), ("upsert", "feed_b")]
+    assert page["next_since"] == page["changes"][-1]["seq"] and not page["has_more"]
+    assert changes(client, page["next_since"])["changes"] == []
+
+
+def test_delete_moves_the_item_to_a_tombstone_at_its_latest_change(client):
+    cursor = head(client)
+    add(client, "feed_c")
+    add(client, "feed_d")
+    assert client.delete("/api/v2/content/library/feed_c").status_code == 200
+    page = changes(client, cursor)
+    # Each item appears once, at its latest change
+    assert [(change["op"], change.get("content_id") or change["content"]["content_id"]) for change in page["changes"]] == [
+        ("upsert", "feed_d"), ("delete", "feed_c"),
+    ]
+
+
+def test_paging_with_limit(client):
+    cursor = head(client)
+    add(client, "feed_e")
+    add(client, "feed_f")
+    first = changes(client, cursor, limit=1)
+    assert len(first["changes"]) == 1 and first["has_more"]
+    second = changes(client, first["next_since"], limit=1)
+    assert second["changes"][0]["content"]["content_id"] == "feed_f" and not second["has_more"]
+
+
+def test_cursor_ahead_of_the_server_is_reset(client):
+    page = changes(client, head(client) + 1000)
+    assert page["reset"] is True and page["next_since"] == 0
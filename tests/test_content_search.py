@@ -0,0 +1,74 @@
+from db import SessionLocal
+from services.content_search import create_sync, unindex_content_sync
+
+
+def add(client, content_id, title, tags=(), description=None, version="v2", **fields):
+    response = client.post(f"/api/{version}/content/library", json={
+        "content_id": content_id, "title": title, "type": "story", "duration": 60,
+        "file_url": f"https://example.com/{content_id}.mp3", "tags": list(tags), "description": description,
+        **fields,
+    })
+    assert response.status_code == 200
+
+
+def search(client, q, **params):
+    response = client.get("/api/v2/content/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [item["content_id"] for item in response.json()]
+
+
+def test_every_word_must_match_the_start_of_a_word(client):
+    add(client, "search_a", "Quokka Lullaby")
+    add(client, "search_b", "Quokka Parade")
+    assert search(client, "quok lull") == ["search_a"]
+    assert search(client, "QUOKKA") == ["search_a", "search_b"]
+    # Inside a word is not the start of one
+    assert search(client, "okka") == []
+
+
+def test_title_ranks_above_tags_above_description(client):
+    add(client, "search_c", "Bedtime", description="A tale about a narwhal")
+    add(client, "search_d", "Narwhal Friends")
+    add(client, "search_e", "Ocean Song", tags=["narwhal"])
+    assert search(client, "narwhal") == ["search_d", "search_e", "search_c"]
+
+
+def test_diacritics_and_punctuation_are_ignored(client):
+    add(client, "search_f", "L'élève Capybara")
+    assert search(client, "eleve") == ["search_f"]
+    assert search(client, "capybara!") == ["search_f"]
+    # Nothing left to search for
+    assert search(client, "?!") == []
+
+
+def test_library_filters_and_limit(client):
+    add(client, "search_g", "Axolotl Morning", is_premium=True)
+    add(client, "search_h", "Axolotl Evening")
+    add(client, "search_i", "Axolotl Night")
+    assert search(client, "axolotl", premium_only=True) == ["search_g"]
+    assert len(search(client, "axolotl", limit=2)) == 2
+
+
+def test_deleted_content_is_no_longer_found(client):
+    add(client, "search_j", "Pangolin Picnic")
+    assert client.delete("/api/v2/content/library/search_j").status_code == 200
+    assert search(client, "pangolin") == []
+
+
+def test_v1_writes_keep_the_index_in_step(client):
+    add(client, "search_k", "Wombat Waltz", version="v1")
+    assert search(client, "wombat") == ["search_k"]
+    assert client.delete("/api/v1/content/library/search_k").status_code == 200
+    assert search(client, "wombat") == []
+
+
+def test_backfill_indexes_content_missing_from_the_table(client):
+    add(client, "search_l", "Tapir Tales")
+    with SessionLocal() as db:
+        unindex_content_sync(db, "search_l")
+        db.commit()
+    assert search(client, "tapir") == []
+    with SessionLocal() as db:
+        assert create_sync(db) == 1
+        db.commit()
+    assert search(client, "tapir") == ["search_l"]
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from db import AsyncSessionLocal
+from models.v2 import Device
+from services.heartbeats import HeartbeatBuffer
+
+DEVICE_ID = "ZR-HEARTBEATS"
+
+
+def register(client):
+    response = client.post("/api/v2/devices/register", json={"device_id": DEVICE_ID, "device_name": "Test", "ip_address": "10.0.0.1"})
+    assert response.status_code == 200
+
+
+def device_row(run):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(Device).where(Device.device_id == DEVICE_ID))
+    return run(load)
+
+
+def test_beats_in_one_window_become_one_write(client, run):
+    register(client)
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000)
+    seen_at = datetime(2025, 7, 21, 12, 0)
+    buffer.record(DEVICE_ID, 90, seen_at, wifi_ssid="Home")
+    buffer.record(DEVICE_ID, 80, seen_at + timedelta(seconds=5))
+    assert buffer.metrics()["pending"] == 1
+    assert buffer.coalesced == 1
+
+    run(buffer.flush)
+    device = device_row(run)
+    # Newest battery and last_seen win; the SSID from the earlier beat is kept
+    assert (device.battery_level, device.last_seen, device.wifi_ssid) == (80, seen_at + timedelta(seconds=5), "Home")
+    assert (buffer.flushes, buffer.rows_flushed) == (1, 1)
+
+
+def test_aware_seen_at_is_stored_as_naive_utc(client, run):
+    register(client)
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000)
+    buffer.record(DEVICE_ID, 70, datetime(2025, 7, 21, 14, 0, tzinfo=timezone(timedelta(hours=2))))
+    run(buffer.flush)
+    assert device_row(run).last_seen == datetime(2025, 7, 21, 12, 0)
+
+
+def test_flush_marks_an_offline_device_online(client, run):
+    register(client)
+
+    async def go_offline():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Device).where(Device.device_id == DEVICE_ID).values(is_online=False))
+            await db.commit()
+    run(go_offline)
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000)
+    buffer.record(DEVICE_ID, 60, datetime(2025, 7, 21, 12, 0))
+    run(buffer.flush)
+    assert device_row(run).is_online is True
+
+
+def test_full_buffer_asks_for_an_early_flush():
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=2)
+    buffer.record("ZR-A", 50, datetime(2025, 7, 21, 12, 0))
+    assert not buffer._flush_now.is_set()
+    buffer.record("ZR-B", 50, datetime(2025, 7, 21, 12, 0))
+    assert buffer._flush_now.is_set()
+
+
+def test_failed_flush_keeps_the_batch(run):
+    def broken_session():
+        raise RuntimeError("database is down")
+
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000, session_factory=broken_session)
+    buffer.record(DEVICE_ID, 40, datetime(2025, 7, 21, 12, 0))
+    run(buffer.flush)
+    assert buffer.flush_errors == 1
+    assert buffer.metrics()["pending"] == 1
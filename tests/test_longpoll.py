@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from services.longpoll import CommandWaiters, command_waiters
+
+DEVICE_ID = "ZR-LONGPOLL"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def device(client):
+    response = client.post("/api/v2/devices/register", json={"device_id": DEVICE_ID, "device_name": "Test", "ip_address": "10.0.0.1"})
+    assert response.status_code == 200
+
+
+def test_wake_releases_every_parked_request_for_the_device(run):
+    waiters = CommandWaiters(max_waiters=10)
+
+    async def scenario():
+        async with waiters.watch("ZR-A") as first, waiters.watch("ZR-A") as second, waiters.watch("ZR-B") as other:
+            assert waiters.metrics()["devices"] == 2
+            waiters.wake(["ZR-A"])
+            # A wake-up that came before the wait still counts
+            assert await first.wait(1) and await second.wait(1)
+            assert not await other.wait(0.01)
+        return waiters.metrics()
+    metrics = run(scenario)
+    assert (metrics["waiting"], metrics["devices"], metrics["woken"]) == (0, 0, 2)
+
+
+def test_poll_without_wait_returns_straight_away(client):
+    assert client.get(f"/api/v2/devices/{DEVICE_ID}/commands").json() == {"commands": []}
+
+
+def test_parked_poll_returns_when_a_command_is_queued(client):
+    result = {}
+
+    def poll():
+        started = time.monotonic()
+        result["body"] = client.get(f"/api/v2/devices/{DEVICE_ID}/commands", params={"wait": 10}).json()
+        result["elapsed"] = time.monotonic() - started
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    deadline = time.monotonic() + 5
+    while command_waiters.waiting == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queued = client.post(f"/api/v2/devices/{DEVICE_ID}/command", json={"command": "play", "params": {"content_id": "story_001"}}).json()
+    poller.join(10)
+
+    assert [command["id"] for command in result["body"]["commands"]] == [queued["command_id"]]
+    assert result["elapsed"] < 5
+    # Claimed by the poll, so the next heartbeat does not send it again
+    assert client.post(f"/api/v2/devices/{DEVICE_ID}/heartbeat", json={"battery_level": 90}).json()["commands"] == []
+
+
+def test_poll_times_out_empty(client):
+    started = time.monotonic()
+    assert client.get(f"/api/v2/devices/{DEVICE_ID}/commands", params={"wait": 0.2}).json() == {"commands": []}
+    assert time.monotonic() - started >= 0.2
+
+
+def test_poll_is_refused_when_too_many_are_parked(client, monkeypatch):
+    monkeypatch.setattr(command_waiters, "max_waiters", 0)
+    response = client.get(f"/api/v2/devices/{DEVICE_ID}/commands", params={"wait": 5})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
+
+
+def test_poll_for_unknown_device_is_404(client):
+    assert client.get("/api/v2/devices/ZR-NOBODY/commands").status_code == 404
@@ -0,0 +1,66 @@
+"""Migrations run in subprocesses: the app modules bind their engine to DATABASE_URL at import."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_in(database, *args):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}"}
+    env.pop("ASYNC_DATABASE_URL", None)
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def upgrade_head(database):
+    run_in(database, "-m", "alembic", "upgrade", "head")
+
+
+def schema(database):
+    with sqlite3.connect(database) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(device_commands)")}
+        (version,) = conn.execute("SELECT version_num FROM alembic_version").fetchone()
+    return tables, columns, version
+
+
+def test_upgrade_head_on_an_empty_database(tmp_path):
+    database = tmp_path / "fresh.db"
+    upgrade_head(database)
+    tables, columns, _ = schema(database)
+    assert {"devices", "content", "device_commands", "command_jobs", "content_changes", "response_cache_versions"} <= tables
+    # Analytics were moved into monthly tables
+    assert "usage_analytics" not in tables
+    assert {"attempts", "next_attempt_at", "job_id"} <= columns
+
+
+def test_upgrade_head_after_create_schema(tmp_path):
+    database = tmp_path / "created.db"
+    run_in(database, "scripts/create_schema.py")
+    upgrade_head(database)
+    tables, columns, version = schema(database)
+    assert "response_cache_versions" in tables
+    assert {"attempts", "job_id"} <= columns
+
+    # Running it again is a no-op
+    upgrade_head(database)
+    assert schema(database)[2] == version
+
+
+def test_upgrade_head_after_the_app_started_on_the_baseline(tmp_path):
+    database = tmp_path / "started.db"
+    run_in(database, "-m", "alembic", "upgrade", "e1ff91f8aac8")
+    with sqlite3.connect(database) as conn:
+        conn.execute(
+            "INSERT INTO content (content_id, title, type, duration, file_url, created_at) "
+            "VALUES ('story_001', 'Story', 'story', 60, 'https://example.com/story.mp3', '2025-07-21 12:00:00')"
+        )
+    # App start: create_all plus the change feed and search backfills
+    run_in(database, "scripts/create_schema.py")
+    upgrade_head(database)
+    with sqlite3.connect(database) as conn:
+        assert conn.execute("SELECT content_id FROM content_changes").fetchall() == [("story_001",)]
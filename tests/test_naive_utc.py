@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from db import AsyncSessionLocal
+from models.v2 import Device
+
+DEVICE_ID = "ZR-NAIVE"
+
+
+def device_row(run):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(Device).where(Device.device_id == DEVICE_ID))
+    return run(load)
+
+
+def test_v1_writes_naive_utc(client, run):
+    before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+    assert client.post("/api/v1/devices/register", json={"device_id": DEVICE_ID, "device_name": "Test", "ip_address": "10.0.0.1"}).status_code == 200
+    assert client.post(f"/api/v1/devices/{DEVICE_ID}/heartbeat", json={"battery_level": 80, "wifi_ssid": "Home"}).status_code == 200
+    device = device_row(run)
+    for value in (device.last_seen, device.created_at, device.provisioned_at):
+        assert value.tzinfo is None
+        assert value >= before
+
+
+def test_v1_wifi_converts_an_aware_provisioned_at(client, run):
+    response = client.patch(f"/api/v1/devices/{DEVICE_ID}/wifi", json={"wifi_ssid": "Home", "provisioned_at": "2025-07-21T14:00:00+02:00"})
+    assert response.status_code == 200
+    assert device_row(run).provisioned_at == datetime(2025, 7, 21, 12, 0)
@@ -0,0 +1,68 @@
+import gzip
+import os
+
+import pytest
+
+from services.pages import TEMPLATES, PageCache, accepts_gzip
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("*", True),
+    ("*;q=0", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_page_is_served_gzipped_with_a_long_max_age(client):
+    response = client.get("/api/v2/docs", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gz"')
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert "swagger-ui" in response.text
+
+
+def test_plain_and_gzip_bodies_match(client):
+    plain = client.get("/api/v2/redoc", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    zipped = client.get("/api/v2/redoc", headers={"Accept-Encoding": "gzip"})
+    assert zipped.content == plain.content  # the client decodes gzip
+    assert zipped.headers["etag"] != plain.headers["etag"]
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.get("/api/v2/", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    response = client.get("/api/v2/", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_pages_render_once_unless_reloading(client):
+    cache = PageCache(reload=False, max_age=60)
+    cache.warm(client.app)
+    renders = cache.renders
+    cache.warm(client.app)
+    assert renders == 3 and cache.renders == renders
+    assert gzip.decompress(cache._pages["home"].gzip_body) == cache._pages["home"].body
+
+
+def test_reload_rebuilds_after_a_template_changes(client):
+    cache = PageCache(reload=True, max_age=60)
+    cache.warm(client.app)
+    renders = cache.renders
+    cache.warm(client.app)
+    assert cache.renders == renders
+
+    stat = os.stat(TEMPLATES[1])
+    os.utime(TEMPLATES[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    try:
+        cache.warm(client.app)
+    finally:
+        os.utime(TEMPLATES[1], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.renders == renders + 3
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from services.partitions import partition_table
+from utils.pagination import decode_cursor, encode_cursor
+
+USAGE = partition_table(datetime(2025, 1, 1).date())
+COLUMNS = [USAGE.c.timestamp, USAGE.c.id]
+
+
+def test_round_trip():
+    values = [datetime(2025, 1, 2, 3, 4, 5), "0190a1b2-c3d4"]
+    assert decode_cursor(encode_cursor(values), COLUMNS) == values
+
+
+@pytest.mark.parametrize("cursor", [
+    "WzEsMl0",  # [1, 2]: an int where a timestamp belongs
+    encode_cursor(["2025-01-02T03:04:05"]),  # too short
+    encode_cursor(["2025-01-02T03:04:05", "a", "b"]),  # too long
+    encode_cursor(["not a date", "a"]),
+    encode_cursor(["2025-01-02T03:04:05", 7]),  # an int for a string column
+    encode_cursor(["2025-01-02T03:04:05", ["a"]]),
+    encode_cursor({"timestamp": 1}),
+    "!!not base64!!",
+    "bm90IGpzb24",  # base64 of "not json"
+])
+def test_malformed_cursor_is_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, COLUMNS)
+
+
+def test_bool_is_not_an_integer():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([True]), [USAGE.c.duration])
+    assert decode_cursor(encode_cursor([3]), [USAGE.c.duration]) == [3]
+
+
+@pytest.mark.parametrize("path", ["/api/v2/devices", "/api/v2/analytics/usage/ZR-CURSOR"])
+def test_bad_cursor_is_400(client, path):
+    response = client.get(path, params={"limit": 10, "cursor": "WzEsMl0"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, inspect, select
+
+from db import AsyncSessionLocal, engine
+from services.analytics import rows_by_month, timestamp_error
+from services.partitions import add_months, month_start, partition_name, partition_table
+
+DEVICE_ID = "ZR-PARTITIONS"
+
+
+def event(timestamp: datetime) -> dict:
+    return {"device_id": DEVICE_ID, "content_id": "story_001", "action": "play", "timestamp": timestamp.isoformat()}
+
+
+def count_in(run, month) -> int:
+    table = partition_table(month)
+
+    async def count():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(func.count()).select_from(table).where(table.c.device_id == DEVICE_ID))
+    return run(count)
+
+
+def test_rows_group_by_utc_month():
+    rows = [{"timestamp": datetime(2025, 1, 31, 23, 30)}, {"timestamp": datetime(2025, 2, 1)}, {"timestamp": datetime(2025, 1, 1)}]
+    grouped = rows_by_month(rows)
+    assert sorted(grouped) == [datetime(2025, 1, 1).date(), datetime(2025, 2, 1).date()]
+    assert len(grouped[datetime(2025, 1, 1).date()]) == 2
+    assert month_start(datetime(2025, 2, 1, 0, 30, tzinfo=timezone(timedelta(hours=2)))) == datetime(2025, 1, 1).date()
+
+
+def test_batch_lands_in_each_events_month(client, run):
+    now = datetime.now(timezone.utc)
+    this_month = month_start(now)
+    last_month = add_months(this_month, -1)
+    response = client.post("/api/v2/analytics/usage/batch", json=[
+        event(now),
+        event(datetime(last_month.year, last_month.month, 15, tzinfo=timezone.utc)),
+        event(datetime(last_month.year, last_month.month, 16, tzinfo=timezone.utc)),
+    ])
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 3
+    assert count_in(run, this_month) == 1
+    assert count_in(run, last_month) == 2
+
+
+def test_out_of_range_timestamps_create_no_tables(client):
+    response = client.post("/api/v2/analytics/usage/batch", json=[
+        event(datetime(1970, 1, 1, tzinfo=timezone.utc)),
+        event(datetime.now(timezone.utc) + timedelta(days=400)),
+    ])
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["out_of_range", "out_of_range"]
+    tables = inspect(engine).get_table_names()
+    assert partition_name(datetime(1970, 1, 1).date()) not in tables
+    assert not any(name > partition_name(add_months(month_start(datetime.now(timezone.utc)), 2)) for name in tables if name.startswith("usage_analytics_"))
+
+
+def test_timestamp_error_bounds():
+    now = datetime(2025, 6, 15, 12, 0)
+    assert timestamp_error(now, now) is None
+    assert timestamp_error(now + timedelta(seconds=30), now) is None
+    assert timestamp_error(now + timedelta(days=1), now) is not None
+    assert timestamp_error(datetime(1970, 1, 1), now) is not None
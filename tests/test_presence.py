@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from db import AsyncSessionLocal
+from models.v2 import Device, utcnow
+from services.heartbeats import HeartbeatBuffer, heartbeat_buffer
+from services.presence import PresenceTracker
+
+DEVICE_ID = "ZR-PRESENCE"
+LONG_AGO = datetime(2025, 7, 21, 12, 0)
+
+
+def register(client):
+    response = client.post("/api/v2/devices/register", json={"device_id": DEVICE_ID, "device_name": "Test", "ip_address": "10.0.0.1"})
+    assert response.status_code == 200
+
+
+def set_last_seen(run, last_seen):
+    async def write():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Device).where(Device.device_id == DEVICE_ID).values(is_online=True, last_seen=last_seen))
+            await db.commit()
+    run(write)
+
+
+def device_row(run):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(Device).where(Device.device_id == DEVICE_ID))
+    return run(load)
+
+
+def expired_tracker():
+    tracker = PresenceTracker(timeout=5, check_interval=60)
+    tracker.touch(DEVICE_ID, time.monotonic() - 10)
+    return tracker
+
+
+def test_sweep_marks_a_silent_device_offline(client, run):
+    register(client)
+    set_last_seen(run, LONG_AGO)
+    tracker = expired_tracker()
+    assert run(tracker.sweep) == 1
+    assert device_row(run).is_online is False
+    assert tracker.metrics()["tracked"] == 0
+
+
+def test_recent_last_seen_keeps_the_device_online_and_rearms_it(client, run):
+    register(client)
+    set_last_seen(run, utcnow())
+    tracker = expired_tracker()
+    assert run(tracker.sweep) == 0
+    assert device_row(run).is_online is True
+    assert tracker.rearmed == 1
+    assert tracker.metrics()["tracked"] == 1
+
+
+def test_websocket_messages_move_last_seen(client, run):
+    register(client)
+    set_last_seen(run, LONG_AGO)
+    with client.websocket_connect(f"/api/v2/ws/device/{DEVICE_ID}") as socket:
+        socket.send_text('{"type": "status"}')
+        # Before closing: the client cancels the handler on close, and this queues behind its pending-command query
+        run(heartbeat_buffer.flush)
+    assert device_row(run).last_seen > LONG_AGO
+
+    # So a sweep on any worker sees the socket-only device as alive
+    assert run(expired_tracker().sweep) == 0
+    assert device_row(run).is_online is True
+
+
+def test_seen_only_writes_last_seen(client, run):
+    register(client)
+    set_last_seen(run, LONG_AGO)
+    battery_level = device_row(run).battery_level
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000)
+    buffer.seen(DEVICE_ID, LONG_AGO + timedelta(minutes=1))
+    run(buffer.flush)
+    device = device_row(run)
+    assert (device.last_seen, device.battery_level) == (LONG_AGO + timedelta(minutes=1), battery_level)
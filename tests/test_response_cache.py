@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from db import AsyncSessionLocal, SessionLocal
+from models.v2 import Device
+from services.heartbeats import HeartbeatBuffer
+from services.response_cache import ALL, ResponseCache, device_list_cache
+
+DEVICE_ID = "ZR-ETAG"
+
+
+def register(client, device_id: str):
+    response = client.post("/api/v2/devices/register", json={"device_id": device_id, "device_name": "Test", "ip_address": "10.0.0.1"})
+    assert response.status_code == 200
+
+
+def etags(run, cache, scopes):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return {scope: await cache.etag(db, scope, "v") for scope in scopes}
+    return run(load)
+
+
+def test_bump_moves_only_the_touched_scopes(client, run):
+    cache = ResponseCache("test")
+    before = etags(run, cache, ("u1", "u2", ALL))
+
+    async def bump():
+        async with AsyncSessionLocal() as db:
+            await cache.bump(db, "u1", None, ALL)
+            await db.commit()
+    run(bump)
+
+    after = etags(run, cache, ("u1", "u2", ALL))
+    assert after["u1"] != before["u1"]
+    assert after[ALL] != before[ALL]
+    assert after["u2"] == before["u2"]
+
+
+def test_bump_is_discarded_with_its_transaction(client, run):
+    cache = ResponseCache("test-rollback")
+    before = etags(run, cache, ("u1",))
+
+    async def bump_and_roll_back():
+        async with AsyncSessionLocal() as db:
+            await cache.bump(db, "u1")
+            await db.rollback()
+    run(bump_and_roll_back)
+    assert etags(run, cache, ("u1",)) == before
+
+
+def test_write_invalidates_etag(client):
+    first = client.get("/api/v2/devices")
+    etag = first.headers["etag"]
+    assert client.get("/api/v2/devices", headers={"If-None-Match": etag}).status_code == 304
+
+    register(client, DEVICE_ID)
+    second = client.get("/api/v2/devices", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+
+
+def test_etag_is_shared_across_workers(client, run):
+    etag = client.get("/api/v2/devices").headers["etag"]
+    # A worker that has never served the listing derives the same ETag from the database
+    other_worker = ResponseCache(device_list_cache.name)
+
+    async def other_worker_etag():
+        async with AsyncSessionLocal() as db:
+            return await other_worker.etag(db, ALL, (ALL, None, None))
+    assert run(other_worker_etag) == etag
+
+    # and a write committed by another worker (here through the v1 sync session) moves it here
+    with SessionLocal() as db:
+        other_worker.bump_sync(db, "someone")
+        db.commit()
+    assert client.get("/api/v2/devices", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_heartbeat_flush_bumps_only_when_the_listing_changes(client, run):
+    register(client, DEVICE_ID)
+
+    async def reset():
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Device).where(Device.device_id == DEVICE_ID)
+                .values(is_online=True, battery_level=100, last_seen=datetime(2025, 7, 21, 12, 0, 0))
+            )
+            await db.commit()
+    run(reset)
+    buffer = HeartbeatBuffer(flush_interval=60, flush_size=1000, last_seen_resolution=60)
+
+    def flush(battery_level, seen_at):
+        before = etags(run, device_list_cache, (ALL,))
+        buffer.record(DEVICE_ID, battery_level, seen_at)
+        run(buffer.flush)
+        return etags(run, device_list_cache, (ALL,)) != before
+
+    # Same battery, last_seen still in the same minute: listing unchanged
+    assert not flush(100, datetime(2025, 7, 21, 12, 0, 30))
+    assert flush(90, datetime(2025, 7, 21, 12, 0, 40))
+    # last_seen alone, into the next minute
+    assert flush(90, datetime(2025, 7, 21, 12, 1, 5))
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from db import AsyncSessionLocal
+from services.rollups import RollupBuffer, read_rollups, usage_rollups
+
+STARTED = datetime(2025, 7, 21, 12, 0)
+
+
+def event(device_id, action="play", duration=60, session_id="s1", timestamp=STARTED):
+    return {"device_id": device_id, "content_id": "story_rollup", "action": action, "duration": duration, "session_id": session_id, "timestamp": timestamp}
+
+
+def buckets(run, scope, key, period="hour"):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await read_rollups(db, period, scope, key, STARTED)
+    return run(load)
+
+
+def test_flushes_add_to_existing_buckets_and_count_sessions_once(client, run):
+    buffer = RollupBuffer(flush_interval=60, session_retention_days=30)
+    buffer.record([event("ZR-ROLLUP-1"), event("ZR-ROLLUP-1", action="complete", duration=30)])
+    run(buffer.flush)
+    # Same session again, plus a new one, in a later flush
+    buffer.record([event("ZR-ROLLUP-1", duration=10), event("ZR-ROLLUP-1", session_id="s2", duration=0)])
+    run(buffer.flush)
+
+    [hour] = buckets(run, "device", "ZR-ROLLUP-1")
+    assert hour["bucket_start"] == STARTED
+    assert (hour["events"], hour["plays"], hour["completes"], hour["total_duration"], hour["unique_sessions"]) == (4, 3, 1, 100, 2)
+    [day] = buckets(run, "device", "ZR-ROLLUP-1", period="day")
+    assert day["bucket_start"] == datetime(2025, 7, 21) and day["events"] == 4
+    assert buffer.lag_seconds() == 0
+
+
+def test_failed_flush_keeps_the_deltas(run):
+    def broken_session():
+        raise RuntimeError("database is down")
+
+    buffer = RollupBuffer(flush_interval=60, session_retention_days=30, session_factory=broken_session)
+    buffer.record([event("ZR-ROLLUP-2")])
+    run(buffer.flush)
+    buffer.record([event("ZR-ROLLUP-2")])
+    assert buffer.flush_errors == 1
+    # Merged back into one hour and one day bucket per scope
+    assert buffer.metrics()["pending_buckets"] == 4
+    assert buffer.lag_seconds() > 0
+
+
+def test_logged_events_show_up_in_the_rollup_endpoint(client, run):
+    response = client.post("/api/v2/analytics/usage", json={"device_id": "ZR-ROLLUP-3", "content_id": "story_rollup", "action": "play", "duration": 42, "session_id": "s1"})
+    assert response.status_code == 200
+    run(usage_rollups.flush)
+
+    body = client.get("/api/v2/analytics/rollups/devices/ZR-ROLLUP-3", params={"period": "day", "days": 1}).json()
+    assert body["device_id"] == "ZR-ROLLUP-3"
+    assert body["totals"] == {"events": 1, "plays": 1, "completes": 0, "total_duration": 42}
+    assert body["buckets"][0]["unique_sessions"] == 1
+    assert body["rollup_lag_seconds"] == 0
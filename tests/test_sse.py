@@ -0,0 +1,83 @@
+import asyncio
+
+from services.sse import EventStream
+
+
+def event(user_id, device_id="ZR-SSE", online=True):
+    return {"type": "device_status", "user_id": user_id, "device_id": device_id, "is_online": online}
+
+
+async def next_frame(frames, timeout=1.0):
+    return await asyncio.wait_for(anext(frames), timeout)
+
+
+def test_stream_sends_new_events_for_its_user_only():
+    async def scenario():
+        events = EventStream(buffer_size=10, ping_interval=5)
+        frames = events.stream("u1", None)
+        assert (await next_frame(frames)).startswith("retry:")
+        pending = asyncio.ensure_future(next_frame(frames))
+        await asyncio.sleep(0)
+        events.append([event("u2"), event("u1", "ZR-MINE")])
+        frame = await pending
+        assert f"id: {events.stream_id}-2\nevent: device_status\n" in frame
+        assert "ZR-MINE" in frame and frame.count("event:") == 1
+        await frames.aclose()
+        assert events.connections == 0
+    asyncio.run(scenario())
+
+
+def test_reconnect_with_last_event_id_replays_missed_events():
+    async def scenario():
+        events = EventStream(buffer_size=10, ping_interval=5)
+        events.append([event("u1", "ZR-1"), event("u1", "ZR-2"), event("u1", "ZR-3")])
+        frames = events.stream(None, f"{events.stream_id}-1")
+        await next_frame(frames)  # retry
+        replayed = await next_frame(frames)
+        assert "ZR-1" not in replayed and "ZR-2" in replayed and "ZR-3" in replayed
+        assert events.resumed == 1
+        await frames.aclose()
+    asyncio.run(scenario())
+
+
+def test_unknown_or_expired_event_id_gets_a_reset():
+    async def scenario():
+        events = EventStream(buffer_size=2, ping_interval=5)
+        events.append([event("u1") for _ in range(5)])
+        for last_event_id in ("otherworker-3", f"{events.stream_id}-1", f"{events.stream_id}-99"):
+            frames = events.stream(None, last_event_id)
+            await next_frame(frames)
+            assert "event: reset" in await next_frame(frames)
+            await frames.aclose()
+        assert events.resets == 3
+    asyncio.run(scenario())
+
+
+def test_client_a_whole_ring_behind_gets_a_reset():
+    async def scenario():
+        events = EventStream(buffer_size=2, ping_interval=5)
+        frames = events.stream(None, None)
+        await next_frame(frames)
+        pending = asyncio.ensure_future(next_frame(frames))
+        await asyncio.sleep(0)
+        # Five events land before the stream gets to write; only two are still in the ring
+        events.append([event("u1", f"ZR-{i}") for i in range(5)])
+        assert "event: reset" in await pending
+        # and carries on from the newest event
+        pending = asyncio.ensure_future(next_frame(frames))
+        await asyncio.sleep(0)
+        events.append([event("u1", "ZR-NEXT")])
+        assert "ZR-NEXT" in await pending
+        await frames.aclose()
+    asyncio.run(scenario())
+
+
+def test_quiet_stream_sends_stats():
+    async def scenario():
+        events = EventStream(buffer_size=10, ping_interval=0.05)
+        frames = events.stream(None, None)
+        await next_frame(frames)
+        frame = await next_frame(frames)
+        assert frame.startswith("event: stats\n")
+        await frames.aclose()
+    asyncio.run(scenario())
@@ -0,0 +1,16 @@
+# Time-ordered ids
+#
+# UUIDv7 (RFC 9562): a 48-bit Unix millisecond timestamp followed by random bits.
+# The string form sorts by creation time, so primary-key inserts append to the right
+# edge of the index instead of landing on random pages the way uuid4 keys do.
+import os
+import time
+import uuid
+
+def uuid7() -> str:
+    """A new UUIDv7 as a string (uuid.uuid7 only arrives in Python 3.14)."""
+    millis = time.time_ns() // 1_000_000
+    value = int.from_bytes(millis.to_bytes(6, "big") + os.urandom(10), "big")
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version 7
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # RFC 4122 variant
+    return str(uuid.UUID(int=value))
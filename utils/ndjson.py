@@ -0,0 +1,39 @@
+# Request body parsing for endpoints that take a JSON array or an NDJSON stream
+import json
+from typing import Any, AsyncIterator, Iterator, Tuple
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+def is_ndjson(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in NDJSON_MEDIA_TYPES
+
+def iter_json_array(body: bytes) -> Iterator[Tuple[int, Any]]:
+    """Yield (index, item) for a JSON array body. Raises ValueError if it is not one."""
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array")
+    yield from enumerate(items)
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, item) per NDJSON line as the body streams in.
+
+    Lines that are not valid JSON yield the ValueError in place of the item,
+    so callers can reject that line and carry on. Blank lines are skipped.
+    """
+    index = 0
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer)
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
@@ -0,0 +1,78 @@
+# Keyset (cursor) pagination for list endpoints
+#
+# A cursor is the sort key of the last row on the previous page, base64 encoded
+# so clients treat it as opaque. The next page is `WHERE key > cursor ORDER BY key
+# LIMIT n`, which an index serves directly, so deep pages cost the same as page one.
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, Select, String, tuple_
+
+import config
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _cursor_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise ValueError("Invalid cursor")
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, String) and not isinstance(value, str):
+        raise ValueError("Invalid cursor")
+    if isinstance(column.type, Integer) and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError("Invalid cursor")
+    if not isinstance(value, (str, int, float)):
+        raise ValueError("Invalid cursor")
+    return value
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """Turn a cursor back into key values typed for `columns`. Raises ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("Invalid cursor")
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def page_limit(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """Page size for a request, or None when the caller didn't ask for pagination."""
+    if limit is None and cursor is None:
+        return None
+    return min(limit or config.PAGE_DEFAULT_LIMIT, config.PAGE_MAX_LIMIT)
+
+def keyset_page(query: Select, columns: Sequence, cursor: Optional[str], limit: int, descending: bool = False) -> Select:
+    """Order `query` by `columns` and resume after `cursor`.
+
+    Fetches one row more than `limit` so `page_response` can tell whether
+    another page exists. A bad cursor is a 400.
+    """
+    if cursor:
+        try:
+            after = decode_cursor(cursor, columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple_(*after) if len(columns) > 1 else after[0]
+        query = query.filter(key < bound if descending else key > bound)
+    order = [column.desc() for column in columns] if descending else list(columns)
+    return query.order_by(*order).limit(limit + 1)
+
+def page_response(rows: Sequence, limit: int, key, serialize) -> dict:
+    """Envelope for one page: {"items": [...], "next_cursor": str | None}.
+
+    `key(row)` returns the row's sort key values; `serialize(row)` its payload.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [serialize(row) for row in rows],
+        "next_cursor": encode_cursor(key(rows[-1])) if has_more else None,
+    }
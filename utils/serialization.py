@@ -0,0 +1,109 @@
+"""
+Response serialization for the hot list endpoints
+
+Device, content and analytics payload shapes are declared once as TypedDicts
+and compiled into pydantic-core serializers at import. Rows go straight to
+JSON bytes, skipping jsonable_encoder and json.dumps. The JSON text columns
+(device settings, content tags) are parsed through an LRU cache, since most
+rows share a handful of distinct values. Parsed values are shared between
+callers and must be treated as read-only.
+"""
+
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import PlainSerializer, TypeAdapter
+
+import config
+
+# Same wire format as jsonable_encoder: isoformat(), so UTC stays "+00:00" rather than "Z"
+IsoDatetime = Annotated[datetime, PlainSerializer(lambda value: value.isoformat(), return_type=str, when_used="json")]
+
+
+class DevicePayload(TypedDict):
+    device_id: str
+    device_name: Optional[str]
+    user_id: Optional[str]
+    is_online: Optional[bool]
+    last_seen: Optional[IsoDatetime]
+    battery_level: Optional[int]
+    ip_address: Optional[str]
+    firmware_version: Optional[str]
+    wifi_provisioned: Optional[bool]
+    wifi_ssid: Optional[str]
+    settings: Dict[str, Any]
+    created_at: Optional[IsoDatetime]
+
+
+class ContentPayload(TypedDict):
+    content_id: str
+    title: Optional[str]
+    type: Optional[str]
+    age_range: str
+    duration: Optional[int]
+    file_url: Optional[str]
+    thumbnail_url: Optional[str]
+    file_size: Optional[int]
+    checksum: Optional[str]
+    description: Optional[str]
+    tags: List[Any]
+    is_premium: Optional[bool]
+    created_at: Optional[IsoDatetime]
+
+
+class UsagePayload(TypedDict):
+    id: str
+    content_id: Optional[str]
+    action: Optional[str]
+    duration: Optional[int]
+    session_id: Optional[str]
+    timestamp: Optional[IsoDatetime]
+
+
+class PayloadSerializer:
+    """Compiled serializers for a payload type: a bare list and a {items, next_cursor} page."""
+
+    def __init__(self, payload_type):
+        page_type = TypedDict(f"{payload_type.__name__}Page", {"items": List[payload_type], "next_cursor": Optional[str]})
+        self._list = TypeAdapter(List[payload_type])
+        self._page = TypeAdapter(page_type)
+
+    def dump_list(self, items: List[dict]) -> bytes:
+        # warnings=False: an odd value (e.g. a float duration) is still serialized, just without the type check
+        return self._list.dump_json(items, warnings=False)
+
+    def dump_page(self, page: dict) -> bytes:
+        return self._page.dump_json(page, warnings=False)
+
+
+devices_json = PayloadSerializer(DevicePayload)
+content_json = PayloadSerializer(ContentPayload)
+usage_json = PayloadSerializer(UsagePayload)
+
+
+@lru_cache(maxsize=config.JSON_PARSE_CACHE_SIZE)
+def _parse_json_text(text: str):
+    return json.loads(text)
+
+
+def parse_json_text(text: Optional[str], default):
+    """json.loads for JSON text columns, cached by the text itself. `default` is returned for NULL/empty."""
+    if not text:
+        return default
+    return _parse_json_text(text)
+
+
+def parse_cache_info() -> dict:
+    info = _parse_json_text.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by pydantic-core instead of json.dumps; same bytes for the same content."""
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
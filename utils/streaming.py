@@ -0,0 +1,89 @@
+# Streaming list responses: NDJSON or a chunked JSON array built from projected rows
+#
+# Rows are read in keyset batches, each on its own short-lived session, rather than
+# through one long-lived cursor. A slow client then never pins a pooled connection
+# (the only one on SQLite) or an open transaction for the length of the download.
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Mapping, Optional, Sequence
+
+from fastapi.requests import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+import config
+from db import AsyncSessionLocal
+from utils.ndjson import NDJSON_MEDIA_TYPES
+from utils.pagination import encode_cursor, keyset_page
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    """Stream when asked to with ?stream=true or an NDJSON Accept header."""
+    return stream or _accepts_ndjson(request)
+
+def _accepts_ndjson(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(part.split(";")[0].strip().lower() in NDJSON_MEDIA_TYPES for part in accept.split(","))
+
+async def iter_row_batches(
+    query: Select,
+    key_columns: Sequence,
+    descending: bool = False,
+    batch_size: Optional[int] = None,
+    session_factory=AsyncSessionLocal,
+) -> AsyncIterator[List[Mapping]]:
+    """Yield lists of row mappings for `query`, walking it in keyset order."""
+    batch_size = batch_size or config.STREAM_BATCH_SIZE
+    cursor = None
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(keyset_page(query, key_columns, cursor, batch_size, descending))).mappings().all()
+        if rows[:batch_size]:
+            yield rows[:batch_size]
+        if len(rows) <= batch_size:
+            return
+        cursor = encode_cursor([rows[batch_size - 1][column.key] for column in key_columns])
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def row_json(row: Mapping, raw_json: Optional[Mapping[str, str]] = None) -> str:
+    """Serialize one row mapping in column order.
+
+    Columns named in `raw_json` already hold JSON text (e.g. settings, tags) and
+    are spliced in as-is instead of being parsed and re-encoded; the mapped value
+    is the fallback for NULL.
+    """
+    raw_json = raw_json or {}
+    parts = []
+    for name, value in row.items():
+        if name in raw_json:
+            encoded = value or raw_json[name]
+        else:
+            encoded = json.dumps(value, default=_default)
+        parts.append(f"{json.dumps(name)}:{encoded}")
+    return "{" + ",".join(parts) + "}"
+
+async def _ndjson_body(batches: AsyncIterator[List[Mapping]], raw_json) -> AsyncIterator[str]:
+    async for rows in batches:
+        yield "".join(row_json(row, raw_json) + "\n" for row in rows)
+
+async def _json_array_body(batches: AsyncIterator[List[Mapping]], raw_json) -> AsyncIterator[str]:
+    first = True
+    yield "["
+    async for rows in batches:
+        chunk = ",".join(row_json(row, raw_json) for row in rows)
+        yield chunk if first else "," + chunk
+        first = False
+    yield "]"
+
+def streaming_json_response(
+    request: Request,
+    batches: AsyncIterator[List[Mapping]],
+    raw_json: Optional[Mapping[str, str]] = None,
+) -> StreamingResponse:
+    """NDJSON if the client accepts it, otherwise one JSON array sent in chunks."""
+    if _accepts_ndjson(request):
+        return StreamingResponse(_ndjson_body(batches, raw_json), media_type="application/x-ndjson")
+    return StreamingResponse(_json_array_body(batches, raw_json), media_type="application/json")